@@ -0,0 +1 @@
+"""Synthetic data generator and load/benchmark harness (not shipped with the app)."""
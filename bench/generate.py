@@ -0,0 +1,206 @@
+"""Fill a database with synthetic data at benchmark scale.
+
+    python -m bench.generate --songs 100000 --users 50000 --plays 10000000
+    python -m bench.generate --db instance/bench.db --scale 0.01
+
+Rows are written with executemany in ``--batch`` sized transactions
+straight through sqlite3. The normal triggers stay on, so search,
+counters, cache versions and recommendation events come out exactly as
+the app would have left them. Popularity follows a Zipf-like curve, so a
+few songs get most of the likes and plays, as in real listening data.
+
+Every generated user is a listener with the password ``bench`` and the
+login ``bench<n>@example.com``; ``bench.run`` signs in as them.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+BENCH_PASSWORD = "bench"
+
+WORDS = (
+    "love night rain dream fire heart summer road moon river light star city "
+    "blue gold wild home ocean sky song dance storm shadow sun silver echo"
+).split()
+GENRES = ["Pop", "Rock", "Melody", "Hip Hop", "Folk", "Classical", "Jazz", "EDM", "Devotional", "Indie"]
+LANGUAGES = ["Tamil", "English", "Hindi", "Telugu", "Malayalam", "Kannada"]
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--db", help="SQLite file to fill (default: DATABASE_URL)")
+    p.add_argument("--scale", type=float, default=1.0, help="multiply every count below")
+    p.add_argument("--songs", type=int, default=100_000)
+    p.add_argument("--users", type=int, default=50_000)
+    p.add_argument("--plays", type=int, default=10_000_000, help="recently_played rows")
+    p.add_argument("--favorites", type=int, default=20, help="per user, on average")
+    p.add_argument("--playlists", type=int, default=2, help="per user, on average")
+    p.add_argument("--playlist-size", type=int, default=15)
+    p.add_argument("--creators", type=int, default=500)
+    p.add_argument("--batch", type=int, default=50_000)
+    p.add_argument("--seed", type=int, default=42)
+    return p.parse_args(argv)
+
+
+class Popularity:
+    """Zipf-ish sampler over song ids: weight of rank r is 1 / r**s."""
+
+    def __init__(self, song_ids, rng, s=1.1):
+        self.ids = list(song_ids)
+        rng.shuffle(self.ids)
+        self.cum = list(accumulate(1 / (r ** s) for r in range(1, len(self.ids) + 1)))
+        self.rng = rng
+
+    def sample(self, k):
+        """``k`` distinct song ids (or all of them if there are fewer)."""
+        k = min(k, len(self.ids))
+        if k * 4 > len(self.ids):
+            # Rejection sampling would crawl through the long tail.
+            return set(self.rng.sample(self.ids, k))
+        total = self.cum[-1]
+        picked = set()
+        while len(picked) < k:
+            picked.add(self.ids[bisect_left(self.cum, self.rng.random() * total)])
+        return picked
+
+
+def _insert(conn, sql, rows, batch):
+    started, count, chunk = time.perf_counter(), 0, []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch:
+            conn.executemany(sql, chunk)
+            conn.commit()
+            count += len(chunk)
+            chunk = []
+            print(f"  {count:,} rows", end="\r", flush=True)
+    if chunk:
+        conn.executemany(sql, chunk)
+        conn.commit()
+        count += len(chunk)
+    print(f"  {count:,} rows in {time.perf_counter() - started:.1f}s")
+
+
+def _role_id(conn, name):
+    row = conn.execute("SELECT id FROM roles WHERE name = ?", (name,)).fetchone()
+    if row:
+        return row[0]
+    return conn.execute("INSERT INTO roles(name) VALUES (?)", (name,)).lastrowid
+
+
+def generate(args):
+    from werkzeug.security import generate_password_hash
+
+    from controller.charts import epoch_hour
+    from controller.config import CHART_HOURS_KEPT
+    from controller.database import create_tables, engine
+    from controller.playlists import POSITION_GAP
+
+    def n(count):
+        return max(1, int(count * args.scale))
+
+    rng = random.Random(args.seed)
+    create_tables()
+    conn = sqlite3.connect(engine.url.database, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+
+    listener, creator = _role_id(conn, "listener"), _role_id(conn, "creator")
+    conn.commit()
+    password = generate_password_hash(BENCH_PASSWORD)
+    first_user = (conn.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0) + 1
+    first_song = (conn.execute("SELECT MAX(id) FROM songs").fetchone()[0] or 0) + 1
+    users, creators, songs = n(args.users), n(args.creators), n(args.songs)
+
+    print(f"users: {users:,} listeners + {creators:,} creators")
+    _insert(conn, "INSERT INTO users(username, email_or_phone, password, role_id) VALUES (?, ?, ?, ?)", (
+        (f"bench{i}", f"bench{i}@example.com", password, listener if i < first_user + users else creator)
+        for i in range(first_user, first_user + users + creators)
+    ), args.batch)
+    user_ids = range(first_user, first_user + users)
+    creator_ids = range(first_user + users, first_user + users + creators)
+
+    print(f"songs: {songs:,}")
+    _insert(conn, """
+        INSERT INTO songs(title, artist_name, genre, language, lyrics, file_path, uploader_id, duration, bitrate, sample_rate)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 128000, 44100)
+    """, (
+        (
+            " ".join(rng.sample(WORDS, rng.randint(1, 3))).title(),
+            f"Artist {rng.randint(1, max(1, songs // 20))}",
+            rng.choice(GENRES),
+            rng.choice(LANGUAGES),
+            " ".join(rng.choices(WORDS, k=40)),
+            f"uploads/bench/{i}.mp3",
+            rng.choice(creator_ids),
+            round(rng.uniform(120, 360), 3),
+        )
+        for i in range(first_song, first_song + songs)
+    ), args.batch)
+    popularity = Popularity(range(first_song, first_song + songs), rng)
+
+    print("favorites")
+    _insert(conn, "INSERT OR IGNORE INTO favorites(user_id, song_id) VALUES (?, ?)", (
+        (u, s) for u in user_ids for s in popularity.sample(rng.randint(0, 2 * args.favorites))
+    ), args.batch)
+
+    print("playlists")
+    _insert(conn, "INSERT INTO playlists(name, user_id) VALUES (?, ?)", (
+        (f"Mix {k + 1}", u) for u in user_ids for k in range(rng.randint(0, 2 * args.playlists))
+    ), args.batch)
+    playlist_rows = conn.execute("SELECT id FROM playlists WHERE user_id >= ?", (first_user,)).fetchall()
+    _insert(conn, "INSERT OR IGNORE INTO playlist_songs(playlist_id, song_id, position) VALUES (?, ?, ?)", (
+        (pid, s, POSITION_GAP * (k + 1))
+        for (pid,) in playlist_rows
+        for k, s in enumerate(popularity.sample(rng.randint(1, 2 * args.playlist_size)))
+    ), args.batch)
+
+    plays = n(args.plays)
+    per_user = max(1, plays // users)
+    now = datetime.utcnow()
+    recent_hour = epoch_hour(now) - CHART_HOURS_KEPT
+    hours = Counter()
+
+    def play_rows():
+        for u in user_ids:
+            for s in popularity.sample(per_user):
+                played_at = now - timedelta(seconds=rng.randint(0, 30 * 86400))
+                hour = epoch_hour(played_at)
+                if hour > recent_hour:
+                    hours[(hour, s)] += 1
+                yield u, s, played_at.isoformat(sep=" ")
+
+    print(f"play history: {per_user * users:,} rows")
+    _insert(conn, "INSERT OR IGNORE INTO recently_played(user_id, song_id, played_at) VALUES (?, ?, ?)",
+            play_rows(), args.batch)
+    print("chart counters")
+    _insert(conn, """
+        INSERT INTO play_hours(hour, song_id, plays) VALUES (?, ?, ?)
+        ON CONFLICT(hour, song_id) DO UPDATE SET plays = plays + excluded.plays
+    """, ((h, s, c) for (h, s), c in hours.items()), args.batch)
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.db:
+        # Must be set before controller.config is imported.
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    started = time.perf_counter()
+    generate(args)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,310 @@
+"""Benchmark the hot routes under concurrent load.
+
+    python -m bench.run --db instance/bench.db                      # in-process test client
+    python -m bench.run --db instance/bench.db --mode gunicorn -w 2 # real server
+    python -m bench.run --db instance/bench.db --save-baseline bench/baseline.json
+    python -m bench.run --db instance/bench.db --compare bench/baseline.json
+
+Each route gets ``--warmup`` unmeasured requests, then ``--requests``
+measured ones spread over ``--concurrency`` threads, each signed in as a
+different generated listener (see ``bench.generate``). The report gives
+p50/p95/p99 latency, throughput, error count and SQL statements per
+request, read from the ``X-Query-Count`` header set by controller.metrics.
+
+``--compare`` exits with status 1 if any route's p95 or throughput is worse
+than the baseline by more than ``--threshold``, or it issues more queries.
+
+Rate limiting (controller/ratelimit.py) is turned off for the app under
+test: every bench thread comes from 127.0.0.1, and cheap 429s would stand
+in for the real work. A run that still sees a 429 exits with status 1.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+from bench.generate import BENCH_PASSWORD, WORDS
+
+# name -> (method, path builder). Builders get the shared Targets.
+ROUTES = {
+    "listener_dashboard": ("GET", lambda t: "/listener-dashboard"),
+    "api_songs": ("GET", lambda t: "/api/songs?fields=title,artist,hls"),
+    "catalog_manifest": ("GET", lambda t: "/catalog/manifest.json"),
+    "search_songs": ("GET", lambda t: "/search-songs?q=" + t.word()),
+    "log_play": ("POST", lambda t: f"/log-play/{t.song()}"),
+    "favourite": ("GET", lambda t: "/favourite"),
+    "playlist_songs": ("GET", lambda t: f"/playlist-songs/{t.playlist()}"),
+    "recommendations": ("GET", lambda t: "/recommendations"),
+    "charts": ("GET", lambda t: "/charts/trending"),
+}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--db", help="SQLite file to benchmark against (default: DATABASE_URL)")
+    p.add_argument("--mode", choices=("client", "gunicorn"), default="client")
+    p.add_argument("-w", "--workers", type=int, default=2, help="gunicorn workers")
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--routes", default=",".join(ROUTES), help="comma separated subset of: " + ", ".join(ROUTES))
+    p.add_argument("--requests", type=int, default=500, help="measured requests per route")
+    p.add_argument("--warmup", type=int, default=20)
+    p.add_argument("-c", "--concurrency", type=int, default=8)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--output", help="write results as JSON")
+    p.add_argument("--save-baseline", metavar="PATH")
+    p.add_argument("--compare", metavar="PATH", help="baseline JSON to compare against")
+    p.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+    return p.parse_args(argv)
+
+
+class Targets:
+    """Ids and logins sampled once from the database under test."""
+
+    def __init__(self, db_path, count, seed):
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        conn = sqlite3.connect(db_path)
+        try:
+            self.songs = [r[0] for r in conn.execute("SELECT id FROM songs ORDER BY random() LIMIT 2000")]
+            self.playlists = [r[0] for r in conn.execute("SELECT id FROM playlists ORDER BY random() LIMIT 2000")]
+            self.logins = [r[0] for r in conn.execute("""
+                SELECT email_or_phone FROM users
+                JOIN roles ON roles.id = users.role_id AND roles.name = 'listener'
+                WHERE email_or_phone LIKE 'bench%@example.com'
+                ORDER BY random() LIMIT ?
+            """, (count,))]
+        finally:
+            conn.close()
+        if not self.songs or len(self.logins) < count:
+            sys.exit("Not enough generated data; run `python -m bench.generate` first.")
+
+    def _pick(self, items):
+        with self._lock:
+            return self.rng.choice(items) if items else 0
+
+    def song(self):
+        return self._pick(self.songs)
+
+    def playlist(self):
+        return self._pick(self.playlists)
+
+    def word(self):
+        word = self._pick(WORDS)
+        return word[:max(2, len(word) - 1)]
+
+
+# ------------------------------
+# CLIENTS
+# ------------------------------
+def _query_count(headers):
+    value = headers.get("X-Query-Count")
+    return int(value) if value is not None else None
+
+
+class TestClientSession:
+    """One signed-in user driving the app in-process through Flask's test client."""
+
+    def __init__(self, app, login):
+        self.client = app.test_client()
+        self.client.post("/login", data={"email_or_phone": login, "password": BENCH_PASSWORD})
+
+    def request(self, method, path):
+        response = self.client.open(path, method=method)
+        response.close()
+        return response.status_code, _query_count(response.headers)
+
+
+class HttpSession:
+    """One signed-in user talking to a running server over HTTP."""
+
+    def __init__(self, base_url, login):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        body = urllib.parse.urlencode({"email_or_phone": login, "password": BENCH_PASSWORD}).encode()
+        self.opener.open(base_url + "/login", data=body).read()
+
+    def request(self, method, path):
+        req = urllib.request.Request(self.base_url + path, method=method, data=b"" if method == "POST" else None)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status, _query_count(response.headers)
+        except urllib.error.HTTPError as exc:
+            return exc.code, _query_count(exc.headers)
+
+
+def _start_gunicorn(args, env):
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-b", f"127.0.0.1:{args.port}",
+           "--log-level", "warning", "main:app"]
+    proc = subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"gunicorn exited with {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", args.port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    sys.exit("gunicorn did not start within 30s")
+
+
+# ------------------------------
+# MEASUREMENT
+# ------------------------------
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def run_route(sessions, targets, name, count, warmup):
+    method, build = ROUTES[name]
+    results = []
+    lock = threading.Lock()
+
+    def worker(session, n, record):
+        for _ in range(n):
+            path = build(targets)
+            started = time.perf_counter()
+            status, queries = session.request(method, path)
+            elapsed = time.perf_counter() - started
+            if record:
+                with lock:
+                    results.append((elapsed, status, queries))
+
+    def spread(total, record):
+        per = [total // len(sessions) + (i < total % len(sessions)) for i in range(len(sessions))]
+        with ThreadPoolExecutor(len(sessions)) as pool:
+            for f in [pool.submit(worker, s, n, record) for s, n in zip(sessions, per)]:
+                f.result()
+
+    spread(warmup, False)
+    started = time.perf_counter()
+    spread(count, True)
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    queries = [r[2] for r in results if r[2] is not None]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for r in results if r[1] >= 400),
+        "throttled": sum(1 for r in results if r[1] == 429),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "rps": round(len(results) / wall, 1) if wall else 0.0,
+        "queries": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def print_report(results, baseline=None):
+    header = f"{'route':<20}{'n':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'q/req':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        q = "-" if r["queries"] is None else f"{r['queries']:g}"
+        line = (f"{name:<20}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                f"{r['p99_ms']:>9.2f}{r['rps']:>9.1f}{q:>7}")
+        base = (baseline or {}).get(name)
+        if base:
+            line += f"   p95 {_delta(r['p95_ms'], base['p95_ms'])}, req/s {_delta(r['rps'], base['rps'])}"
+        print(line)
+
+
+def _delta(now, then):
+    return f"{(now - then) / then:+.0%}" if then else "n/a"
+
+
+def regressions(results, baseline, threshold):
+    found = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and r["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            found.append(f"{name}: p95 {base['p95_ms']} -> {r['p95_ms']} ms")
+        if base["rps"] and r["rps"] < base["rps"] * (1 - threshold):
+            found.append(f"{name}: throughput {base['rps']} -> {r['rps']} req/s")
+        if base["queries"] is not None and r["queries"] is not None and r["queries"] > base["queries"]:
+            found.append(f"{name}: queries/request {base['queries']} -> {r['queries']}")
+    return found
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Read by controller.config, in this process and the gunicorn it starts.
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+    # The job runner gunicorn would start competes for the same CPU.
+    os.environ["JOB_RUNNER_EMBEDDED"] = "0"
+    if args.db:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    routes = [r for r in args.routes.split(",") if r]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        sys.exit(f"Unknown routes: {', '.join(sorted(unknown))}")
+
+    from controller.database import engine
+
+    targets = Targets(engine.url.database, args.concurrency, args.seed)
+    server = None
+    if args.mode == "client":
+        import main as app_module
+
+        sessions = [TestClientSession(app_module.app, login) for login in targets.logins]
+    else:
+        server = _start_gunicorn(args, dict(os.environ))
+        base_url = f"http://127.0.0.1:{args.port}"
+        sessions = [HttpSession(base_url, login) for login in targets.logins]
+
+    try:
+        results = {}
+        for name in routes:
+            results[name] = run_route(sessions, targets, name, args.requests, args.warmup)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    meta = {"mode": args.mode, "concurrency": args.concurrency, "workers": args.workers}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+    print(f"mode={args.mode} concurrency={args.concurrency} requests/route={args.requests}")
+    print_report(results, baseline)
+
+    payload = {"meta": meta, "routes": results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2)
+        print(f"Wrote {path}")
+
+    throttled = {name: r["throttled"] for name, r in results.items() if r["throttled"]}
+    if throttled:
+        sys.exit("Rate limited (429) during the run, results are not comparable: "
+                 + ", ".join(f"{name} {n}" for name, n in throttled.items()))
+
+    if baseline:
+        found = regressions(results, baseline, args.threshold)
+        for line in found:
+            print("REGRESSION " + line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,38 @@
+from sqlalchemy import asc, desc
+
+from controller.models import User, Song, Role
+
+ADMIN_PAGE_SIZE = 25
+
+# Sortable columns per list; anything else falls back to the first entry.
+USER_SORTS = {"id": User.id, "username": User.username, "role": Role.name}
+SONG_SORTS = {"id": Song.id, "title": Song.title, "artist": Song.artist_name, "genre": Song.genre}
+
+
+def _page(query, sorts, tiebreak, sort, direction, page):
+    column = sorts.get(sort) or next(iter(sorts.values()))
+    order = desc if direction == "desc" else asc
+    page = max(page or 1, 1)
+    rows = (
+        query.order_by(order(column), order(tiebreak))
+        .offset((page - 1) * ADMIN_PAGE_SIZE)
+        .limit(ADMIN_PAGE_SIZE + 1)
+        .all()
+    )
+    return {
+        "rows": rows[:ADMIN_PAGE_SIZE],
+        "page": page,
+        "has_next": len(rows) > ADMIN_PAGE_SIZE,
+        "sort": sort if sort in sorts else next(iter(sorts)),
+        "direction": "desc" if direction == "desc" else "asc",
+    }
+
+
+def user_page(db, page=1, sort="id", direction="asc"):
+    query = db.query(User.id, User.username, Role.name.label("role")).join(Role, User.role_id == Role.id)
+    return _page(query, USER_SORTS, User.id, sort, direction, page)
+
+
+def song_page(db, page=1, sort="id", direction="desc"):
+    query = db.query(Song.id, Song.title, Song.artist_name, Song.genre)
+    return _page(query, SONG_SORTS, Song.id, sort, direction, page)
@@ -0,0 +1,180 @@
+"""Fingerprinted, minified and precompressed CSS/JS.
+
+Page styles and scripts live as plain files under ``static/css`` and
+``static/js``. The build step
+
+    flask --app main assets        # also run by gunicorn's on_starting
+
+minifies each one and writes it to ``ASSET_DIST_DIR`` under a name that
+includes its content hash (``css/login.css`` -> ``login.3f2a9c1b.css``),
+with .gz and .br copies. ``manifest.json`` maps the logical names to the
+built files.
+
+Templates link assets with ``asset_url('css/login.css')``. Built files are
+served from ``/assets/<name>`` with ``Cache-Control: immutable``, so a
+repeat visit never fetches them again. When a file changes, its name
+changes too, so nothing ever needs invalidating. Before the first build,
+``asset_url`` points at the unminified source under ``/static`` instead.
+
+The minifiers only remove comments and whitespace. The JS minifier keeps
+line breaks, so automatic semicolon insertion is unaffected. It handles
+strings and template literals, but not regex literals, and there are none
+in these scripts.
+"""
+import hashlib
+import json
+import os
+import re
+
+from flask import request, send_file, url_for
+
+from controller.config import STATIC_DIR, ASSET_DIST_DIR
+from controller.precompress import best_encoding, write_atomic, write_with_copies
+
+SOURCE_DIRS = ("css", "js")
+MANIFEST = "manifest.json"
+
+_NAME = re.compile(r"^[\w-]+\.[0-9a-f]{8}\.(css|js)$")
+
+
+# ------------------------------
+# MINIFIERS
+# ------------------------------
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCT = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON = re.compile(r":\s+")
+
+
+def minify_css(text):
+    text = _CSS_COMMENT.sub("", text)
+    text = _CSS_SPACE.sub(" ", text)
+    text = _CSS_PUNCT.sub(r"\1", text)
+    # Only the space after a colon; before it may be a descendant selector.
+    text = _CSS_COLON.sub(":", text)
+    return text.replace(";}", "}").strip() + "\n"
+
+
+def _strip_js_comments(text):
+    out = []
+    i, n = 0, len(text)
+    quote = None
+    while i < n:
+        c = text[i]
+        if quote:
+            out.append(c)
+            if c == "\\" and i + 1 < n:
+                out.append(text[i + 1])
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in "'\"`":
+            quote = c
+            out.append(c)
+        elif text.startswith("//", i):
+            i = text.find("\n", i)
+            if i < 0:
+                break
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        else:
+            out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def minify_js(text):
+    lines = (line.strip() for line in _strip_js_comments(text).splitlines())
+    return "\n".join(line for line in lines if line) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+# ------------------------------
+# BUILD
+# ------------------------------
+def build_assets(dist_dir=None):
+    """Build every source asset; returns the new manifest."""
+    dist_dir = dist_dir or ASSET_DIST_DIR
+    manifest = {}
+    for folder in SOURCE_DIRS:
+        src_dir = os.path.join(STATIC_DIR, folder)
+        if not os.path.isdir(src_dir):
+            continue
+        for filename in sorted(os.listdir(src_dir)):
+            stem, ext = os.path.splitext(filename)
+            if ext not in MINIFIERS:
+                continue
+            with open(os.path.join(src_dir, filename), encoding="utf-8") as f:
+                data = MINIFIERS[ext](f.read()).encode()
+            built = f"{stem}.{hashlib.sha256(data).hexdigest()[:8]}{ext}"
+            path = os.path.join(dist_dir, built)
+            if not os.path.exists(path):
+                write_with_copies(path, data)
+            manifest[f"{folder}/{filename}"] = built
+
+    os.makedirs(dist_dir, exist_ok=True)
+    write_atomic(os.path.join(dist_dir, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return manifest
+
+
+# ------------------------------
+# LOOKUP + SERVING
+# ------------------------------
+_loaded = {"mtime": None, "files": {}}
+
+
+def _manifest():
+    # Re-read only when a build replaced the file; one stat per lookup.
+    path = os.path.join(ASSET_DIST_DIR, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if mtime != _loaded["mtime"]:
+        with open(path, encoding="utf-8") as f:
+            _loaded["files"] = json.load(f)
+        _loaded["mtime"] = mtime
+    return _loaded["files"]
+
+
+def asset_url(name):
+    """URL for a logical asset name such as ``css/login.css``."""
+    built = _manifest().get(name)
+    if built:
+        return url_for("assets", name=built)
+    return url_for("static", filename=name)
+
+
+def asset_file(name, accept_encoding=""):
+    """``(path, content_encoding)`` for a built asset, or ``(None, None)``."""
+    path = os.path.join(ASSET_DIST_DIR, name)
+    if not _NAME.match(name) or not os.path.exists(path):
+        return None, None
+    return best_encoding(path, accept_encoding)
+
+
+def init_assets(app):
+    def serve(name):
+        path, encoding = asset_file(name, request.headers.get("Accept-Encoding", ""))
+        if path is None:
+            return "not found\n", 404
+        mimetype = "text/css" if name.endswith(".css") else "text/javascript"
+        resp = send_file(path, mimetype=mimetype, etag=False, conditional=False)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["Vary"] = "Accept-Encoding"
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return resp
+
+    app.add_url_rule("/assets/<name>", "assets", serve)
+    app.add_template_global(asset_url)
+
+    @app.cli.command("assets")
+    def assets_command():
+        """Minify, fingerprint and precompress static/css and static/js."""
+        print(f"Built {len(build_assets())} assets into {ASSET_DIST_DIR}")
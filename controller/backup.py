@@ -0,0 +1,437 @@
+"""Streaming export/import of the catalog and user libraries, and hot snapshots.
+
+    python -m controller.backup export library.ndjson.gz
+    python -m controller.backup import library.ndjson.gz
+    python -m controller.backup snapshot instance/music-backup.db
+
+All three work on the database in ``DATABASE_URL``. Export and snapshot
+are safe to run while the web workers are serving; so is an import into a
+database that already has a library (see below).
+
+export
+    Writes blobs, users, songs, favorites, playlists, playlist entries and
+    play history as NDJSON. Each table starts with a header line
+    ``{"table": ..., "columns": [...]}``, followed by one JSON array per
+    row. Every table is read in the same read transaction, so the dump is
+    consistent, and WAL mode means writers are not blocked meanwhile. Rows
+    are streamed from the SQLite cursor ``EXPORT_CHUNK`` at a time, so
+    memory stays flat whatever the size. A ``.gz`` or ``.xz`` file name
+    compresses the output; ``-`` writes to stdout.
+
+import
+    Loads a dump into this database, empty or not, with executemany in
+    ``IMPORT_CHUNK`` sized transactions. The normal triggers stay on, so
+    search, counters, cache versions, recommendation events, blob
+    reference counts and snapshot chunks come out as if the rows had been
+    written by the app.
+
+    Into an empty library (a restore), the non-unique indexes on the
+    loaded tables are dropped for the load and rebuilt once at the end,
+    and commits skip fsync. That is the fast path, and it is meant to run
+    before the app serves the database. Into a database that already has
+    songs or listener data, the indexes and durability settings are left
+    alone, so the app keeps working normally during the merge.
+
+    Ids are remapped, so a dump can be merged into a database that already
+    has data. A user whose login already exists is mapped onto that account
+    (the admin, typically). Other users, songs and playlists are shifted
+    past the highest id in use. Each chunk is loaded in its own write
+    transaction (BEGIN IMMEDIATE), which reads that highest id and inserts
+    the chunk, so rows the app adds between chunks never collide with
+    imported ones. Into an empty library nothing needs shifting and the ids
+    stay as they were. The old -> new maps live in temp tables and are
+    looked up one chunk of rows at a time.
+    Rows that point at a song, user or playlist missing from the dump
+    (left dangling in the source) are skipped. HLS packaging is per host,
+    so imported songs start without it.
+
+snapshot
+    Copies the live database with SQLite's online backup API, which gives a
+    consistent image without stopping writers. The copy is a single file
+    (journal_mode=DELETE) and can be opened or restored as is.
+"""
+import argparse
+import base64
+import gzip
+import json
+import lzma
+import os
+import sqlite3
+import sys
+import time
+
+EXPORT_FORMAT = "isai-library"
+EXPORT_VERSION = 1
+EXPORT_CHUNK = 5000
+IMPORT_CHUNK = 20000
+
+# In load order: everything a row points at is loaded before it.
+# (table, SELECT for export, binary columns)
+TABLES = [
+    ("blobs", "SELECT sha256, path, size FROM blobs ORDER BY sha256", ()),
+    ("users", """
+        SELECT users.id, username, email_or_phone, password, roles.name AS role
+        FROM users JOIN roles ON roles.id = users.role_id ORDER BY users.id
+    """, ()),
+    ("songs", """
+        SELECT id, title, artist_name, genre, language, file_path, lyrics,
+               duration, bitrate, sample_rate, seek_index, uploader_id
+        FROM songs ORDER BY id
+    """, ("seek_index",)),
+    ("favorites", "SELECT user_id, song_id FROM favorites ORDER BY id", ()),
+    ("playlists", "SELECT id, name, user_id FROM playlists ORDER BY id", ()),
+    ("playlist_songs", "SELECT playlist_id, song_id, position FROM playlist_songs ORDER BY id", ()),
+    ("recently_played", "SELECT user_id, song_id, played_at FROM recently_played ORDER BY id", ()),
+]
+
+
+def _database_path():
+    from controller.database import engine
+
+    return engine.url.database
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, isolation_level=None, timeout=60)
+    conn.execute("PRAGMA busy_timeout=60000")
+    return conn
+
+
+def _open(path, mode):
+    """Binary file for ``path``, compressed by extension; ``-`` is stdin/stdout."""
+    if path == "-":
+        return (sys.stdout if "w" in mode else sys.stdin).buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=6)
+    if path.endswith(".xz"):
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+
+def _line(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+# ------------------------------
+# EXPORT
+# ------------------------------
+def export(path, db_path=None):
+    """Stream every table to ``path``; returns {table: rows}."""
+    conn = _connect(db_path or _database_path())
+    counts = {}
+    out = _open(path, "wb")
+    try:
+        # One read transaction for all tables: a consistent dump.
+        conn.execute("BEGIN")
+        out.write(_line({"format": EXPORT_FORMAT, "version": EXPORT_VERSION,
+                         "tables": [name for name, _, _ in TABLES]}).encode())
+        for name, sql, binary in TABLES:
+            cursor = conn.execute(sql)
+            columns = [d[0] for d in cursor.description]
+            encode = [columns.index(c) for c in binary]
+            out.write(_line({"table": name, "columns": columns}).encode())
+            counts[name] = 0
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK)
+                if not rows:
+                    break
+                lines = []
+                for row in rows:
+                    if encode:
+                        row = list(row)
+                        for i in encode:
+                            if row[i] is not None:
+                                row[i] = base64.b64encode(row[i]).decode()
+                    lines.append(_line(row))
+                out.write("".join(lines).encode())
+                counts[name] += len(rows)
+        conn.execute("COMMIT")
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        conn.close()
+    return counts
+
+
+# ------------------------------
+# IMPORT
+# ------------------------------
+class _Remap:
+    """Old -> new ids for one import."""
+
+    TABLES = ("users", "songs", "playlists")
+
+    def __init__(self, conn):
+        self.conn = conn
+        for table in self.TABLES:
+            conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS import_{table} (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+            conn.execute(f"DELETE FROM import_{table}")
+        # Only grows: later chunks never map below earlier ones.
+        self.shift = dict.fromkeys(self.TABLES, 0)
+        self.roles = dict(conn.execute("SELECT name, id FROM roles"))
+
+    def assign(self, table, old_ids):
+        """Give rows of ``table`` new ids above every id in use; returns {old: new}.
+
+        Must run in the chunk's write transaction, so nothing can take the
+        ids between reading the highest one and inserting the rows.
+        """
+        if not old_ids:
+            return {}
+        top = self.conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+        self.shift[table] = max(self.shift[table], top - min(old_ids) + 1)
+        mapping = {old: old + self.shift[table] for old in old_ids}
+        self.conn.executemany(f"INSERT INTO import_{table}(old, new) VALUES (?, ?)", mapping.items())
+        return mapping
+
+    def role(self, name):
+        if name not in self.roles:
+            self.roles[name] = self.conn.execute("INSERT INTO roles(name) VALUES (?)", (name,)).lastrowid
+        return self.roles[name]
+
+    def _lookup(self, sql, old_ids):
+        old_ids = list({i for i in old_ids if i is not None})
+        found = []
+        for i in range(0, len(old_ids), 900):  # under SQLite's variable limit
+            part = old_ids[i:i + 900]
+            found.extend(self.conn.execute(sql.format(marks=",".join("?" * len(part))), part))
+        return found
+
+    def lookup(self, table, old_ids):
+        """{old: new} for the rows of ``table`` among ``old_ids`` that were imported."""
+        return dict(self._lookup(f"SELECT old, new FROM import_{table} WHERE old IN ({{marks}})", old_ids))
+
+
+def _load_users(conn, remap, rows):
+    logins = [row[2] for row in rows]
+    existing = {}
+    for i in range(0, len(logins), 900):
+        part = logins[i:i + 900]
+        existing.update(conn.execute(
+            f"SELECT email_or_phone, id FROM users WHERE email_or_phone IN ({','.join('?' * len(part))})", part
+        ))
+    conn.executemany("INSERT OR REPLACE INTO import_users(old, new) VALUES (?, ?)",
+                     [(row[0], existing[row[2]]) for row in rows if row[2] in existing])
+    rows = [row for row in rows if row[2] not in existing]
+    ids = remap.assign("users", [row[0] for row in rows])
+    conn.executemany("INSERT INTO users(id, username, email_or_phone, password, role_id) VALUES (?, ?, ?, ?, ?)", [
+        (ids[old_id], username, login, password, remap.role(role))
+        for old_id, username, login, password, role in rows
+    ])
+    return len(rows)
+
+
+def _load_songs(conn, remap, rows):
+    users = remap.lookup("users", (row[-1] for row in rows))
+    ids = remap.assign("songs", [row[0] for row in rows])
+    conn.executemany("""
+        INSERT INTO songs(id, title, artist_name, genre, language, file_path, lyrics,
+                          duration, bitrate, sample_rate, seek_index, uploader_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (ids[song_id], *rest,
+         base64.b64decode(seek_index) if seek_index else None, users.get(uploader_id))
+        for song_id, *rest, seek_index, uploader_id in rows
+    ])
+    return len(rows)
+
+
+def _load_user_song(table, extra=()):
+    columns = ", ".join(("user_id", "song_id") + extra)
+    sql = f"INSERT OR IGNORE INTO {table}({columns}) VALUES ({', '.join('?' * (2 + len(extra)))})"
+
+    def load(conn, remap, rows):
+        users = remap.lookup("users", (row[0] for row in rows))
+        songs = remap.lookup("songs", (row[1] for row in rows))
+        # Rows of users or songs missing from the dump are dropped.
+        new_rows = [
+            (users[user_id], songs[song_id], *rest)
+            for user_id, song_id, *rest in rows if user_id in users and song_id in songs
+        ]
+        conn.executemany(sql, new_rows)
+        return len(new_rows)
+    return load
+
+
+def _load_playlists(conn, remap, rows):
+    users = remap.lookup("users", (row[2] for row in rows))
+    kept = [(pid, name, uid) for pid, name, uid in rows if uid in users]
+    ids = remap.assign("playlists", [pid for pid, _, _ in kept])
+    conn.executemany("INSERT INTO playlists(id, name, user_id) VALUES (?, ?, ?)",
+                     [(ids[pid], name, users[uid]) for pid, name, uid in kept])
+    return len(kept)
+
+
+def _load_playlist_songs(conn, remap, rows):
+    playlists = remap.lookup("playlists", (row[0] for row in rows))
+    songs = remap.lookup("songs", (row[1] for row in rows))
+    new_rows = [
+        (playlists[pid], songs[sid], pos)
+        for pid, sid, pos in rows if pid in playlists and sid in songs
+    ]
+    conn.executemany("INSERT OR IGNORE INTO playlist_songs(playlist_id, song_id, position) VALUES (?, ?, ?)",
+                     new_rows)
+    return len(new_rows)
+
+
+def _load_blobs(conn, remap, rows):
+    # ref_count starts at 0; the songs' insert trigger counts the references.
+    conn.executemany("INSERT OR IGNORE INTO blobs(sha256, path, size, ref_count) VALUES (?, ?, ?, 0)", rows)
+    return len(rows)
+
+
+LOADERS = {
+    "blobs": _load_blobs,
+    "users": _load_users,
+    "songs": _load_songs,
+    "favorites": _load_user_song("favorites"),
+    "playlists": _load_playlists,
+    "playlist_songs": _load_playlist_songs,
+    "recently_played": _load_user_song("recently_played", ("played_at",)),
+}
+
+
+def _deferred_indexes(conn):
+    """``(name, sql)`` of the non-unique indexes on the loaded tables."""
+    tables = list(LOADERS)
+    return conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        f"AND sql NOT LIKE 'CREATE UNIQUE%' AND tbl_name IN ({','.join('?' * len(tables))})",
+        tables,
+    ).fetchall()
+
+
+def _has_library(conn):
+    """True if songs or listener data exist already (users alone do not count)."""
+    return any(
+        conn.execute(f"SELECT EXISTS (SELECT 1 FROM {table})").fetchone()[0]
+        for table in ("songs", "favorites", "playlists", "playlist_songs", "recently_played")
+    )
+
+
+def _read_lines(f):
+    for raw in f:
+        if raw.strip():
+            yield json.loads(raw)
+
+
+def import_(path):
+    """Load a dump written by ``export`` into ``DATABASE_URL``; returns {table: rows inserted}."""
+    from controller.database import create_tables
+
+    create_tables()
+    conn = _connect(_database_path())
+    conn.execute("PRAGMA cache_size=-200000")
+    counts = {}
+    # Only a restore into an empty library takes the fast path; a merge into
+    # a live database keeps its indexes and durable commits.
+    indexes = []
+    if not _has_library(conn):
+        conn.execute("PRAGMA synchronous=OFF")
+        indexes = _deferred_indexes(conn)
+    f = _open(path, "rb")
+    try:
+        lines = _read_lines(f)
+        header = next(lines, None)
+        if not header or header.get("format") != EXPORT_FORMAT or header.get("version") != EXPORT_VERSION:
+            raise ValueError(f"{path} is not a version {EXPORT_VERSION} {EXPORT_FORMAT} export")
+
+        remap = _Remap(conn)
+        for name, _ in indexes:
+            conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+        loader, table, chunk = None, None, []
+        started = time.perf_counter()
+
+        def flush():
+            if chunk:
+                # IMMEDIATE: the writer lock is held from reading the highest
+                # ids (see _Remap.assign) until the chunk's rows are in.
+                conn.execute("BEGIN IMMEDIATE")
+                counts[table] += loader(conn, remap, chunk)
+                conn.execute("COMMIT")
+                chunk.clear()
+
+        def done():
+            flush()
+            if table is not None:
+                print(f"  {table}: {counts[table]:,} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        for item in lines:
+            if isinstance(item, dict):
+                done()
+                table, started = item["table"], time.perf_counter()
+                if table not in LOADERS:
+                    raise ValueError(f"unknown table {table!r} in {path}")
+                loader = LOADERS[table]
+                counts[table] = 0
+                continue
+            if table is None:
+                raise ValueError(f"{path}: rows before any table header")
+            chunk.append(item)
+            if len(chunk) >= IMPORT_CHUNK:
+                flush()
+        done()
+    finally:
+        f.close()
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        rebuild = time.perf_counter()
+        for _, sql in indexes:
+            conn.execute(sql.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+        if indexes:
+            conn.execute("ANALYZE")
+            print(f"  rebuilt {len(indexes)} indexes in {time.perf_counter() - rebuild:.1f}s", file=sys.stderr)
+        conn.close()
+    return counts
+
+
+# ------------------------------
+# HOT SNAPSHOT
+# ------------------------------
+def snapshot(dest, db_path=None):
+    """Consistent copy of the live database at ``dest``; returns its size in bytes."""
+    src = _connect(db_path or _database_path())
+    tmp = dest + ".tmp"
+    dst = sqlite3.connect(tmp)
+    try:
+        # One step (pages=-1) copies everything under a single read
+        # transaction, so the image is consistent. Stepped copies restart
+        # whenever another connection writes.
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode=DELETE")
+        dst.close()
+        os.replace(tmp, dest)
+    except BaseException:
+        dst.close()
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    finally:
+        src.close()
+    return os.path.getsize(dest)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Export, import or snapshot the music database.")
+    sub = p.add_subparsers(dest="command", required=True)
+    for command, help_text in (
+        ("export", "stream the library to NDJSON (.gz/.xz compressed, - for stdout)"),
+        ("import", "load an export into this database, remapping ids"),
+        ("snapshot", "consistent copy of the live database file"),
+    ):
+        sub.add_parser(command, help=help_text).add_argument("path")
+    args = p.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == "export":
+        result = export(args.path)
+    elif args.command == "import":
+        result = import_(args.path)
+    else:
+        result = f"{snapshot(args.path):,} bytes"
+    print(f"{args.command}: {result} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
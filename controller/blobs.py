@@ -0,0 +1,152 @@
+"""Content-addressed storage for uploaded audio.
+
+Uploads are streamed straight from the multipart parser into a temp file
+while being hashed (see ``UploadRequest``), then stored once under the key
+``uploads/<aa>/<bb>/<sha256><ext>`` in the configured storage backend
+(controller/storage.py). Identical audio uploaded again reuses
+the existing blob. ``blobs.ref_count`` counts the songs pointing at each
+blob, and triggers on ``songs`` keep it current. Once the count drops to
+zero, the reconciler in controller/reclaim.py removes the file.
+
+The reconciler deletes files outside any transaction, after listing the
+keys in ``reclaim_pending``. An upload that claims one of those keys waits
+in ``place_upload`` until the key is cleared, so its file always lands
+after the delete, never before it.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import Request
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from controller.config import UPLOAD_DIR, MAX_UPLOAD_BYTES, RECLAIM_UPLOAD_WAIT
+from controller.models import Blob, ReclaimPending
+from controller.storage import get_storage
+
+TMP_DIR = os.path.join(UPLOAD_DIR, ".tmp")
+
+BLOB_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS blobs_songs_ai AFTER INSERT ON songs BEGIN
+        UPDATE blobs SET ref_count = ref_count + 1 WHERE path = new.file_path;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS blobs_songs_ad AFTER DELETE ON songs BEGIN
+        UPDATE blobs SET ref_count = ref_count - 1 WHERE path = old.file_path;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS blobs_songs_au AFTER UPDATE OF file_path ON songs
+    WHEN old.file_path IS NOT new.file_path BEGIN
+        UPDATE blobs SET ref_count = ref_count - 1 WHERE path = old.file_path;
+        UPDATE blobs SET ref_count = ref_count + 1 WHERE path = new.file_path;
+    END
+    """,
+]
+
+
+def create_blob_triggers(conn):
+    for ddl in BLOB_TRIGGERS:
+        conn.execute(ddl)
+
+
+class HashingFile:
+    """Writable temp file that hashes and size-checks every chunk written.
+
+    The upload is therefore hashed in the same pass that spools it to disk,
+    and an oversized file is rejected as soon as it crosses the limit
+    instead of after it has been fully received.
+    """
+
+    def __init__(self, limit=MAX_UPLOAD_BYTES):
+        os.makedirs(TMP_DIR, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=TMP_DIR, suffix=".part", delete=False)
+        self.name = self.file.name
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.limit = limit
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit and self.size > self.limit:
+            self.discard()
+            raise RequestEntityTooLarge()
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.name)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        # read/seek/readline/close etc. go to the underlying file.
+        return getattr(self.file, name)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return HashingFile()
+
+
+def blob_path(sha256, ext):
+    """Storage key (path relative to static/), sharded on the first two hash bytes."""
+    return f"uploads/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def store_upload(db, file_storage):
+    """Register an uploaded file as a blob and return its static-relative path.
+
+    Must be followed by ``db.commit()`` and then ``place_upload()``: the
+    blob row is claimed in the transaction first so that the reconciler
+    cannot remove the file after this upload has decided to share it.
+    """
+    stream = file_storage.stream
+    sha256 = stream.sha256.hexdigest()
+    ext = os.path.splitext(file_storage.filename or "")[1].lower()
+
+    db.execute(
+        insert(Blob)
+        .values(sha256=sha256, path=blob_path(sha256, ext), size=stream.size, ref_count=0)
+        .on_conflict_do_nothing(index_elements=["sha256"])
+    )
+    return db.query(Blob.path).filter_by(sha256=sha256).scalar()
+
+
+def _wait_for_reclaim(path, timeout=RECLAIM_UPLOAD_WAIT):
+    # Imported here: controller.database imports this module (via the
+    # migrations) for the triggers above.
+    from controller.database import engine
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # A fresh connection per check: a held read transaction would keep
+        # seeing the same snapshot.
+        with engine.connect() as conn:
+            pending = conn.execute(
+                ReclaimPending.__table__.select().where(ReclaimPending.path == path)
+            ).first()
+        if pending is None:
+            return
+        time.sleep(0.05)
+
+
+def place_upload(file_storage, path):
+    """Move the spooled upload into storage, or drop it if the blob is stored."""
+    stream = file_storage.stream
+    stream.file.close()
+    _wait_for_reclaim(path)
+    get_storage().put_file(path, stream.name)
+
+
+def discard_upload(file_storage):
+    stream = getattr(file_storage, "stream", None)
+    if isinstance(stream, HashingFile):
+        stream.discard()
@@ -0,0 +1,65 @@
+"""One-time database bootstrap: schema, migrations, default roles, admin user.
+
+It also builds any stale catalog snapshot chunks, so the first dashboard
+visit after a deploy doesn't pay for them.
+
+Runs once per deployment rather than in every worker:
+
+    flask --app main bootstrap     # by hand / in a release step
+    gunicorn main:app              # gunicorn.conf.py calls it in on_starting
+
+Every step is idempotent and safe to race (``INSERT ... ON CONFLICT DO
+NOTHING`` on unique columns, migrations under ``BEGIN IMMEDIATE``), so a
+stray second run does nothing.
+"""
+from sqlalchemy.dialects.sqlite import insert
+
+from controller.database import SessionLocal, create_tables, engine
+from controller.models import Role, User
+from controller.snapshot import refresh as refresh_snapshot
+
+DEFAULT_ROLES = ("admin", "creator", "listener")
+ADMIN_USERNAME = "admin"
+ADMIN_LOGIN = "admin@gmail.com"
+ADMIN_PASSWORD = "admin123"
+
+
+def create_default_roles(db):
+    db.execute(insert(Role).on_conflict_do_nothing(), [{"name": name} for name in DEFAULT_ROLES])
+
+
+def ensure_admin(db):
+    """Create the admin account if missing. Returns True if it was created."""
+    if db.query(User.id).filter_by(username=ADMIN_USERNAME).first():
+        return False
+    # Hashing is deliberately slow, so only pay for it when actually needed.
+    from werkzeug.security import generate_password_hash
+
+    admin_role_id = db.query(Role.id).filter_by(name="admin").scalar()
+    result = db.execute(insert(User).values(
+        username=ADMIN_USERNAME,
+        email_or_phone=ADMIN_LOGIN,
+        password=generate_password_hash(ADMIN_PASSWORD),
+        role_id=admin_role_id,
+    ).on_conflict_do_nothing())
+    return result.rowcount == 1
+
+
+def bootstrap():
+    create_tables()
+    db = SessionLocal()
+    try:
+        create_default_roles(db)
+        created = ensure_admin(db)
+        db.commit()
+        refresh_snapshot(db)
+        db.commit()
+    finally:
+        db.close()
+    # Connections opened here must not be inherited by forked workers.
+    engine.dispose()
+    print("✅ Admin created successfully" if created else "ℹ️ Admin already exists")
+
+
+if __name__ == "__main__":
+    bootstrap()
@@ -0,0 +1,181 @@
+"""Version-keyed response cache shared by all gunicorn workers.
+
+Cached reads are keyed by the data versions they depend on:
+
+    catalog             bumped on any insert/update/delete of songs
+    library:<user_id>   bumped when that user's favorites, playlists or
+                        playlist entries change
+
+The counters live in ``cache_versions`` and are bumped by SQLite triggers in
+the same transaction as the write, so every write path (routes, the job
+runner, bulk SQL) invalidates correctly and nothing needs a TTL. A write
+simply moves readers on to new keys; entries for old versions are never
+read again and age out.
+
+Lookups go through a small in-process LRU first, then a shared SQLite file
+(``CACHE_DB_PATH``) that every worker can read. Values must be JSON
+serialisable. The shared file is disposable: delete it at any time.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from controller.config import CACHE_ENABLED, CACHE_DB_PATH, CACHE_LOCAL_ENTRIES, CACHE_SHARED_ENTRIES
+from controller.models import CacheVersion
+
+CATALOG = "catalog"
+
+
+def library(user_id):
+    return f"library:{user_id}"
+
+
+# ------------------------------
+# VERSION TRIGGERS
+# ------------------------------
+def _bump(key, source=None):
+    # With ``source`` the key is computed from a lookup row; no row, no bump.
+    select = f"SELECT {key}, 1 FROM {source}" if source else f"SELECT {key}, 1 WHERE true"
+    return (
+        f"INSERT INTO cache_versions(name, value) {select} "
+        f"ON CONFLICT(name) DO UPDATE SET value = value + 1;"
+    )
+
+
+def _trigger(name, event, table, body):
+    return f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table} BEGIN {body} END"
+
+
+def _owner_bump(ref):
+    # playlist_songs has no user_id; bump the owning playlist's user.
+    return _bump("'library:' || user_id", f"playlists WHERE id = {ref}.playlist_id")
+
+
+VERSION_TRIGGERS = [
+    _trigger("cachever_songs_ai", "INSERT", "songs", _bump("'catalog'")),
+    _trigger("cachever_songs_au", "UPDATE", "songs", _bump("'catalog'")),
+    _trigger("cachever_songs_ad", "DELETE", "songs", _bump("'catalog'")),
+    _trigger("cachever_favorites_ai", "INSERT", "favorites", _bump("'library:' || new.user_id")),
+    _trigger("cachever_favorites_ad", "DELETE", "favorites", _bump("'library:' || old.user_id")),
+    _trigger("cachever_playlists_ai", "INSERT", "playlists", _bump("'library:' || new.user_id")),
+    _trigger("cachever_playlists_au", "UPDATE", "playlists",
+             _bump("'library:' || old.user_id") + _bump("'library:' || new.user_id")),
+    _trigger("cachever_playlists_ad", "DELETE", "playlists", _bump("'library:' || old.user_id")),
+    _trigger("cachever_playlist_songs_ai", "INSERT", "playlist_songs", _owner_bump("new")),
+    _trigger("cachever_playlist_songs_au", "UPDATE", "playlist_songs", _owner_bump("new")),
+    _trigger("cachever_playlist_songs_ad", "DELETE", "playlist_songs", _owner_bump("old")),
+]
+
+
+def create_version_triggers(conn):
+    for ddl in VERSION_TRIGGERS:
+        conn.execute(ddl)
+
+
+def read_versions(db, names):
+    """Current value of each version counter (0 if never bumped)."""
+    found = dict(db.query(CacheVersion.name, CacheVersion.value).filter(CacheVersion.name.in_(names)).all())
+    return [found.get(name, 0) for name in names]
+
+
+# ------------------------------
+# CACHE TIERS
+# ------------------------------
+class ResponseCache:
+    # Prune the shared table roughly once per this many writes.
+    PRUNE_EVERY = 200
+
+    def __init__(self, path=CACHE_DB_PATH, local_entries=CACHE_LOCAL_ENTRIES,
+                 shared_entries=CACHE_SHARED_ENTRIES, enabled=CACHE_ENABLED):
+        self.path = path
+        self.local_entries = local_entries
+        self.shared_entries = shared_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+
+    def _shared(self):
+        # One connection per process; a forked worker must not reuse its parent's.
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=1)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_stored_at ON entries (stored_at)")
+            self._pid = os.getpid()
+            self._local.clear()
+        return self._conn
+
+    def _remember(self, key, value):
+        self._local[key] = value
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_entries:
+            self._local.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                return True, self._local[key]
+            try:
+                row = self._shared().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                return False, None  # a busy or broken cache file is just a miss
+            if row is None:
+                return False, None
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return True, value
+
+    def set(self, key, value):
+        """Store ``value``; returns it as a reader would get it back (JSON round-tripped)."""
+        payload = json.dumps(value, separators=(",", ":"))
+        value = json.loads(payload)
+        with self._lock:
+            self._remember(key, value)
+            try:
+                conn = self._shared()
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries(key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, payload, time.time()),
+                )
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    conn.execute(
+                        "DELETE FROM entries WHERE key IN ("
+                        "SELECT key FROM entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                        (self.shared_entries,),
+                    )
+            except sqlite3.Error:
+                pass
+        return value
+
+    def fetch(self, db, key, depends_on, compute):
+        """Return ``compute()`` for ``key`` at the current versions of ``depends_on``.
+
+        The two reads are not one snapshot: pysqlite only opens a transaction
+        before a write, so each SELECT sees the latest commit. The versions
+        are therefore read first. A write that commits before ``compute()``
+        runs can only make the stored value newer than its key, never older,
+        and a reader at the new version misses and recomputes. No key ever
+        holds data from before its versions.
+        """
+        if not self.enabled:
+            return compute()
+        versions = read_versions(db, depends_on)
+        full_key = key + "|" + ",".join(f"{n}={v}" for n, v in zip(depends_on, versions))
+        hit, value = self.get(full_key)
+        if hit:
+            return value
+        return self.set(full_key, compute())
+
+
+response_cache = ResponseCache()
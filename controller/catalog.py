@@ -0,0 +1,62 @@
+from controller.models import Song
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Public field name -> column. Only these are ever selected, so a page is a
+# list of plain row tuples rather than hydrated Song objects.
+CATALOG_FIELDS = {
+    "title": Song.title,
+    "artist": Song.artist_name,
+    "genre": Song.genre,
+    "language": Song.language,
+    "duration": Song.duration,
+    "lyrics": Song.lyrics,
+    "hls": Song.hls_segments,
+}
+DEFAULT_FIELDS = ("title", "artist", "genre", "language", "duration")
+
+
+def parse_fields(raw):
+    """Turn a ``fields=title,artist`` query value into a tuple of known fields."""
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(f for f in raw.split(",") if f in CATALOG_FIELDS)
+    return fields or DEFAULT_FIELDS
+
+
+def catalog_page(db, cursor=None, limit=DEFAULT_PAGE_SIZE, fields=DEFAULT_FIELDS,
+                 genre=None, language=None, artist=None):
+    """Return one page of songs, newest first, and the cursor for the next page.
+
+    Pagination is keyset based on ``Song.id``: the cursor is the last id of
+    the previous page, so every page is a primary-key range scan no matter how
+    deep the listener has scrolled.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    q = db.query(Song.id, *(CATALOG_FIELDS[f] for f in fields))
+    if cursor:
+        q = q.filter(Song.id < cursor)
+    if genre:
+        q = q.filter(Song.genre == genre)
+    if language:
+        q = q.filter(Song.language == language)
+    if artist:
+        q = q.filter(Song.artist_name == artist)
+
+    # Fetch one extra row to learn whether another page exists.
+    rows = q.order_by(Song.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    songs = []
+    for row in rows:
+        song = {"id": row[0], "file": f"/stream/{row[0]}"}
+        song.update(zip(fields, row[1:]))
+        if "hls" in song:
+            song["hls"] = f"/hls/{row[0]}/index.m3u8" if song["hls"] else None
+        songs.append(song)
+
+    next_cursor = rows[-1][0] if has_more else None
+    return songs, next_cursor
@@ -0,0 +1,211 @@
+"""Trending and weekly top charts from bucketed play counters.
+
+Play events never get aggregated from ``recently_played`` (which is pruned
+per user and holds one row per user/song anyway). Instead every play-event
+flush adds its plays to hourly per-song counters:
+
+    play_hours   (epoch hour, song) -> plays, for the last CHART_HOURS_KEPT hours
+    play_days    (epoch day, song)  -> plays, for the last CHART_DAYS_KEPT days
+
+The ``charts`` job (scheduled by the job runner) rolls hours that have left
+the hourly window into day buckets and precomputes the rankings. Each day
+keeps only the songs in its top ``CHART_DAY_TOP`` for at least one scope:
+overall, within their genre, or within their language. That bounds storage
+by window length rather than play volume. The cut is a heavy-hitters
+approximation. A song outside every top ``CHART_DAY_TOP`` of its scopes
+each day, yet in a weekly top ``CHART_SIZE``, would be missed. With the
+cap far above the chart size, that needs plays spread very evenly.
+
+The rankings are:
+
+    trending   plays over the last CHART_TRENDING_HOURS, each hour weighted
+               by 0.5 ** (age / CHART_HALF_LIFE_HOURS)
+    week       plays over the last seven days
+
+for every scope: ``all``, ``genre:<genre>`` and ``language:<language>``.
+Serving a chart is a primary-key read of one ``charts`` row.
+"""
+import calendar
+import heapq
+import json
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert
+
+from controller.config import (
+    CHART_SIZE,
+    CHART_HOURS_KEPT,
+    CHART_DAYS_KEPT,
+    CHART_DAY_TOP,
+    CHART_TRENDING_HOURS,
+    CHART_HALF_LIFE_HOURS,
+)
+from controller.database import SessionLocal
+from controller.models import Chart, PlayHour, Song
+
+CHARTS = ("trending", "week")
+
+_HOUR_UPSERT = insert(PlayHour)
+_HOUR_UPSERT = _HOUR_UPSERT.on_conflict_do_update(
+    index_elements=["hour", "song_id"],
+    set_={"plays": PlayHour.plays + _HOUR_UPSERT.excluded.plays},
+)
+
+_ROLL_HOURS = text("""
+    INSERT INTO play_days(day, song_id, plays)
+    SELECT hour / 24, song_id, SUM(plays) FROM play_hours
+    WHERE hour < :cutoff
+    GROUP BY hour / 24, song_id
+    ON CONFLICT(day, song_id) DO UPDATE SET plays = plays + excluded.plays
+""")
+
+# A row goes only if it is below the cap in every scope the week charts
+# rank it in, so a niche genre or language keeps its own top songs.
+_CUT_DAY_TAILS = text("""
+    DELETE FROM play_days WHERE (day, song_id) IN (
+        SELECT day, song_id FROM (
+            SELECT d.day, d.song_id,
+                   ROW_NUMBER() OVER (PARTITION BY d.day ORDER BY d.plays DESC, d.song_id) AS rn_all,
+                   ROW_NUMBER() OVER (PARTITION BY d.day, s.genre ORDER BY d.plays DESC, d.song_id) AS rn_genre,
+                   ROW_NUMBER() OVER (PARTITION BY d.day, s.language ORDER BY d.plays DESC, d.song_id) AS rn_language
+            FROM play_days d LEFT JOIN songs s ON s.id = d.song_id
+        ) WHERE rn_all > :keep AND rn_genre > :keep AND rn_language > :keep
+    )
+""")
+
+_WEEK_SQL = text("""
+    SELECT song_id, SUM(plays) FROM (
+        SELECT song_id, plays FROM play_days WHERE day >= :since_day
+        UNION ALL
+        SELECT song_id, plays FROM play_hours WHERE hour / 24 >= :since_day
+    ) GROUP BY song_id
+""")
+
+
+def epoch_hour(dt):
+    return calendar.timegm(dt.utctimetuple()) // 3600
+
+
+def record_plays(conn, events):
+    """Add ``(user_id, song_id, played_at)`` events to the hourly counters."""
+    counts = Counter((epoch_hour(played_at), song_id) for _, song_id, played_at in events)
+    conn.execute(_HOUR_UPSERT, [
+        {"hour": hour, "song_id": song_id, "plays": plays} for (hour, song_id), plays in counts.items()
+    ])
+
+
+# ------------------------------
+# ROLLUP
+# ------------------------------
+def _trending_scores(db, hour_now):
+    since = hour_now - CHART_TRENDING_HOURS
+    scores = defaultdict(float)
+    rows = db.execute(text("SELECT hour, song_id, plays FROM play_hours WHERE hour > :since"), {"since": since})
+    for hour, song_id, plays in rows:
+        scores[song_id] += plays * 0.5 ** ((hour_now - hour) / CHART_HALF_LIFE_HOURS)
+    return scores
+
+
+def _week_scores(db, hour_now):
+    return dict(db.execute(_WEEK_SQL, {"since_day": hour_now // 24 - 6}).all())
+
+
+def _rank_by_scope(db, scores):
+    """Top ``CHART_SIZE`` per scope, as {scope: [[song_id, score], ...]}."""
+    scoped = defaultdict(list)
+    ids = list(scores)
+    for i in range(0, len(ids), 500):
+        for song_id, genre, language in db.query(Song.id, Song.genre, Song.language).filter(
+            Song.id.in_(ids[i:i + 500])
+        ):
+            entry = (scores[song_id], song_id)
+            scoped["all"].append(entry)
+            if genre:
+                scoped[f"genre:{genre}"].append(entry)
+            if language:
+                scoped[f"language:{language}"].append(entry)
+    return {
+        scope: [[song_id, round(score, 3)] for score, song_id in heapq.nlargest(CHART_SIZE, entries)]
+        for scope, entries in scoped.items()
+    }
+
+
+def rollup(now=None):
+    """Fold old hours into days, trim the windows and recompute every chart."""
+    hour_now = epoch_hour(now or datetime.utcnow())
+    db = SessionLocal()
+    try:
+        cutoff = hour_now - CHART_HOURS_KEPT
+        db.execute(_ROLL_HOURS, {"cutoff": cutoff})
+        db.execute(text("DELETE FROM play_hours WHERE hour < :cutoff"), {"cutoff": cutoff})
+        db.execute(text("DELETE FROM play_days WHERE day < :day"), {"day": hour_now // 24 - CHART_DAYS_KEPT})
+        db.execute(_CUT_DAY_TAILS, {"keep": CHART_DAY_TOP})
+
+        computed_at = datetime.utcnow()
+        rankings = {
+            "trending": _rank_by_scope(db, _trending_scores(db, hour_now)),
+            "week": _rank_by_scope(db, _week_scores(db, hour_now)),
+        }
+        rows = [
+            {"name": name, "scope": scope, "songs": json.dumps(songs), "computed_at": computed_at}
+            for name, by_scope in rankings.items()
+            for scope, songs in by_scope.items()
+        ]
+        db.query(Chart).delete()
+        if rows:
+            db.execute(insert(Chart), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+# ------------------------------
+# SERVING
+# ------------------------------
+def chart_scope(genre=None, language=None):
+    if genre:
+        return f"genre:{genre}"
+    if language:
+        return f"language:{language}"
+    return "all"
+
+
+def read_chart(db, name, scope="all", limit=CHART_SIZE):
+    """The precomputed ranking with song details (empty until the first rollup)."""
+    row = db.query(Chart.songs, Chart.computed_at).filter_by(name=name, scope=scope).first()
+    if row is None:
+        return {"chart": name, "scope": scope, "computed_at": None, "songs": []}
+
+    ranking = json.loads(row.songs)[:limit]
+    songs = {
+        s.id: s for s in db.query(Song.id, Song.title, Song.artist_name, Song.hls_segments)
+        .filter(Song.id.in_([song_id for song_id, _ in ranking]))
+    }
+    return {
+        "chart": name,
+        "scope": scope,
+        "computed_at": row.computed_at.isoformat(),
+        "songs": [
+            {
+                "id": song_id,
+                "title": songs[song_id].title,
+                "artist": songs[song_id].artist_name,
+                "file": f"/stream/{song_id}",
+                "hls": f"/hls/{song_id}/index.m3u8" if songs[song_id].hls_segments else None,
+                "score": score,
+            }
+            for song_id, score in ranking if song_id in songs
+        ],
+    }
+
+
+if __name__ == "__main__":
+    from controller.database import create_tables
+
+    create_tables()
+    started = time.perf_counter()
+    rollup()
+    print(f"Charts recomputed in {time.perf_counter() - started:.2f}s")
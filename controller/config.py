@@ -5,8 +5,162 @@ INSTANCE_DIR = os.path.join(BASE_DIR, "instance")
 
 os.makedirs(INSTANCE_DIR, exist_ok=True)
 
-DATABASE_URL = f"sqlite:///{os.path.join(INSTANCE_DIR, 'music.db')}"
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+UPLOAD_DIR = os.path.join(STATIC_DIR, "uploads")
+# Largest accepted audio file; larger uploads are rejected with 413 as soon
+# as they cross the limit.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL", f"sqlite:///{os.path.join(INSTANCE_DIR, 'music.db')}"
+)
+
+# SQLITE ENGINE PROFILE (override via environment)
+# WAL lets readers run alongside the single writer instead of queueing
+# behind it; synchronous=NORMAL is durable in WAL mode except for the last
+# transactions on power loss, and skips an fsync per commit.
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 64 * 1024 * 1024))
+# Negative means KiB rather than pages.
+SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -8000))
+
+# Connection pool per worker process. Sync gunicorn workers serve one request
+# at a time, so a small pool is plenty; overflow covers background threads.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))
 
 # ADMIN CREDENTIALS (hardcoded)
 ADMIN_EMAIL = "admin@isai.com"
 ADMIN_PASSWORD = "admin123"
+
+# PLAY EVENTS (write-behind buffer for /log-play)
+PLAY_FLUSH_SIZE = int(os.environ.get("PLAY_FLUSH_SIZE", 200))
+PLAY_FLUSH_INTERVAL = float(os.environ.get("PLAY_FLUSH_INTERVAL", 2.0))
+# Events held in memory at most; beyond it the oldest are dropped (a few MB).
+PLAY_BUFFER_MAX = int(os.environ.get("PLAY_BUFFER_MAX", 20000))
+# Rows of play history kept per user; 0 keeps everything.
+RECENTLY_PLAYED_LIMIT = int(os.environ.get("RECENTLY_PLAYED_LIMIT", 100))
+
+# BACKGROUND JOBS (python -m controller.jobs)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", os.cpu_count() or 1))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+# Retry n waits JOB_BACKOFF_SECONDS * 2**(n-1).
+JOB_BACKOFF_SECONDS = float(os.environ.get("JOB_BACKOFF_SECONDS", 30))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 1.0))
+JOB_STALE_AFTER = int(os.environ.get("JOB_STALE_AFTER", 3600))
+# gunicorn's master starts and supervises the runner (see gunicorn.conf.py).
+# Set to 0 when the runner is deployed as its own process.
+JOB_RUNNER_EMBEDDED = os.environ.get("JOB_RUNNER_EMBEDDED", "1") == "1"
+
+# LYRICS PIPELINE: "stub" or "local" (pydub + SpeechRecognition + ollama,
+# see requirements-lyrics.txt)
+LYRICS_BACKEND = os.environ.get("LYRICS_BACKEND", "stub")
+LYRICS_MODEL = os.environ.get("LYRICS_MODEL", "mistral:latest")
+
+# HLS PACKAGING (optional "hls" job, see controller/hls.py)
+HLS_ENABLED = os.environ.get("HLS_ENABLED", "1") == "1"
+HLS_DIR = os.path.join(STATIC_DIR, "hls")
+HLS_SEGMENT_SECONDS = int(os.environ.get("HLS_SEGMENT_SECONDS", 6))
+
+# RESPONSE CACHE (see controller/cache.py)
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "1") == "1"
+# Shared by every worker on the host; safe to delete at any time.
+CACHE_DB_PATH = os.environ.get("CACHE_DB_PATH", os.path.join(INSTANCE_DIR, "cache.db"))
+CACHE_LOCAL_ENTRIES = int(os.environ.get("CACHE_LOCAL_ENTRIES", 512))
+CACHE_SHARED_ENTRIES = int(os.environ.get("CACHE_SHARED_ENTRIES", 20000))
+
+# AUDIO STORAGE (see controller/storage.py): "local" or "s3"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+# Any S3-compatible endpoint, e.g. http://127.0.0.1:9000 for MinIO.
+S3_ENDPOINT = os.environ.get("S3_ENDPOINT", "https://s3.amazonaws.com")
+S3_BUCKET = os.environ.get("S3_BUCKET", "isai-audio")
+S3_REGION = os.environ.get("S3_REGION", "us-east-1")
+S3_ACCESS_KEY = os.environ.get("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY", "")
+# Lifetime of the presigned playback URLs handed to browsers.
+S3_PRESIGN_SECONDS = int(os.environ.get("S3_PRESIGN_SECONDS", 3600))
+
+# INTERACTION BATCHES (see controller/interactions.py)
+INTERACTION_BATCH_MAX = int(os.environ.get("INTERACTION_BATCH_MAX", 100))
+# How long an op's idempotency key is remembered; retries must come sooner.
+INTERACTION_KEY_TTL = int(os.environ.get("INTERACTION_KEY_TTL", 86400))
+# Largest page /api/likes answers for.
+LIKES_PAGE_MAX = int(os.environ.get("LIKES_PAGE_MAX", 500))
+
+# RATE LIMITS (see controller/ratelimit.py)
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+# Shared by every worker on the host; safe to delete at any time.
+RATE_LIMIT_DB_PATH = os.environ.get("RATE_LIMIT_DB_PATH", os.path.join(INSTANCE_DIR, "ratelimit.db"))
+# "<requests>/<seconds>": burst size and the window it refills over.
+# Writes are /log-play, /like-song and /unlike-song.
+RATE_LIMIT_WRITES = os.environ.get("RATE_LIMIT_WRITES", "30/10")
+RATE_LIMIT_WRITES_PER_IP = os.environ.get("RATE_LIMIT_WRITES_PER_IP", "120/10")
+RATE_LIMIT_SEARCH = os.environ.get("RATE_LIMIT_SEARCH", "20/10")
+RATE_LIMIT_SEARCH_PER_IP = os.environ.get("RATE_LIMIT_SEARCH_PER_IP", "80/10")
+# Requests of each kind one user (or address) may have running at once,
+# across all workers; 0 disables.
+CONCURRENCY_WRITES = int(os.environ.get("CONCURRENCY_WRITES", 2))
+CONCURRENCY_SEARCH = int(os.environ.get("CONCURRENCY_SEARCH", 1))
+# A slot older than this belongs to a worker that died mid-request.
+RATE_LIMIT_SLOT_TIMEOUT = float(os.environ.get("RATE_LIMIT_SLOT_TIMEOUT", 30))
+
+# REVERSE PROXIES
+# Proxies in front of the app that append to X-Forwarded-For. The client
+# address used by the per-address limits and METRICS_ALLOW is taken that
+# many hops from the end of the header. Leave at 0 when clients connect
+# directly, or anyone could pick their own address.
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 0))
+
+# FILE RECLAIMER (see controller/reclaim.py)
+RECLAIM_INTERVAL = float(os.environ.get("RECLAIM_INTERVAL", 60))
+# Upload files checked per run; a full pass over static/uploads takes
+# (files / RECLAIM_BATCH) runs.
+RECLAIM_BATCH = int(os.environ.get("RECLAIM_BATCH", 2000))
+# Anything younger is left alone, whatever the database says.
+RECLAIM_MIN_AGE = float(os.environ.get("RECLAIM_MIN_AGE", 3600))
+# Longest an upload waits for the reclaimer to finish deleting its key.
+RECLAIM_UPLOAD_WAIT = float(os.environ.get("RECLAIM_UPLOAD_WAIT", 30))
+
+# STATIC ASSETS (see controller/assets.py)
+# Built output; regenerate with `flask --app main assets`.
+ASSET_DIST_DIR = os.environ.get("ASSET_DIST_DIR", os.path.join(STATIC_DIR, "dist"))
+
+# CATALOG SNAPSHOT (see controller/snapshot.py)
+# Content-hashed chunk files; rebuilt from the database whenever missing.
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(INSTANCE_DIR, "catalog"))
+SNAPSHOT_GZIP_LEVEL = int(os.environ.get("SNAPSHOT_GZIP_LEVEL", 9))
+SNAPSHOT_BROTLI_QUALITY = int(os.environ.get("SNAPSHOT_BROTLI_QUALITY", 11))
+# How often the job runner rebuilds changed chunks; catalog edits reach
+# listeners' dashboards within about this long.
+SNAPSHOT_REFRESH_INTERVAL = float(os.environ.get("SNAPSHOT_REFRESH_INTERVAL", 5))
+
+# RECOMMENDATIONS (see controller/recommendations.py)
+REC_NEIGHBORS = int(os.environ.get("REC_NEIGHBORS", 50))
+REC_UPDATE_INTERVAL = float(os.environ.get("REC_UPDATE_INTERVAL", 60))
+REC_BATCH_SIZE = int(os.environ.get("REC_BATCH_SIZE", 10000))
+REC_SEED_SONGS = int(os.environ.get("REC_SEED_SONGS", 50))
+REC_RESULTS = int(os.environ.get("REC_RESULTS", 20))
+
+# CHARTS (see controller/charts.py)
+CHART_SIZE = int(os.environ.get("CHART_SIZE", 50))
+CHART_ROLLUP_INTERVAL = float(os.environ.get("CHART_ROLLUP_INTERVAL", 300))
+CHART_HOURS_KEPT = int(os.environ.get("CHART_HOURS_KEPT", 48))
+CHART_DAYS_KEPT = int(os.environ.get("CHART_DAYS_KEPT", 8))
+# Songs kept per day bucket, per scope (overall, each genre, each language).
+CHART_DAY_TOP = int(os.environ.get("CHART_DAY_TOP", 2000))
+CHART_TRENDING_HOURS = int(os.environ.get("CHART_TRENDING_HOURS", 24))
+CHART_HALF_LIFE_HOURS = float(os.environ.get("CHART_HALF_LIFE_HOURS", 6))
+
+# METRICS (see controller/metrics.py)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+# Per-worker samples are merged here; safe to delete while stopped.
+METRICS_DB_PATH = os.environ.get("METRICS_DB_PATH", os.path.join(INSTANCE_DIR, "metrics.db"))
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 10))
+# Addresses allowed to scrape /metrics without an admin session.
+METRICS_ALLOW = frozenset(os.environ.get("METRICS_ALLOW", "127.0.0.1,::1").split(","))
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+# Lets admins append ?_profile=1 to get cProfile output for a request.
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
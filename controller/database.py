@@ -1,25 +1,81 @@
-
-import os
-from sqlalchemy import create_engine
+from flask import g
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from controller.models import Base
-
-# Project root (one level above controller/)
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-
-# Instance folder at project root
-INSTANCE_DIR = os.path.join(BASE_DIR, "instance")
-os.makedirs(INSTANCE_DIR, exist_ok=True)
-
-DATABASE_URL = f"sqlite:///{os.path.join(INSTANCE_DIR, 'music.db')}"
+from controller.search import create_search_index
+from controller.migrations import run_migrations
+from controller.config import (
+    DATABASE_URL,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+)
 
 engine = create_engine(
     DATABASE_URL,
     echo=False,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
 )
 
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cur.close()
+
+
 SessionLocal = sessionmaker(bind=engine)
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        create_search_index(conn)
+    run_migrations(engine.url.database)
+
+# ------------------------------
+# REQUEST-SCOPED SESSION
+# ------------------------------
+def get_db():
+    """Session for the current request, opened on first use.
+
+    It is committed (or rolled back on error) and closed by the teardown
+    registered in ``init_app``, so routes never have to close it themselves.
+    """
+    if "db" not in g:
+        g.db = SessionLocal()
+    return g.db
+
+
+def _teardown_db(exc):
+    db = g.pop("db", None)
+    if db is None:
+        return
+    try:
+        if exc is None:
+            db.commit()
+        else:
+            db.rollback()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(_teardown_db)
@@ -0,0 +1,60 @@
+"""Set-based deletes of songs and users.
+
+Each delete is a few ``DELETE ... WHERE ... IN (SELECT ...)`` statements,
+so the rows never reach Python. That holds even for a creator with
+thousands of songs. Dependent rows (favorites, playlist entries, play
+history, queued jobs) go first, in the same transaction. The triggers on
+those tables keep everything else in step: search index, counters, cache
+versions, recommendation events, blob ref counts and snapshot chunks.
+
+Nothing here touches the disk. Files of released blobs and HLS folders of
+deleted songs are removed later by the reconciler in controller/reclaim.py.
+"""
+from sqlalchemy import delete, select
+
+from controller.models import (
+    Favorite, InteractionKey, Job, Playlist, PlaylistSong, RecentlyPlayed, Role, Song, User
+)
+
+# Rows that point at a song and must go with it.
+SONG_DEPENDENTS = (Favorite, PlaylistSong, RecentlyPlayed, Job)
+
+
+def _delete(db, model, *criteria):
+    # No session sync: it would fetch every deleted id just to expire
+    # objects that a request deleting this way never loaded.
+    stmt = delete(model).where(*criteria).execution_options(synchronize_session=False)
+    return db.execute(stmt).rowcount
+
+
+def delete_songs(db, *criteria):
+    """Delete every song matching ``criteria`` and the rows that reference it.
+
+    Returns the number of songs deleted. The caller commits.
+    """
+    ids = select(Song.id).where(*criteria)
+    for model in SONG_DEPENDENTS:
+        _delete(db, model, model.song_id.in_(ids))
+    return _delete(db, Song, *criteria)
+
+
+def delete_user(db, user_id):
+    """Delete a user with their songs, playlists and listening history.
+
+    Admin accounts are never deleted; returns False for them and for
+    unknown ids. The caller commits.
+    """
+    role = db.query(Role.name).join(User, User.role_id == Role.id).filter(User.id == user_id).scalar()
+    if role is None or role == "admin":
+        return False
+
+    delete_songs(db, Song.uploader_id == user_id)
+    # Entries before playlists: their triggers look up the owning playlist.
+    playlists = select(Playlist.id).where(Playlist.user_id == user_id)
+    _delete(db, PlaylistSong, PlaylistSong.playlist_id.in_(playlists))
+    _delete(db, Playlist, Playlist.user_id == user_id)
+    _delete(db, Favorite, Favorite.user_id == user_id)
+    _delete(db, RecentlyPlayed, RecentlyPlayed.user_id == user_id)
+    _delete(db, InteractionKey, InteractionKey.user_id == user_id)
+    _delete(db, User, User.id == user_id)
+    return True
@@ -0,0 +1,142 @@
+"""Frame-aligned HLS packaging for uploaded MP3s.
+
+The "hls" job cuts a song into ``HLS_SEGMENT_SECONDS`` MPEG audio
+segments on frame boundaries (from the seek index in controller/mp3.py)
+and writes a VOD playlist next to them:
+
+    static/hls/<song_id>/index.m3u8
+    static/hls/<song_id>/<version>-<n>.mp3
+
+Segments are plain byte ranges of the original file, no re-encode, each
+prefixed with the small ID3 timestamp tag the HLS packed-audio format
+expects. ``version`` is taken from the SHA-256 of the source file, so a
+segment name always means the same bytes and can be served as immutable,
+even when SQLite hands a deleted song's id to a new upload.
+"""
+import hashlib
+import math
+import os
+import shutil
+import struct
+import tempfile
+
+from controller.config import HLS_DIR, HLS_SEGMENT_SECONDS
+from controller.database import SessionLocal
+from controller.models import Song
+from controller.mp3 import byte_offset_at
+from controller.storage import get_storage
+
+# Hex digits of the source hash in segment names.
+VERSION_LENGTH = 16
+
+_COPY_CHUNK = 256 * 1024
+_TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+
+
+def _syncsafe(n):
+    return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
+
+
+def timestamp_tag(seconds):
+    """ID3v2.4 PRIV frame carrying the segment's 90 kHz start timestamp."""
+    pts = int(round(seconds * 90000)) & ((1 << 33) - 1)
+    body = _TIMESTAMP_OWNER + struct.pack(">Q", pts)
+    frame = b"PRIV" + _syncsafe(len(body)) + b"\x00\x00" + body
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frame)) + frame
+
+
+def _copy_range(src, dst, start, length):
+    src.seek(start)
+    while length > 0:
+        chunk = src.read(min(_COPY_CHUNK, length))
+        if not chunk:
+            break
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def segment_bounds(info, segment_seconds=HLS_SEGMENT_SECONDS):
+    """Yield (start_byte, end_byte, start_time, duration) per segment."""
+    index = info["seek_index"]
+    seconds = len(index) // 4
+    cuts = [byte_offset_at(index, k) for k in range(0, seconds, segment_seconds)]
+    cuts.append(info["audio_end"])
+    duration = info["duration"]
+    for n in range(len(cuts) - 1):
+        start_time = n * segment_seconds
+        seg_duration = min(segment_seconds, duration - start_time)
+        if cuts[n + 1] > cuts[n] and seg_duration > 0:
+            yield cuts[n], cuts[n + 1], start_time, seg_duration
+
+
+def hls_dir(song_id):
+    return os.path.join(HLS_DIR, str(song_id))
+
+
+def package(path, out_dir, segment_seconds=HLS_SEGMENT_SECONDS):
+    """Write segments + index.m3u8 for ``path`` into ``out_dir``. Returns count."""
+    # The web workers only need hls_dir; the parser is job-side.
+    from controller.mp3 import probe
+
+    info = probe(path)
+    if info is None:
+        return 0
+
+    segments = list(segment_bounds(info, segment_seconds))
+    with open(path, "rb") as f:
+        version = hashlib.file_digest(f, "sha256").hexdigest()[:VERSION_LENGTH]
+    # Build in a sibling temp dir and swap it in, so players never see a
+    # half-written playlist.
+    parent = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        with open(path, "rb") as src:
+            for n, (start, end, start_time, _) in enumerate(segments):
+                with open(os.path.join(tmp, f"{version}-{n}.mp3"), "wb") as dst:
+                    dst.write(timestamp_tag(start_time))
+                    _copy_range(src, dst, start, end - start)
+
+        target = max(math.ceil(d) for *_, d in segments)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:VOD",
+        ]
+        for n, (*_, seg_duration) in enumerate(segments):
+            lines.append(f"#EXTINF:{seg_duration:.3f},")
+            lines.append(f"{version}-{n}.mp3")
+        lines.append("#EXT-X-ENDLIST")
+        with open(os.path.join(tmp, "index.m3u8"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp, out_dir)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return len(segments)
+
+
+def package_song(song_id):
+    """Job handler: package one song and record its segment count."""
+    db = SessionLocal()
+    try:
+        row = db.query(Song.file_path).filter_by(id=song_id).first()
+    finally:
+        db.close()
+    if not row:
+        return
+
+    with get_storage().local_copy(row.file_path) as path:
+        count = package(path, hls_dir(song_id))
+
+    db = SessionLocal()
+    try:
+        db.query(Song).filter_by(id=song_id).update({"hls_segments": count or None})
+        db.commit()
+    finally:
+        db.close()
+
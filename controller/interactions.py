@@ -0,0 +1,154 @@
+"""Batched listener interactions: likes, unlikes and play starts.
+
+The listener pages queue these ops in the browser and send them together
+to ``POST /api/interactions``:
+
+    {"ops": [{"op": "like", "song_id": 7, "key": "f3c1..."},
+             {"op": "play", "song_id": 7, "key": "9ab2...", "at": 1700000000000},
+             {"op": "unlike", "song_id": 3, "key": "77de..."}]}
+
+A batch is applied in one transaction. Like and unlike ops are replayed in
+order per song and only each song's final state is written: one INSERT for
+the songs that end up liked, one DELETE for the rest. Plays (``at`` is the
+client's clock in ms, optional) go to the write-behind play buffer in
+controller/play_events.py once the transaction has committed.
+
+Each op may carry a client-chosen ``key``. Keys are stored with the ops, in
+the same transaction, and kept for ``INTERACTION_KEY_TTL`` seconds. A batch
+resent after a lost response is therefore not applied twice: its ops come
+back as ``duplicate``. The response has one result per op, in order:
+
+    {"results": [{"key": "f3c1...", "status": "ok"}, ...]}
+
+``status`` is ``ok``, ``duplicate`` or ``error`` (with an ``error`` text).
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+
+from controller.config import INTERACTION_KEY_TTL
+from controller.models import Favorite, InteractionKey, Song
+
+OPS = ("like", "unlike", "play")
+MAX_KEY_LENGTH = 64
+# Client play timestamps further back than this are taken as "now".
+MAX_PLAY_AGE = timedelta(days=1)
+
+
+def _error(op, message):
+    result = {"status": "error", "error": message}
+    if isinstance(op, dict) and isinstance(op.get("key"), str):
+        result["key"] = op["key"]
+    return result
+
+
+def _validate(op):
+    if not isinstance(op, dict) or op.get("op") not in OPS:
+        return f"op must be one of {', '.join(OPS)}"
+    song_id = op.get("song_id")
+    if not isinstance(song_id, int) or isinstance(song_id, bool):
+        return "song_id must be an integer"
+    key = op.get("key")
+    if key is not None and (not isinstance(key, str) or not 0 < len(key) <= MAX_KEY_LENGTH):
+        return f"key must be a string of 1-{MAX_KEY_LENGTH} characters"
+    return None
+
+
+def _played_at(at, now):
+    if isinstance(at, (int, float)) and not isinstance(at, bool):
+        try:
+            played = datetime.fromtimestamp(at / 1000, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            return now
+        if now - MAX_PLAY_AGE <= played <= now:
+            return played
+    return now
+
+
+def apply_interactions(db, user_id, ops, now=None):
+    """Apply a batch of ops for ``user_id`` in ``db``'s transaction.
+
+    Returns ``(results, plays)``: one result dict per op, and the
+    ``(song_id, played_at)`` plays to record once the caller has committed.
+    """
+    now = now or datetime.utcnow()
+    results = [None] * len(ops)
+    pending = []  # indexes of ops that passed validation
+    for i, op in enumerate(ops):
+        message = _validate(op)
+        if message:
+            results[i] = _error(op, message)
+        else:
+            pending.append(i)
+
+    song_ids = {ops[i]["song_id"] for i in pending}
+    known = {sid for (sid,) in db.query(Song.id).filter(Song.id.in_(song_ids))} if song_ids else set()
+
+    # Claim the keys. Those already stored, or repeated within this batch,
+    # belong to ops that were applied before.
+    keys, applied = {}, []
+    for i in pending:
+        op = ops[i]
+        if op["song_id"] not in known:
+            results[i] = _error(op, "song not found")
+            continue
+        key = op.get("key")
+        if key is not None:
+            if key in keys:
+                results[i] = {"key": key, "status": "duplicate"}
+                continue
+            keys[key] = i
+        applied.append(i)
+
+    db.execute(
+        delete(InteractionKey).where(
+            InteractionKey.user_id == user_id,
+            InteractionKey.created_at < now - timedelta(seconds=INTERACTION_KEY_TTL),
+        )
+    )
+    if keys:
+        stmt = (
+            insert(InteractionKey)
+            .values([{"user_id": user_id, "key": key, "created_at": now} for key in keys])
+            .on_conflict_do_nothing()
+            .returning(InteractionKey.key)
+        )
+        claimed = set(db.execute(stmt).scalars())
+        for key, i in keys.items():
+            if key not in claimed:
+                results[i] = {"key": key, "status": "duplicate"}
+        applied = [i for i in applied if results[i] is None]
+
+    liked, plays = {}, []
+    for i in applied:
+        op = ops[i]
+        if op["op"] == "play":
+            plays.append((op["song_id"], _played_at(op.get("at"), now)))
+        else:
+            liked[op["song_id"]] = op["op"] == "like"
+        results[i] = {"status": "ok"}
+        if op.get("key") is not None:
+            results[i]["key"] = op["key"]
+
+    to_like = [sid for sid, state in liked.items() if state]
+    to_unlike = [sid for sid, state in liked.items() if not state]
+    if to_like:
+        db.execute(
+            insert(Favorite)
+            .values([{"user_id": user_id, "song_id": sid} for sid in to_like])
+            .on_conflict_do_nothing(index_elements=["user_id", "song_id"])
+        )
+    if to_unlike:
+        db.execute(delete(Favorite).where(Favorite.user_id == user_id, Favorite.song_id.in_(to_unlike)))
+    return results, plays
+
+
+def liked_song_ids(db, user_id, song_ids):
+    """The subset of ``song_ids`` the user has liked, in one indexed query."""
+    if not song_ids:
+        return []
+    return sorted(
+        sid for (sid,) in db.query(Favorite.song_id)
+        .filter(Favorite.user_id == user_id, Favorite.song_id.in_(song_ids))
+    )
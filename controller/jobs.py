@@ -0,0 +1,301 @@
+"""Durable background job queue stored in SQLite.
+
+Requests only ``enqueue()`` a row, in the same transaction as the change
+that needs processing. A separate runner process claims queued jobs and
+executes them on a process pool, so slow per-song work (lyrics, metadata,
+transcoding) runs off the request path and in parallel across cores:
+
+    python -m controller.jobs
+
+Kinds listed in ``SCHEDULE`` are also enqueued by the runner itself at a
+fixed interval, for periodic maintenance such as folding new listening
+events into the recommendation model, rolling up the charts, rebuilding
+the changed catalog snapshot chunks and removing files that deletes left
+behind.
+
+Failed jobs are retried with exponential backoff until ``max_attempts``;
+jobs left ``running`` by a crashed runner are re-queued after
+``JOB_STALE_AFTER`` seconds. A handler that raises ``PermanentError``, or
+an ``ImportError`` for a missing optional dependency, fails its job on the
+first attempt, since retrying cannot help.
+"""
+import json
+import signal
+import sys
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from controller.config import (
+    JOB_WORKERS,
+    JOB_MAX_ATTEMPTS,
+    JOB_BACKOFF_SECONDS,
+    JOB_POLL_INTERVAL,
+    JOB_STALE_AFTER,
+    REC_UPDATE_INTERVAL,
+    CHART_ROLLUP_INTERVAL,
+    RECLAIM_INTERVAL,
+    SNAPSHOT_REFRESH_INTERVAL,
+)
+from controller.database import SessionLocal, engine
+from controller.models import Job
+
+
+class PermanentError(Exception):
+    """A failure retrying cannot fix (missing dependency, unusable input)."""
+
+
+def _lyrics(payload):
+    from controller.lyrics import update_song_lyrics
+
+    update_song_lyrics(payload["song_id"])
+
+
+def _metadata(payload):
+    from controller.metadata import extract_song_metadata
+
+    extract_song_metadata(payload["song_id"])
+
+
+def _hls(payload):
+    from controller.hls import package_song
+
+    package_song(payload["song_id"])
+
+
+def _recommendations(payload):
+    from controller.recommendations import update_model
+
+    update_model()
+
+
+def _charts(payload):
+    from controller.charts import rollup
+
+    rollup()
+
+
+def _reclaim(payload):
+    from controller.reclaim import reclaim
+
+    reclaim()
+
+
+def _snapshot(payload):
+    from controller.snapshot import refresh_all
+
+    refresh_all()
+
+
+# kind -> handler(payload). Handlers run in pool processes and import their
+# heavy dependencies lazily so the web workers never load them.
+HANDLERS = {
+    "lyrics": _lyrics,
+    "metadata": _metadata,
+    "hls": _hls,
+    "recommendations": _recommendations,
+    "charts": _charts,
+    "reclaim": _reclaim,
+    "snapshot": _snapshot,
+}
+
+# kind -> seconds between runs, for jobs the runner schedules itself.
+SCHEDULE = {
+    "recommendations": REC_UPDATE_INTERVAL,
+    "charts": CHART_ROLLUP_INTERVAL,
+    "reclaim": RECLAIM_INTERVAL,
+    "snapshot": SNAPSHOT_REFRESH_INTERVAL,
+}
+
+
+def enqueue(db, kind, payload, song_id=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """Add a job to ``db``'s transaction; it becomes visible on commit."""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        song_id=song_id,
+        max_attempts=max_attempts,
+    )
+    db.add(job)
+    return job
+
+
+def job_dict(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "last_error": job.last_error,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def latest_job_status(db, song_ids, kind):
+    """Map song id -> status of its most recent ``kind`` job, in one query."""
+    if not song_ids:
+        return {}
+    rows = (
+        db.query(Job.song_id, Job.status)
+        .filter(Job.song_id.in_(song_ids), Job.kind == kind)
+        .order_by(Job.id)
+        .all()
+    )
+    return dict(rows)
+
+
+# ------------------------------
+# RUNNER
+# ------------------------------
+def claim_job(db):
+    """Atomically move the oldest due job to ``running`` and return it."""
+    now = datetime.utcnow()
+    while True:
+        job = (
+            db.query(Job)
+            .filter(Job.status == "queued", Job.run_after <= now)
+            .order_by(Job.id)
+            .first()
+        )
+        if job is None:
+            return None
+        # Conditional update: if another runner got there first, rowcount
+        # is 0 and we try the next job.
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == "queued")
+            .values(status="running", attempts=Job.attempts + 1, updated_at=now)
+        ).rowcount
+        db.commit()
+        if claimed:
+            db.refresh(job)
+            return job
+
+
+def finish_job(db, job_id, error=None, retry=True):
+    job = db.get(Job, job_id)
+    now = datetime.utcnow()
+    job.updated_at = now
+    if error is None:
+        job.status = "done"
+        job.last_error = None
+    elif retry and job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.last_error = error
+        job.run_after = now + timedelta(seconds=JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+    else:
+        job.status = "failed"
+        job.last_error = error
+    db.commit()
+
+
+def requeue_stale(db):
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    db.execute(
+        update(Job)
+        .where(Job.status == "running", Job.updated_at < cutoff)
+        .values(status="queued")
+    )
+    db.commit()
+
+
+def release_jobs(db, job_ids):
+    """Put ``running`` jobs back in the queue without using up an attempt."""
+    job_ids = list(job_ids)
+    if job_ids:
+        db.execute(
+            update(Job)
+            .where(Job.id.in_(job_ids), Job.status == "running")
+            .values(status="queued", attempts=Job.attempts - 1, updated_at=datetime.utcnow())
+        )
+        db.commit()
+
+
+def schedule_periodic(db, next_run):
+    """Enqueue each due ``SCHEDULE`` kind unless one is already pending."""
+    now = time.monotonic()
+    for kind, interval in SCHEDULE.items():
+        if now < next_run.get(kind, 0):
+            continue
+        next_run[kind] = now + interval
+        pending = db.query(Job.id).filter(Job.kind == kind, Job.status.in_(("queued", "running"))).first()
+        if pending is None:
+            # Finished runs carry no information; keep only failures around.
+            db.query(Job).filter(Job.kind == kind, Job.status == "done").delete()
+            enqueue(db, kind, {}, max_attempts=1)
+            db.commit()
+
+
+def execute(kind, payload):
+    """Run one job inside a pool process.
+
+    Returns ``(error, retry)``: the traceback (None on success) and whether
+    the failure is worth retrying.
+    """
+    try:
+        HANDLERS[kind](json.loads(payload))
+    except (ImportError, PermanentError):
+        return traceback.format_exc(limit=5), False
+    except Exception:
+        return traceback.format_exc(limit=5), True
+    return None, False
+
+
+def _init_worker():
+    # Connections inherited from the parent must not be reused after fork.
+    engine.dispose(close=False)
+
+
+def run_forever(workers=JOB_WORKERS):
+    # Only the runner needs multiprocessing; web workers import this module
+    # just to enqueue, so it is not loaded at import time.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    db = SessionLocal()
+    requeue_stale(db)
+    running = {}
+    next_run = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        try:
+            while True:
+                schedule_periodic(db, next_run)
+                while len(running) < workers:
+                    job = claim_job(db)
+                    if job is None:
+                        break
+                    running[pool.submit(execute, job.kind, job.payload)] = job.id
+
+                if not running:
+                    time.sleep(JOB_POLL_INTERVAL)
+                    continue
+
+                done, _ = wait(running, timeout=JOB_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        error, retry = future.result()
+                    except Exception:
+                        # The pool process itself died (e.g. OOM-killed).
+                        error, retry = traceback.format_exc(limit=5), True
+                    finish_job(db, job_id, error, retry)
+        except (KeyboardInterrupt, SystemExit):
+            # Stopping (SIGTERM from the supervisor): hand the running jobs
+            # back to the queue instead of waiting for them, and do not leave
+            # pool processes behind.
+            release_jobs(db, running.values())
+            for child in multiprocessing.active_children():
+                child.terminate()
+            raise
+
+
+if __name__ == "__main__":
+    from controller.database import create_tables
+
+    create_tables()
+    # SIGTERM unwinds like Ctrl-C, so run_forever can clean up.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Job runner started with {JOB_WORKERS} workers")
+    run_forever()
@@ -0,0 +1,110 @@
+"""Lyrics pipeline: audio -> wav -> speech-to-text -> LLM-formatted lyrics.
+
+Runs in the background job runner (see controller/jobs.py), never in a
+request. ``LYRICS_BACKEND`` picks the implementation:
+
+    stub    deterministic local stand-in, no audio libraries or network
+            (the default)
+    local   pydub + SpeechRecognition for transcription, ollama for lyrics
+
+The local backend needs the packages in requirements-lyrics.txt plus the
+ffmpeg and ollama executables. They are only imported or run when it
+actually runs; if one is missing, the job fails at once instead of being
+retried.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+from controller.config import LYRICS_BACKEND, LYRICS_MODEL
+from controller.database import SessionLocal
+from controller.jobs import PermanentError
+from controller.models import Song
+from controller.storage import get_storage
+
+
+class LyricsError(Exception):
+    """A transient failure; the job is retried with backoff."""
+
+
+def convert_to_wav(input_file, out_dir):
+    from pydub import AudioSegment
+
+    if os.path.splitext(input_file)[1].lower() == ".wav":
+        return input_file
+    if not shutil.which("ffmpeg"):
+        raise PermanentError("ffmpeg is not installed")
+    wav_file = os.path.join(out_dir, "audio.wav")
+    AudioSegment.from_file(input_file).export(wav_file, format="wav")
+    return wav_file
+
+
+def transcribe_audio(audio_path):
+    import speech_recognition as sr
+
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(audio_path) as source:
+        audio_data = recognizer.record(source)
+    try:
+        return recognizer.recognize_google(audio_data)
+    except sr.UnknownValueError:
+        return ""
+    except sr.RequestError as exc:
+        raise LyricsError(f"speech recognition unavailable: {exc}")
+
+
+def generate_lyrics_from_text(raw_text):
+    if not raw_text.strip():
+        return "Lyrics could not be generated."
+    prompt = f"Convert the following spoken text into song lyrics:\n{raw_text}"
+    command = ["ollama", "run", LYRICS_MODEL, prompt]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise PermanentError("ollama is not installed")
+    if result.returncode != 0:
+        raise LyricsError(f"ollama exited with {result.returncode}: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+# ------------------------------
+# STUB BACKEND
+# ------------------------------
+def stub_transcribe(audio_path):
+    return f"stub transcription of {os.path.basename(audio_path)}"
+
+
+def stub_generate(raw_text):
+    return f"Stub lyrics\n{raw_text}"
+
+
+def lyrics_for_file(audio_path, backend=None):
+    backend = backend or LYRICS_BACKEND
+    if backend == "stub":
+        return stub_generate(stub_transcribe(audio_path))
+    with tempfile.TemporaryDirectory() as tmp:
+        return generate_lyrics_from_text(transcribe_audio(convert_to_wav(audio_path, tmp)))
+
+
+def update_song_lyrics(song_id):
+    """Job handler: generate and store lyrics for one song."""
+    # No session is held open across the (minutes-long) generation step.
+    db = SessionLocal()
+    try:
+        row = db.query(Song.file_path, Song.title).filter_by(id=song_id).first()
+    finally:
+        db.close()
+    if not row:
+        return
+
+    with get_storage().local_copy(row.file_path) as path:
+        lyrics = lyrics_for_file(path)
+
+    db = SessionLocal()
+    try:
+        db.query(Song).filter_by(id=song_id).update({"lyrics": lyrics})
+        db.commit()
+    finally:
+        db.close()
+    print(f"Lyrics updated for: {row.title}")
@@ -0,0 +1,46 @@
+from controller.database import SessionLocal
+from controller.models import Song
+from controller.mp3 import probe
+from controller.storage import get_storage
+
+
+def extract_song_metadata(song_id):
+    """Job handler: store duration, bitrate, sample rate and seek index.
+
+    ID3 language/genre tags only fill fields the uploader left empty.
+    """
+    db = SessionLocal()
+    try:
+        song = db.query(Song).filter_by(id=song_id).first()
+        if not song:
+            return
+        with get_storage().local_copy(song.file_path) as path:
+            info = probe(path)
+        if info is None:
+            print(f"No MPEG audio frames found for: {song.title}")
+            return
+        song.duration = info["duration"]
+        song.bitrate = info["bitrate"]
+        song.sample_rate = info["sample_rate"]
+        song.seek_index = info["seek_index"]
+        tags = info["tags"]
+        if not song.language and tags.get("language"):
+            song.language = tags["language"]
+        if not song.genre and tags.get("genre"):
+            song.genre = tags["genre"]
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # Backfill: queue a metadata job for every song that has none yet.
+    from controller.jobs import enqueue
+
+    db = SessionLocal()
+    ids = [sid for (sid,) in db.query(Song.id).filter(Song.duration.is_(None))]
+    for sid in ids:
+        enqueue(db, "metadata", {"song_id": sid}, song_id=sid)
+    db.commit()
+    db.close()
+    print(f"Queued metadata jobs for {len(ids)} songs")
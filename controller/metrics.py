@@ -0,0 +1,379 @@
+"""Request and SQL instrumentation with a Prometheus ``/metrics`` endpoint.
+
+SQLAlchemy cursor events time every statement. Inside a request the count
+and total time are kept on ``flask.g`` and returned as response headers:
+
+    X-Query-Count: 3
+    Server-Timing: db;dur=1.8;desc="3 queries", app;dur=6.2
+
+Statements slower than ``SLOW_QUERY_MS`` are logged as warnings with their
+route, on the ``controller.metrics`` logger (gunicorn.conf.py sends the
+``controller`` loggers to gunicorn's error log).
+
+Each worker keeps its counters and histograms in memory. A background
+thread copies them every ``METRICS_FLUSH_INTERVAL`` seconds into a shared
+SQLite file (``METRICS_DB_PATH``), with one row per (worker, series). A
+worker is its pid plus its start time, so a new process that reuses a pid
+never overwrites the rows of the one before it. A scrape of ``/metrics`` on
+any worker flushes that worker and then sums every worker's rows, so the
+output covers all gunicorn workers without a push gateway. The scrape also
+folds the rows of exited workers into one ``retired`` total: counters never
+go backwards, and the file does not grow with every restart.
+
+With ``PROFILER_ENABLED=1``, an admin can add ``?_profile=1`` to any URL.
+The response is then replaced by the cProfile stats for that request.
+
+Tests can bound the queries an endpoint issues:
+
+    with max_queries(3):
+        client.get("/favourite")
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_app_context, request, session
+from sqlalchemy import event
+
+from controller.config import (
+    METRICS_ENABLED,
+    METRICS_DB_PATH,
+    METRICS_FLUSH_INTERVAL,
+    METRICS_ALLOW,
+    SLOW_QUERY_MS,
+    PROFILER_ENABLED,
+    TRUSTED_PROXIES,
+)
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HELP = {
+    "http_requests_total": ("counter", "Requests by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "Request latency by route."),
+    "http_request_queries": ("histogram", "SQL statements issued per request, by route."),
+    "db_query_duration_seconds": ("histogram", "SQL statement latency."),
+    "db_slow_queries_total": ("counter", "Statements slower than SLOW_QUERY_MS."),
+    "play_events_dropped_total": ("counter", "Play events dropped because the buffer was full."),
+}
+
+
+class Registry:
+    """In-process metric values keyed by (name, sorted label pairs)."""
+
+    def __init__(self, path=METRICS_DB_PATH, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._reset()
+
+    def _reset(self):
+        # Also run in every forked child: a lock held by a parent thread
+        # would otherwise stay locked forever in the child, and the values
+        # and flusher thread belong to the parent.
+        self._lock = threading.Lock()
+        self._values = {}
+        self._pid = None
+        self._worker = None
+
+    def inc(self, name, labels=(), amount=1.0):
+        self._ensure_thread()
+        key = (name, tuple(sorted(labels)))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def observe(self, name, value, buckets, labels=()):
+        self._ensure_thread()
+        labels = tuple(sorted(labels))
+        with self._lock:
+            # Every bucket is written, even at zero, so each series is complete.
+            for le in buckets:
+                key = (name + "_bucket", labels + (("le", repr(float(le))),))
+                self._values[key] = self._values.get(key, 0.0) + (value <= le)
+            inf = (name + "_bucket", labels + (("le", "+Inf"),))
+            self._values[inf] = self._values.get(inf, 0.0) + 1
+            for suffix, amount in (("_sum", value), ("_count", 1)):
+                key = (name + suffix, labels)
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS worker_samples (
+                worker TEXT NOT NULL, pid INTEGER NOT NULL,
+                name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL,
+                PRIMARY KEY (worker, name, labels))
+        """)
+        return conn
+
+    def flush(self):
+        """Write this worker's current values to the shared file."""
+        self._ensure_thread()
+        with self._lock:
+            rows = [
+                (self._worker, self._pid, name, _format_labels(labels), value)
+                for (name, labels), value in self._values.items()
+            ]
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO worker_samples VALUES (?, ?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+
+    def retire_exited(self, conn):
+        """Fold the rows of workers whose process is gone into ``retired``."""
+        exited = [
+            worker for worker, pid in conn.execute("SELECT DISTINCT worker, pid FROM worker_samples WHERE pid > 0")
+            if not _alive(pid)
+        ]
+        if not exited:
+            return
+        marks = ",".join("?" * len(exited))
+        # IMMEDIATE: two workers scraping at once must not both fold the same rows.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                INSERT INTO worker_samples(worker, pid, name, labels, value)
+                SELECT 'retired', 0, name, labels, SUM(value) FROM worker_samples
+                WHERE worker IN ({marks}) GROUP BY name, labels
+                ON CONFLICT(worker, name, labels) DO UPDATE SET value = value + excluded.value
+            """, exited)
+            conn.execute(f"DELETE FROM worker_samples WHERE worker IN ({marks})", exited)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def collect(self):
+        """Sum of every worker's flushed values: {(name, labels_text): value}."""
+        self.flush()
+        conn = self._connect()
+        try:
+            self.retire_exited(conn)
+            return {
+                (name, labels): value
+                for name, labels, value in conn.execute(
+                    "SELECT name, labels, SUM(value) FROM worker_samples GROUP BY name, labels"
+                )
+            }
+        finally:
+            conn.close()
+
+    def _ensure_thread(self):
+        # One flusher thread per process, started on first use; _reset
+        # clears the parent's state in a forked child.
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._worker = f"{pid}-{time.time_ns():x}"
+            threading.Thread(target=self._run, name="metrics-flusher", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                log.warning("Metrics flush failed", exc_info=True)
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry._reset)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + body + "}"
+
+
+_LE = re.compile(r',?le="([^"]+)"')
+
+
+def _family(name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[: -len(suffix)] in HELP:
+            return name[: -len(suffix)]
+    return name
+
+
+def _sort_key(item):
+    # Group each metric family together, one series at a time, with the
+    # buckets in increasing ``le`` order as the exposition format expects.
+    (name, labels), _ = item
+    match = _LE.search(labels)
+    le = float(match.group(1)) if match else 0.0
+    series = _LE.sub("", labels).replace("{,", "{").replace("{}", "")
+    return _family(name), series, name != _family(name) + "_bucket", name, le
+
+
+def render_prometheus(samples):
+    lines = []
+    described = set()
+    for (name, labels), value in sorted(samples.items(), key=_sort_key):
+        base = _family(name)
+        if base not in described and base in HELP:
+            kind, text = HELP[base]
+            lines.append(f"# HELP {base} {text}")
+            lines.append(f"# TYPE {base} {kind}")
+            described.add(base)
+        lines.append(f"{name}{labels} {int(value) if value.is_integer() else value!r}")
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------
+# SQL HOOKS
+# ------------------------------
+_query_local = threading.local()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    registry.observe("db_query_duration_seconds", elapsed, LATENCY_BUCKETS)
+
+    counter = getattr(_query_local, "counter", None)
+    if counter is not None:
+        counter.append(statement)
+
+    route = None
+    if has_app_context() and "query_count" in g:
+        g.query_count += 1
+        g.query_time += elapsed
+        route = request.endpoint
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        registry.inc("db_slow_queries_total", [("route", route or "-")])
+        log.warning("Slow query (%.1f ms, route=%s): %s",
+                    elapsed * 1000, route or "-", " ".join(statement.split())[:1000])
+
+
+def _handle_error(context):
+    # A failed statement (an IntegrityError, a search interrupted by
+    # coalescing) gets no after_cursor_execute; drop its start time here, or
+    # the list grows forever on the pooled connection.
+    if context.connection is not None and context.statement is not None:
+        started = context.connection.info.get("query_started")
+        if started:
+            started.pop()
+
+
+def instrument_engine(engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def count_queries():
+    """Collect the statements run on this thread; yields the list."""
+    previous = getattr(_query_local, "counter", None)
+    _query_local.counter = statements = []
+    try:
+        yield statements
+    finally:
+        _query_local.counter = previous
+
+
+@contextmanager
+def max_queries(limit):
+    """Fail with AssertionError if the block runs more than ``limit`` statements."""
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        listing = "\n".join(f"  {i + 1}. {' '.join(s.split())[:200]}" for i, s in enumerate(statements))
+        raise AssertionError(f"{len(statements)} queries, expected at most {limit}:\n{listing}")
+
+
+# ------------------------------
+# REQUEST HOOKS
+# ------------------------------
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.query_count = 0
+    g.query_time = 0.0
+    if PROFILER_ENABLED and request.args.get("_profile") and session.get("role") == "admin":
+        import cProfile
+
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    if "request_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    route = request.endpoint or "unmatched"
+    labels = [("route", route), ("method", request.method)]
+    registry.inc("http_requests_total", labels + [("status", response.status_code)])
+    registry.observe("http_request_duration_seconds", elapsed, LATENCY_BUCKETS, labels)
+    registry.observe("http_request_queries", g.query_count, QUERY_COUNT_BUCKETS, labels)
+
+    response.headers["X-Query-Count"] = str(g.query_count)
+    response.headers["Server-Timing"] = (
+        f'db;dur={g.query_time * 1000:.1f};desc="{g.query_count} queries", app;dur={elapsed * 1000:.1f}'
+    )
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        import io
+        import pstats
+
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        return Response(out.getvalue(), mimetype="text/plain")
+    return response
+
+
+def _allowed_address():
+    # A forwarded request whose proxy is not trusted (TRUSTED_PROXIES=0)
+    # arrives from the proxy's address, which may well be 127.0.0.1.
+    if not TRUSTED_PROXIES and "X-Forwarded-For" in request.headers:
+        return False
+    return request.remote_addr in METRICS_ALLOW
+
+
+def metrics():
+    allowed = _allowed_address() or session.get("role") == "admin"
+    if not allowed:
+        return Response("forbidden\n", status=403, mimetype="text/plain")
+    body = render_prometheus(registry.collect())
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app, engine):
+    if not METRICS_ENABLED:
+        return
+    instrument_engine(engine)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
@@ -0,0 +1,180 @@
+"""Versioned schema migrations for the SQLite database.
+
+``create_tables()`` only creates tables that are missing, so anything that
+changes an existing table (new indexes, constraints, columns) is applied
+here. The applied version is kept in ``PRAGMA user_version``. Every
+migration must be safe to run on a fresh database that ``create_all()``
+has just built from the current models, so use ``IF NOT EXISTS`` and
+``add_column()`` rather than bare DDL.
+
+Run manually with ``python -m controller.migrations``.
+"""
+import sqlite3
+
+from controller.stats import create_counter_triggers, refresh_counters
+from controller.blobs import create_blob_triggers
+from controller.cache import create_version_triggers
+from controller.search import FTS_UPDATE_TRIGGER
+
+
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def add_column(conn, table, column, ddl):
+    if not column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+# ------------------------------
+# MIGRATIONS
+# ------------------------------
+def m001_indexes_and_unique_pairs(conn):
+    # Duplicates from the old read-then-insert paths would block the unique
+    # indexes; keep the first like / playlist entry and the latest play.
+    conn.execute("""
+        DELETE FROM favorites WHERE id NOT IN (
+            SELECT MIN(id) FROM favorites GROUP BY user_id, song_id)
+    """)
+    conn.execute("""
+        DELETE FROM playlist_songs WHERE id NOT IN (
+            SELECT MIN(id) FROM playlist_songs GROUP BY playlist_id, song_id)
+    """)
+    conn.execute("""
+        DELETE FROM recently_played WHERE id NOT IN (
+            SELECT MAX(id) FROM recently_played GROUP BY user_id, song_id)
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_favorites_user_song ON favorites (user_id, song_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_favorites_song ON favorites (song_id)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_playlist_songs_playlist_song ON playlist_songs (playlist_id, song_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_playlist_songs_song ON playlist_songs (song_id)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_recently_played_user_song ON recently_played (user_id, song_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_recently_played_user_played_at ON recently_played (user_id, played_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_songs_uploader_id ON songs (uploader_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_playlists_user_id ON playlists (user_id)")
+
+
+def m002_stat_counters(conn):
+    create_counter_triggers(conn)
+    refresh_counters(conn)
+
+
+def m003_blob_ref_counts(conn):
+    create_blob_triggers(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_songs_file_path ON songs (file_path)")
+
+
+def m004_song_audio_metadata(conn):
+    add_column(conn, "songs", "duration", "FLOAT")
+    add_column(conn, "songs", "bitrate", "INTEGER")
+    add_column(conn, "songs", "sample_rate", "INTEGER")
+    add_column(conn, "songs", "seek_index", "BLOB")
+
+
+def m005_song_hls_segments(conn):
+    add_column(conn, "songs", "hls_segments", "INTEGER")
+
+
+def m006_playlist_song_positions(conn):
+    add_column(conn, "playlist_songs", "position", "FLOAT NOT NULL DEFAULT 0")
+    # Existing playlists keep their insertion order, spaced POSITION_GAP apart.
+    conn.execute("""
+        UPDATE playlist_songs SET position = (
+            SELECT COUNT(*) FROM playlist_songs p
+            WHERE p.playlist_id = playlist_songs.playlist_id AND p.id <= playlist_songs.id
+        ) * 1024.0
+        WHERE position = 0
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_playlist_songs_playlist_position
+        ON playlist_songs (playlist_id, position)
+    """)
+
+
+def m007_cache_versions(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name VARCHAR NOT NULL PRIMARY KEY, value INTEGER NOT NULL)
+    """)
+    create_version_triggers(conn)
+
+
+def m008_recommendation_events(conn):
+    # Imported here: controller.recommendations needs controller.database,
+    # which imports this module.
+    from controller.recommendations import create_event_triggers, SEED_EVENTS_SQL
+
+    create_event_triggers(conn)
+    # The first model update folds in everything collected so far.
+    conn.execute(SEED_EVENTS_SQL)
+
+
+def m009_catalog_snapshot_chunks(conn):
+    # Imported here for the same reason as in m008.
+    from controller.snapshot import create_snapshot_triggers, SEED_CHUNKS_SQL
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_chunks (
+            chunk INTEGER NOT NULL PRIMARY KEY, version INTEGER NOT NULL,
+            built_version INTEGER NOT NULL, digest VARCHAR)
+    """)
+    create_snapshot_triggers(conn)
+    # Every existing chunk starts stale; the next snapshot refresh builds it.
+    conn.execute(SEED_CHUNKS_SQL)
+
+
+def m010_fts_update_of_indexed_columns(conn):
+    # The old trigger fired on every songs update. The index itself is
+    # unchanged, so no rebuild.
+    conn.execute("DROP TRIGGER IF EXISTS songs_fts_au")
+    conn.execute(FTS_UPDATE_TRIGGER)
+
+
+# (version, migration) in order. Never renumber or edit an applied entry;
+# append a new one instead.
+MIGRATIONS = [
+    (1, m001_indexes_and_unique_pairs),
+    (2, m002_stat_counters),
+    (3, m003_blob_ref_counts),
+    (4, m004_song_audio_metadata),
+    (5, m005_song_hls_segments),
+    (6, m006_playlist_song_positions),
+    (7, m007_cache_versions),
+    (8, m008_recommendation_events),
+    (9, m009_catalog_snapshot_chunks),
+    (10, m010_fts_update_of_indexed_columns),
+]
+
+
+def run_migrations(db_path):
+    """Apply every migration newer than the database's ``user_version``.
+
+    Each migration runs in its own ``BEGIN IMMEDIATE`` transaction, so
+    workers booting at the same time serialize here and the loser sees the
+    version already bumped instead of applying it twice.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        for version, migration in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version <= current:
+                    conn.execute("ROLLBACK")
+                    continue
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+                print(f"Applied migration {version}: {migration.__name__}")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    from controller.database import create_tables
+
+    # create_tables() runs the migrations after creating any missing tables.
+    create_tables()
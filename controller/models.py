@@ -5,9 +5,12 @@ from sqlalchemy import (
     String,
     ForeignKey,
     DateTime,
-    Text
+    Text,
+    Float,
+    LargeBinary,
+    Index
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, relationship, deferred
 from datetime import datetime
 
 Base = declarative_base()
@@ -53,12 +56,19 @@ class Song(Base):
     artist_name = Column(String, nullable=False)
     genre = Column(String)
     language = Column(String)
-    file_path = Column(String, nullable=False)
+    file_path = Column(String, nullable=False, index=True)
 
     # ✅ Lyrics added (this fixes your Jinja error)
     lyrics = Column(Text, nullable=True)
 
-    uploader_id = Column(Integer, ForeignKey("users.id"))
+    # Filled in at ingest by the "metadata" job (controller/mp3.py).
+    duration = Column(Float)        # seconds
+    bitrate = Column(Integer)       # average bits per second
+    sample_rate = Column(Integer)
+    seek_index = deferred(Column(LargeBinary))  # uint32 LE byte offset per second
+    hls_segments = Column(Integer)  # set once the "hls" job has packaged the song
+
+    uploader_id = Column(Integer, ForeignKey("users.id"), index=True)
     uploader = relationship("User", back_populates="songs")
 
 
@@ -67,6 +77,10 @@ class Song(Base):
 # ------------------------------
 class Favorite(Base):
     __tablename__ = "favorites"
+    __table_args__ = (
+        Index("uq_favorites_user_song", "user_id", "song_id", unique=True),
+        Index("ix_favorites_song", "song_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -83,10 +97,11 @@ class Playlist(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     user = relationship("User", back_populates="playlists")
-    songs = relationship("PlaylistSong", back_populates="playlist", cascade="all, delete")
+    songs = relationship("PlaylistSong", back_populates="playlist", cascade="all, delete",
+                         order_by="PlaylistSong.position")
 
 
 # ------------------------------
@@ -94,10 +109,16 @@ class Playlist(Base):
 # ------------------------------
 class PlaylistSong(Base):
     __tablename__ = "playlist_songs"
+    __table_args__ = (
+        Index("uq_playlist_songs_playlist_song", "playlist_id", "song_id", unique=True),
+        Index("ix_playlist_songs_song", "song_id"),
+        Index("ix_playlist_songs_playlist_position", "playlist_id", "position"),
+    )
 
     id = Column(Integer, primary_key=True)
     playlist_id = Column(Integer, ForeignKey("playlists.id"))
     song_id = Column(Integer, ForeignKey("songs.id"))
+    position = Column(Float, nullable=False, default=0.0)  # sort key, see controller/playlists.py
 
     playlist = relationship("Playlist", back_populates="songs")
     song = relationship("Song")
@@ -108,6 +129,10 @@ class PlaylistSong(Base):
 # ------------------------------
 class RecentlyPlayed(Base):
     __tablename__ = "recently_played"
+    __table_args__ = (
+        Index("uq_recently_played_user_song", "user_id", "song_id", unique=True),
+        Index("ix_recently_played_user_played_at", "user_id", "played_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -115,3 +140,179 @@ class RecentlyPlayed(Base):
     played_at = Column(DateTime, default=datetime.utcnow)
 
     song = relationship("Song")
+
+
+# ------------------------------
+# BLOBS (content-addressed audio files, see controller/blobs.py)
+# ------------------------------
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, unique=True, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+
+
+# ------------------------------
+# JOBS (background queue, see controller/jobs.py)
+# ------------------------------
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued / running / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    song_id = Column(Integer, ForeignKey("songs.id"), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# ------------------------------
+# STAT COUNTERS (maintained by triggers, see controller/stats.py)
+# ------------------------------
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+# ------------------------------
+# CACHE VERSIONS (maintained by triggers, see controller/cache.py)
+# ------------------------------
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+# ------------------------------
+# RECOMMENDATION MODEL (see controller/recommendations.py)
+# ------------------------------
+class RecEvent(Base):
+    """+1/-1 per favorite, playlist entry or play-history row, written by triggers."""
+    __tablename__ = "rec_events"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    song_id = Column(Integer, nullable=False)
+    delta = Column(Integer, nullable=False)
+
+
+class RecInteraction(Base):
+    """Events already folded into the model; strength = number of sources."""
+    __tablename__ = "rec_interactions"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    user_id = Column(Integer, primary_key=True)
+    song_id = Column(Integer, primary_key=True)
+    strength = Column(Integer, nullable=False, default=0)
+
+
+class SongPair(Base):
+    """Sparse song x song co-occurrence matrix, one row per nonzero cell."""
+    __tablename__ = "song_pairs"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    song_a = Column(Integer, primary_key=True)
+    song_b = Column(Integer, primary_key=True)
+    weight = Column(Integer, nullable=False, default=0)
+
+
+class SongRec(Base):
+    """Per-song user count and its packed top-K neighbour list."""
+    __tablename__ = "song_recs"
+    __table_args__ = (Index("ix_song_recs_users", "users"),)
+
+    song_id = Column(Integer, primary_key=True)
+    users = Column(Integer, nullable=False, default=0)
+    neighbors = Column(LargeBinary)
+
+
+# ------------------------------
+# CHARTS (see controller/charts.py)
+# ------------------------------
+class PlayHour(Base):
+    __tablename__ = "play_hours"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    hour = Column(Integer, primary_key=True)  # hours since the epoch, UTC
+    song_id = Column(Integer, primary_key=True)
+    plays = Column(Integer, nullable=False, default=0)
+
+
+class PlayDay(Base):
+    __tablename__ = "play_days"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    day = Column(Integer, primary_key=True)  # days since the epoch, UTC
+    song_id = Column(Integer, primary_key=True)
+    plays = Column(Integer, nullable=False, default=0)
+
+
+class Chart(Base):
+    """One precomputed ranking: ``songs`` is a JSON list of [song_id, score]."""
+    __tablename__ = "charts"
+
+    name = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)
+    songs = Column(Text, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+
+
+# ------------------------------
+# CATALOG SNAPSHOT (see controller/snapshot.py)
+# ------------------------------
+class CatalogChunk(Base):
+    """One id range of the catalog snapshot.
+
+    ``version`` is bumped by triggers on every song change in the range;
+    the chunk file is stale while it differs from ``built_version``.
+    """
+    __tablename__ = "catalog_chunks"
+
+    chunk = Column(Integer, primary_key=True)  # song id // CHUNK_SONGS
+    version = Column(Integer, nullable=False, default=0)
+    built_version = Column(Integer, nullable=False, default=0)
+    digest = Column(String)  # content hash of the built file, None if empty
+
+
+# ------------------------------
+# FILE RECLAIMER (see controller/reclaim.py)
+# ------------------------------
+class ReclaimState(Base):
+    __tablename__ = "reclaim_state"
+
+    name = Column(String, primary_key=True)
+    value = Column(String, nullable=False, default="")
+
+
+class ReclaimPending(Base):
+    """Storage key the reclaimer has claimed and is about to delete."""
+    __tablename__ = "reclaim_pending"
+
+    path = Column(String, primary_key=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ------------------------------
+# INTERACTION BATCHES (see controller/interactions.py)
+# ------------------------------
+class InteractionKey(Base):
+    """Idempotency key of an applied interaction op, kept for a while to spot retries."""
+    __tablename__ = "interaction_keys"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,202 @@
+"""MP3 metadata and frame-index extraction, in pure Python.
+
+``probe(path)`` reads an MP3 once and returns its duration, average
+bitrate, sample rate, basic ID3v2 text tags and a seek index: a packed
+little-endian uint32 array whose k-th entry is the byte offset of the
+first frame starting at or after k seconds. Looking up a time offset is
+then a single ``struct.unpack_from``, which stays exact for VBR files where
+bitrate-based estimates drift.
+"""
+import mmap
+import struct
+from array import array
+import sys
+
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+# ID3v2 text frames worth keeping.
+_TAGS = {"TIT2": "title", "TPE1": "artist", "TCON": "genre", "TLAN": "language", "TALB": "album"}
+
+
+class FrameHeader:
+    __slots__ = ("version", "layer", "bitrate", "sample_rate", "length", "samples", "mono")
+
+    def __init__(self, version, layer, bitrate, sample_rate, length, samples, mono):
+        self.version = version
+        self.layer = layer
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.length = length
+        self.samples = samples
+        self.mono = mono
+
+
+def parse_frame_header(b0, b1, b2, b3):
+    """Decode a 4-byte MPEG audio frame header, or return None if invalid."""
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = {0: 25, 2: 2, 3: 1}.get((b1 >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 3)
+    br_idx = b2 >> 4
+    sr_idx = (b2 >> 2) & 3
+    if version is None or layer is None or br_idx in (0, 15) or sr_idx == 3:
+        return None
+
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][br_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][sr_idx]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return FrameHeader(version, layer, bitrate, sample_rate, length, samples, (b3 >> 6) == 3)
+
+
+def _syncsafe(b):
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _decode_text(data):
+    if not data:
+        return ""
+    enc, body = data[0], data[1:]
+    codec = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}.get(enc, "latin-1")
+    return body.decode(codec, "replace").split("\x00")[0].strip()
+
+
+def parse_id3v2(buf):
+    """Return (tag_size, tags) for an ID3v2.3/2.4 tag at the start of ``buf``."""
+    if len(buf) < 10 or buf[:3] != b"ID3":
+        return 0, {}
+    major, flags = buf[3], buf[5]
+    size = 10 + _syncsafe(buf[6:10]) + (10 if flags & 0x10 else 0)
+    tags = {}
+    if major not in (3, 4):
+        return size, tags  # v2.2 tags are skipped, not parsed
+
+    pos, end = 10, min(10 + _syncsafe(buf[6:10]), len(buf))
+    if flags & 0x40:  # extended header
+        ext = buf[pos:pos + 4]
+        pos += _syncsafe(ext) if major == 4 else struct.unpack(">I", ext)[0] + 4
+    while pos + 10 <= end:
+        frame_id = bytes(buf[pos:pos + 4])
+        if frame_id[0] == 0:
+            break  # padding
+        raw = buf[pos + 4:pos + 8]
+        frame_size = _syncsafe(raw) if major == 4 else struct.unpack(">I", raw)[0]
+        body = bytes(buf[pos + 10:pos + 10 + frame_size])
+        key = _TAGS.get(frame_id.decode("latin-1"))
+        if key:
+            tags[key] = _decode_text(body)
+        pos += 10 + frame_size
+    return size, tags
+
+
+def _first_frame(buf, start):
+    """Find the first header at/after ``start`` that is followed by another."""
+    pos, n = start, len(buf)
+    while pos + 4 <= n:
+        pos = buf.find(b"\xff", pos)
+        if pos < 0 or pos + 4 > n:
+            return None, None
+        header = parse_frame_header(buf[pos], buf[pos + 1], buf[pos + 2], buf[pos + 3])
+        if header:
+            nxt = pos + header.length
+            if nxt + 4 > n or parse_frame_header(buf[nxt], buf[nxt + 1], buf[nxt + 2], buf[nxt + 3]):
+                return pos, header
+        pos += 1
+    return None, None
+
+
+def _vbr_frame_count(buf, pos, header):
+    """Frame count from a Xing/Info or VBRI header in the first frame, if any."""
+    if header.version == 1:
+        side = 17 if header.mono else 32
+    else:
+        side = 9 if header.mono else 17
+    xing = pos + 4 + side
+    if buf[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", buf[xing + 4:xing + 8])[0]
+        if flags & 1:
+            return struct.unpack(">I", buf[xing + 8:xing + 12])[0], True
+        return None, True
+    vbri = pos + 36
+    if buf[vbri:vbri + 4] == b"VBRI":
+        return struct.unpack(">I", buf[vbri + 14:vbri + 18])[0], True
+    return None, False
+
+
+def probe(path):
+    """Scan an MP3 file and return its metadata dict, or None if not MP3."""
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None  # empty file
+    try:
+        tag_size, tags = parse_id3v2(buf)
+        pos, header = _first_frame(buf, tag_size)
+        if header is None:
+            return None
+
+        sample_rate = header.sample_rate
+        xing_frames, has_info_frame = _vbr_frame_count(buf, pos, header)
+        if has_info_frame:
+            # The Xing/VBRI frame carries no audio.
+            pos += header.length
+
+        offsets = array("I")
+        audio_start = pos
+        frames = samples = 0
+        n = len(buf)
+        while pos + 4 <= n:
+            h = parse_frame_header(buf[pos], buf[pos + 1], buf[pos + 2], buf[pos + 3])
+            if h is None or h.length <= 0:
+                break  # trailing tag (ID3v1/APE) or garbage
+            # Record this frame for every whole second it starts at/after.
+            while len(offsets) * sample_rate <= samples:
+                offsets.append(pos)
+            samples += h.samples
+            frames += 1
+            pos += h.length
+        audio_end = min(pos, n)
+    finally:
+        buf.close()
+
+    if frames == 0:
+        return None
+    duration = samples / sample_rate
+    if xing_frames and xing_frames > frames:
+        # Truncated scan; trust the encoder's count for duration.
+        duration = xing_frames * header.samples / sample_rate
+    if sys.byteorder != "little":
+        offsets.byteswap()
+
+    return {
+        "duration": round(duration, 3),
+        "bitrate": int((audio_end - audio_start) * 8 / duration) if duration else header.bitrate,
+        "sample_rate": sample_rate,
+        "seek_index": offsets.tobytes(),
+        "audio_start": audio_start,
+        "audio_end": audio_end,
+        "tags": tags,
+    }
+
+
+def byte_offset_at(seek_index, seconds):
+    """O(1) lookup of the frame-aligned byte offset for a time in seconds."""
+    count = len(seek_index) // 4
+    if not count:
+        return 0
+    k = min(max(int(seconds), 0), count - 1)
+    return struct.unpack_from("<I", seek_index, k * 4)[0]
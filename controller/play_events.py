@@ -0,0 +1,155 @@
+"""Write-behind buffer for play events.
+
+``/log-play`` is the highest-volume write in the app. Instead of a
+transaction (and an fsync) per track start, events are appended to an
+in-process buffer and flushed to ``recently_played`` in one bulk upsert
+when the buffer reaches ``PLAY_FLUSH_SIZE`` or every
+``PLAY_FLUSH_INTERVAL`` seconds, whichever comes first. Each flush also
+trims every touched user's history to ``RECENTLY_PLAYED_LIMIT`` rows with
+a single DELETE, and adds the plays to the hourly chart counters (see
+controller/charts.py).
+
+Events still in memory when a worker is killed hard are lost; that is an
+accepted trade-off for play history. A normal shutdown flushes via atexit.
+A failed flush puts its batch back for the next one, but the buffer never
+holds more than ``PLAY_BUFFER_MAX`` events: while the database keeps
+failing, the oldest are dropped and counted in
+``play_events_dropped_total``.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.sqlite import insert
+
+from controller.config import PLAY_BUFFER_MAX, PLAY_FLUSH_SIZE, PLAY_FLUSH_INTERVAL, RECENTLY_PLAYED_LIMIT
+from controller.charts import record_plays
+from controller.database import engine
+from controller.metrics import registry
+from controller.models import RecentlyPlayed
+
+_UPSERT = insert(RecentlyPlayed)
+_UPSERT = _UPSERT.on_conflict_do_update(
+    index_elements=["user_id", "song_id"],
+    set_={"played_at": _UPSERT.excluded.played_at},
+)
+
+_PRUNE = text("""
+    DELETE FROM recently_played WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY played_at DESC, id DESC
+            ) AS rn
+            FROM recently_played
+            WHERE user_id IN :user_ids
+        ) WHERE rn > :keep
+    )
+""").bindparams(bindparam("user_ids", expanding=True))
+
+
+class PlayEventBuffer:
+    def __init__(self, flush_size=PLAY_FLUSH_SIZE, flush_interval=PLAY_FLUSH_INTERVAL,
+                 history_limit=RECENTLY_PLAYED_LIMIT, max_events=PLAY_BUFFER_MAX):
+        self.flush_size = flush_size
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.history_limit = history_limit
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._events = []
+        self._pid = None
+        self._thread = None
+
+    def record(self, user_id, song_id, played_at=None):
+        """Queue one play; returns immediately."""
+        self._ensure_thread()
+        with self._lock:
+            self._events.append((user_id, song_id, played_at or datetime.utcnow()))
+            full = len(self._events) >= self.flush_size
+            dropped = self._trim()
+        self._count_dropped(dropped)
+        if full:
+            self._wake.set()
+
+    def _trim(self):
+        """Drop the oldest events over ``max_events``; call with ``_lock`` held."""
+        overflow = len(self._events) - self.max_events
+        if overflow <= 0:
+            return 0
+        del self._events[:overflow]
+        return overflow
+
+    @staticmethod
+    def _count_dropped(dropped):
+        if dropped:
+            registry.inc("play_events_dropped_total", amount=dropped)
+
+    def flush(self):
+        """Write every buffered event in one transaction. Returns the count."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+
+            # Collapse repeats of the same (user, song) to the latest play.
+            latest = {}
+            for user_id, song_id, played_at in events:
+                key = (user_id, song_id)
+                if key not in latest or played_at > latest[key]:
+                    latest[key] = played_at
+            rows = [
+                {"user_id": u, "song_id": s, "played_at": t}
+                for (u, s), t in latest.items()
+            ]
+            user_ids = sorted({u for u, _ in latest})
+
+            try:
+                with engine.begin() as conn:
+                    conn.execute(_UPSERT, rows)
+                    # Charts count every play, not just the latest per user.
+                    record_plays(conn, events)
+                    if self.history_limit:
+                        conn.execute(_PRUNE, {"user_ids": user_ids, "keep": self.history_limit})
+            except Exception:
+                # Put the batch back so the next flush retries it.
+                with self._lock:
+                    self._events[:0] = events
+                    dropped = self._trim()
+                self._count_dropped(dropped)
+                raise
+            return len(events)
+
+    def _ensure_thread(self):
+        # Started lazily, and again after a fork: threads do not survive
+        # fork(), and a preloaded master must not own the flusher.
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # Events copied from the parent belong to the parent.
+                self._events = []
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._run, name="play-event-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"Play event flush failed: {exc}")
+
+
+play_events = PlayEventBuffer()
+atexit.register(play_events.flush)
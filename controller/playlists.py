@@ -0,0 +1,148 @@
+"""Ordered playlist storage.
+
+``PlaylistSong.position`` is a float sort key. New songs are appended
+``POSITION_GAP`` apart, and a song moved between two neighbours takes the
+midpoint of their positions, so reordering rewrites only the rows that
+actually moved. If repeated midpoints exhaust float precision the
+playlist is renumbered once.
+
+Saving an edit diffs the submitted order against the stored one: removed
+songs go in one DELETE, added songs in one executemany INSERT, and only
+songs outside the longest already-in-order run get a new position.
+"""
+from bisect import bisect_left
+
+from sqlalchemy import delete, func, insert, update
+
+from controller.cache import response_cache, library
+from controller.models import Playlist, PlaylistSong
+
+POSITION_GAP = 1024.0
+# Below this spacing midpoints stop being distinguishable; renumber instead.
+MIN_GAP = 1e-9
+
+
+def ordered_song_ids(desired):
+    """Dedupe song ids, keeping first occurrence order."""
+    return list(dict.fromkeys(int(sid) for sid in desired))
+
+
+def user_playlists(db, user_id):
+    """The user's playlists as ``{"id", "name"}`` dicts, cached per library version."""
+    return response_cache.fetch(
+        db, f"playlists:{user_id}", [library(user_id)],
+        lambda: [
+            {"id": p.id, "name": p.name}
+            for p in db.query(Playlist.id, Playlist.name).filter_by(user_id=user_id).order_by(Playlist.id)
+        ],
+    )
+
+
+def add_songs(db, playlist_id, song_ids):
+    """Append songs to the end of a playlist with one bulk INSERT."""
+    song_ids = ordered_song_ids(song_ids)
+    if not song_ids:
+        return
+    last = db.query(func.max(PlaylistSong.position)).filter_by(playlist_id=playlist_id).scalar() or 0.0
+    db.execute(insert(PlaylistSong), [
+        {"playlist_id": playlist_id, "song_id": sid, "position": last + POSITION_GAP * (i + 1)}
+        for i, sid in enumerate(song_ids)
+    ])
+
+
+def _stable_songs(current_order, desired_index):
+    """Songs already in the right relative order (longest increasing run)."""
+    seq = [desired_index[sid] for sid in current_order]
+    tails, tails_at, parent = [], [], [None] * len(seq)
+    for i, v in enumerate(seq):
+        k = bisect_left(tails, v)
+        if k == len(tails):
+            tails.append(v)
+            tails_at.append(i)
+        else:
+            tails[k] = v
+            tails_at[k] = i
+        parent[i] = tails_at[k - 1] if k else None
+    stable = set()
+    i = tails_at[-1] if tails_at else None
+    while i is not None:
+        stable.add(current_order[i])
+        i = parent[i]
+    return stable
+
+
+def _fill(lo, hi, count):
+    """``count`` positions strictly between lo and hi (either may be None)."""
+    if lo is None and hi is None:
+        return [POSITION_GAP * (i + 1) for i in range(count)]
+    if hi is None:
+        return [lo + POSITION_GAP * (i + 1) for i in range(count)]
+    if lo is None:
+        return [hi - POSITION_GAP * (count - i) for i in range(count)]
+    step = (hi - lo) / (count + 1)
+    if step < MIN_GAP:
+        return None
+    return [lo + step * (i + 1) for i in range(count)]
+
+
+def plan_positions(current, desired):
+    """Return {song_id: new_position} for songs that must be (re)placed.
+
+    ``current`` maps song_id -> position for rows already stored; ``desired``
+    is the target order. Returns None if precision ran out and the whole
+    playlist needs renumbering.
+    """
+    desired_index = {sid: i for i, sid in enumerate(desired)}
+    current_order = sorted((sid for sid in current if sid in desired_index), key=current.get)
+    stable = _stable_songs(current_order, desired_index)
+
+    placed = {}
+    run, lo = [], None
+    for sid in desired + [None]:
+        if sid is not None and sid not in stable:
+            run.append(sid)
+            continue
+        hi = current[sid] if sid is not None else None
+        if run:
+            positions = _fill(lo, hi, len(run))
+            if positions is None:
+                return None
+            placed.update(zip(run, positions))
+            run = []
+        lo = hi
+    return placed
+
+
+def apply_edit(db, playlist_id, song_ids):
+    """Make the playlist hold exactly ``song_ids`` in that order, touching
+    only the rows that are added, removed or moved."""
+    desired = ordered_song_ids(song_ids)
+    rows = db.query(PlaylistSong.id, PlaylistSong.song_id, PlaylistSong.position).filter_by(
+        playlist_id=playlist_id
+    ).all()
+    row_id = {r.song_id: r.id for r in rows}
+    current = {r.song_id: r.position for r in rows}
+
+    wanted = set(desired)
+    removed = [row_id[sid] for sid in current if sid not in wanted]
+    if removed:
+        db.execute(delete(PlaylistSong).where(PlaylistSong.id.in_(removed)))
+    for sid in list(current):
+        if sid not in wanted:
+            del current[sid]
+
+    placed = plan_positions(current, desired)
+    if placed is None:
+        # Out of room between neighbours: renumber everything once.
+        placed = {sid: POSITION_GAP * (i + 1) for i, sid in enumerate(desired)}
+
+    moved = [{"id": row_id[sid], "position": pos} for sid, pos in placed.items() if sid in current]
+    added = [
+        {"playlist_id": playlist_id, "song_id": sid, "position": pos}
+        for sid, pos in placed.items() if sid not in current
+    ]
+    if moved:
+        db.execute(update(PlaylistSong), moved)
+    if added:
+        db.execute(insert(PlaylistSong), added)
+    return {"added": len(added), "removed": len(removed), "moved": len(moved)}
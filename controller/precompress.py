@@ -0,0 +1,62 @@
+"""Precompressed copies of static responses, and picking one per request.
+
+Files that are served many times but change rarely (catalog snapshot
+chunks, built CSS/JS) are compressed once at build time at the highest
+levels, next to the original:
+
+    name.ext  name.ext.gz  name.ext.br
+
+``best_encoding`` then picks the copy the client accepts, so serving never
+compresses anything. Brotli is optional; without it only gzip copies are
+written and served.
+"""
+import gzip
+import os
+import tempfile
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Most preferred first: (Accept-Encoding token, file suffix).
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def write_with_copies(path, data, gzip_level=9, brotli_quality=11):
+    """Write ``data`` to ``path`` plus its .gz (and .br) copies."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # mtime=0 keeps the gzip bytes identical across rebuilds and hosts.
+    write_atomic(path + ".gz", gzip.compress(data, gzip_level, mtime=0))
+    if brotli is not None:
+        write_atomic(path + ".br", brotli.compress(data, quality=brotli_quality))
+    # The plain file goes last: its presence means the set is complete.
+    write_atomic(path, data)
+
+
+def best_encoding(path, accept_encoding):
+    """``(path, content_encoding)`` of the best copy of ``path`` the client accepts.
+
+    The client's q-values decide, with ``ENCODINGS`` order breaking ties;
+    an encoding at ``q=0`` (directly or through ``*``) is never used.
+    """
+    accepted = parse_accept_header(accept_encoding)
+    best, best_q = (path, None), 0
+    for token, suffix in ENCODINGS:
+        q = accepted.quality(token)
+        if q > best_q and os.path.exists(path + suffix):
+            best, best_q = (path + suffix, token), q
+    return best
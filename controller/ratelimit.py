@@ -0,0 +1,275 @@
+"""Rate limits, concurrency caps and search coalescing shared by all workers.
+
+State lives in a small SQLite file (``RATE_LIMIT_DB_PATH``) that every
+gunicorn worker on the host opens, so a client cannot get around a limit by
+landing on another worker. Each check is a single statement and costs tens
+of microseconds. The check runs before the request touches the main
+database, so a rejected request never queues for SQLite's writer.
+
+Token buckets
+    Each scope (see ``LIMITS``) has a bucket per user and one per client
+    address. A bucket holds up to ``burst`` tokens and refills at
+    ``burst / seconds`` per second. Every request takes one token. A request
+    that finds a bucket empty gets a 429 with ``Retry-After`` set to the
+    time until the next token. Behind a reverse proxy, set
+    ``TRUSTED_PROXIES`` so the address is the client's from
+    X-Forwarded-For rather than the proxy's, which every client shares.
+
+Concurrency caps
+    ``CONCURRENCY`` bounds how many requests of a scope one client (the
+    user, or the address when signed out) has running at once across all
+    workers. With a cap of 1 on search, one user typing fast can hold one
+    worker at most, while other users' searches run as usual. Requests over
+    the cap are turned away at once with a 429, instead of queueing behind
+    the ones running. A slot held by a worker that died is ignored after
+    ``RATE_LIMIT_SLOT_TIMEOUT`` seconds.
+
+Search coalescing
+    Each search box numbers its requests (``seq``) and sends a random
+    ``page`` id chosen when the page loads, so the numbering restarts
+    safely on every page and two open pages never interfere. A search that
+    is already older than the newest one registered for its user and page
+    is answered with an empty 204 and never runs. A search that is still
+    running when a newer one arrives is interrupted at its next SQLite
+    progress callback.
+
+The file is disposable, like the response cache: deleting it only resets
+the buckets. If it is busy or broken, the checks let requests through.
+"""
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import jsonify, request, session
+
+from controller.config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_DB_PATH, RATE_LIMIT_SLOT_TIMEOUT,
+    RATE_LIMIT_WRITES, RATE_LIMIT_WRITES_PER_IP, RATE_LIMIT_SEARCH, RATE_LIMIT_SEARCH_PER_IP,
+    CONCURRENCY_WRITES, CONCURRENCY_SEARCH,
+)
+
+
+def _parse_rate(spec):
+    """``"30/10"`` -> (burst 30, refill 3.0 tokens per second)."""
+    count, seconds = spec.split("/")
+    return int(count), int(count) / float(seconds)
+
+
+# scope -> (per-user bucket, per-address bucket)
+LIMITS = {
+    "writes": (_parse_rate(RATE_LIMIT_WRITES), _parse_rate(RATE_LIMIT_WRITES_PER_IP)),
+    "search": (_parse_rate(RATE_LIMIT_SEARCH), _parse_rate(RATE_LIMIT_SEARCH_PER_IP)),
+}
+CONCURRENCY = {"writes": CONCURRENCY_WRITES, "search": CONCURRENCY_SEARCH}
+
+# SQLite VM instructions between checks for a newer search (about a millisecond).
+_PROGRESS_STEPS = 20000
+
+
+class Superseded(Exception):
+    """A newer request from the same client made this one pointless."""
+
+
+class RateLimiter:
+    # Prune idle buckets roughly once per this many checks.
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path=RATE_LIMIT_DB_PATH, enabled=RATE_LIMIT_ENABLED,
+                 slot_timeout=RATE_LIMIT_SLOT_TIMEOUT):
+        self.path = path
+        self.enabled = enabled
+        self.slot_timeout = slot_timeout
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._checks = 0
+
+    def _shared(self):
+        # One connection per process; a forked worker must not reuse its parent's.
+        if self._pid != os.getpid():
+            # A short timeout: waiting on the limiter would defeat its purpose.
+            self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=0.05)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS slots (
+                    id INTEGER PRIMARY KEY, scope TEXT NOT NULL, started REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS ix_slots_scope ON slots (scope, started);
+                CREATE TABLE IF NOT EXISTS latest (key TEXT PRIMARY KEY, seq INTEGER NOT NULL, updated REAL NOT NULL);
+            """)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._shared().execute(sql, params).fetchone()
+
+    # ------------------------------
+    # TOKEN BUCKETS
+    # ------------------------------
+    def take(self, key, burst, rate):
+        """Take a token from ``key``'s bucket; returns 0 or the seconds to wait."""
+        if not self.enabled:
+            return 0
+        now = time.time()
+        # Refill, then take a token only if a whole one is there. One
+        # statement, so concurrent workers cannot both spend the last token.
+        refilled = "MIN(:burst, tokens + (:now - updated) * :rate)"
+        try:
+            tokens, allowed = self._execute(
+                f"""
+                INSERT INTO buckets(key, tokens, updated, allowed) VALUES (:key, :burst - 1, :now, 1)
+                ON CONFLICT(key) DO UPDATE SET
+                    allowed = {refilled} >= 1,
+                    tokens = {refilled} - ({refilled} >= 1),
+                    updated = :now
+                RETURNING tokens, allowed
+                """,
+                {"key": key, "burst": burst, "rate": rate, "now": now},
+            )
+            self._checks += 1
+            if self._checks % self.PRUNE_EVERY == 0:
+                # A bucket idle this long is full again, which is the same as no bucket.
+                self._execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+                self._execute("DELETE FROM latest WHERE updated < ?", (now - 3600,))
+        except sqlite3.Error:
+            return 0
+        return 0 if allowed else (1 - tokens) / rate
+
+    def check(self, scope, user_id, address):
+        """Seconds until ``scope`` may be used again by this client, or 0."""
+        (user_burst, user_rate), (ip_burst, ip_rate) = LIMITS[scope]
+        wait = self.take(f"ip:{address}:{scope}", ip_burst, ip_rate)
+        if not wait and user_id is not None:
+            wait = self.take(f"user:{user_id}:{scope}", user_burst, user_rate)
+        return wait
+
+    # ------------------------------
+    # CONCURRENCY SLOTS
+    # ------------------------------
+    def acquire(self, scope, limit):
+        """A slot id if fewer than ``limit`` ``scope`` requests are running, else None.
+
+        ``scope`` names whose requests are counted, e.g. ``search:user:7``.
+
+        Returns 0 (a slot that needs no release) when limiting is off or the
+        store is unavailable.
+        """
+        if not self.enabled or not limit:
+            return 0
+        now = time.time()
+        try:
+            row = self._execute(
+                """
+                INSERT INTO slots(scope, started)
+                SELECT :scope, :now
+                WHERE (SELECT COUNT(*) FROM slots WHERE scope = :scope AND started > :stale) < :limit
+                RETURNING id
+                """,
+                {"scope": scope, "now": now, "stale": now - self.slot_timeout, "limit": limit},
+            )
+            if row is None:
+                self._execute("DELETE FROM slots WHERE scope = ? AND started <= ?", (scope, now - self.slot_timeout))
+        except sqlite3.Error:
+            return 0
+        return row[0] if row else None
+
+    def release(self, slot):
+        if slot:
+            try:
+                self._execute("DELETE FROM slots WHERE id = ?", (slot,))
+            except sqlite3.Error:
+                pass  # the slot times out instead
+
+    # ------------------------------
+    # COALESCING
+    # ------------------------------
+    def register(self, key, seq):
+        """Record ``seq`` for ``key``; returns the newest seq seen (maybe ``seq``)."""
+        try:
+            row = self._execute(
+                """
+                INSERT INTO latest(key, seq, updated) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET seq = MAX(seq, excluded.seq), updated = excluded.updated
+                RETURNING seq
+                """,
+                (key, seq, time.time()),
+            )
+        except sqlite3.Error:
+            return seq
+        return row[0]
+
+    def newest(self, key):
+        try:
+            row = self._execute("SELECT seq FROM latest WHERE key = ?", (key,))
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    @contextmanager
+    def coalesce(self, db, key, seq):
+        """Run the block unless a newer ``seq`` for ``key`` exists; abort it if one arrives.
+
+        Raises ``Superseded`` in either case. Without a ``seq`` the block
+        just runs.
+        """
+        if not self.enabled or seq is None:
+            yield
+            return
+        if self.register(key, seq) > seq:
+            raise Superseded()
+
+        def newer_arrived():
+            newest = self.newest(key)
+            return 1 if newest is not None and newest > seq else 0
+
+        raw = db.connection().connection.driver_connection
+        raw.set_progress_handler(newer_arrived, _PROGRESS_STEPS)
+        try:
+            yield
+        except Exception as e:
+            # The interrupt surfaces as an OperationalError from the query.
+            if "interrupted" in str(e) and newer_arrived():
+                db.rollback()
+                raise Superseded() from e
+            raise
+        finally:
+            raw.set_progress_handler(None, 0)
+
+
+limiter = RateLimiter()
+
+
+def too_many(wait, scope):
+    resp = jsonify({"error": "too many requests", "scope": scope})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(max(1, math.ceil(wait)))
+    return resp
+
+
+def limited(scope):
+    """Route decorator: token buckets, then the concurrency cap, for ``scope``."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = session.get("user_id")
+            wait = limiter.check(scope, user_id, request.remote_addr)
+            if wait:
+                return too_many(wait, scope)
+            client = f"user:{user_id}" if user_id is not None else f"ip:{request.remote_addr}"
+            slot = limiter.acquire(f"{scope}:{client}", CONCURRENCY[scope])
+            if slot is None:
+                # Running requests finish in milliseconds; one second is plenty.
+                return too_many(1, scope)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.release(slot)
+        return wrapper
+    return decorator
@@ -0,0 +1,194 @@
+"""Background reconciler for files no row points at any more.
+
+Deletes only touch the database (controller/deletion.py). The "reclaim"
+job, which the job runner schedules every ``RECLAIM_INTERVAL`` seconds,
+removes what they leave behind. Each run does a bounded slice of work:
+
+1. Released blobs: rows in ``blobs`` whose ref_count dropped to zero. The
+   row is deleted and its file removed from storage.
+2. Orphaned uploads: keys under uploads/ in the storage backend
+   (controller/storage.py) that neither a song nor a blob references. Each
+   run lists ``RECLAIM_BATCH`` keys in key order and resumes after the
+   last one, from a cursor kept in ``reclaim_state``. The keys are checked
+   against songs.file_path and blobs.path in batches, so a full pass never
+   loads the whole catalog.
+3. Partial uploads left in uploads/.tmp and HLS packaging leftovers.
+4. HLS folders of songs that no longer exist.
+
+Steps 1 and 2 only claim keys, in one short write transaction: the
+released blob rows are deleted and every key to remove goes into
+``reclaim_pending``. The files are deleted after the commit, with no lock
+held, so a slow backend (hundreds of S3 DELETEs) never blocks the web
+workers' writes. Each key is checked again just before its delete and is
+kept if a row references it by then. It is then cleared from
+``reclaim_pending``. An upload that claims a pending key waits in
+``place_upload`` until it is cleared, so its file is placed after the
+delete, never before it. Keys left pending by a crashed run are finished
+by the next one. Files younger than ``RECLAIM_MIN_AGE`` are never touched.
+
+    python -m controller.reclaim      # one run by hand
+"""
+import os
+import shutil
+import time
+from itertools import islice
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+
+from controller.blobs import TMP_DIR
+from controller.config import HLS_DIR, RECLAIM_BATCH, RECLAIM_MIN_AGE
+from controller.database import SessionLocal
+from controller.models import Blob, ReclaimPending, ReclaimState, Song
+from controller.storage import get_storage
+
+_IN_CHUNK = 500
+
+
+def _old_enough(path, now):
+    try:
+        return now - os.stat(path).st_mtime >= RECLAIM_MIN_AGE
+    except FileNotFoundError:
+        return False
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except FileNotFoundError:
+        return []
+
+
+# ------------------------------
+# UPLOAD SCAN
+# ------------------------------
+def scan_uploads(storage, cursor, limit):
+    """Up to ``limit`` ``(key, mtime)`` pairs of uploads stored after ``cursor``.
+
+    Returns ``(items, next_cursor)``. ``next_cursor`` is "" once the scan
+    has reached the end, so the next run starts over.
+    """
+    items = list(islice(storage.iter_keys("uploads/", after=cursor), limit))
+    return items, (items[-1][0] if len(items) == limit else "")
+
+
+# ------------------------------
+# DATABASE-CHECKED RECLAIM
+# ------------------------------
+def _referenced(db, paths):
+    found = set()
+    for i in range(0, len(paths), _IN_CHUNK):
+        chunk = paths[i:i + _IN_CHUNK]
+        found.update(p for (p,) in db.query(Song.file_path).filter(Song.file_path.in_(chunk)))
+        found.update(p for (p,) in db.query(Blob.path).filter(Blob.path.in_(chunk)))
+    return found
+
+
+def _claim_blobs(db, limit):
+    """Delete released blob rows; returns their paths."""
+    paths = [p for (p,) in db.query(Blob.path).filter(Blob.ref_count <= 0).limit(limit)]
+    if paths:
+        db.execute(delete(Blob).where(Blob.path.in_(paths), Blob.ref_count <= 0))
+    return paths
+
+
+def _claim_orphans(db, items, now):
+    referenced = _referenced(db, [key for key, _ in items])
+    return [key for key, mtime in items if key not in referenced and now - mtime >= RECLAIM_MIN_AGE]
+
+
+def _delete_pending(db, storage, limit):
+    """Delete claimed keys from storage, outside any transaction."""
+    paths = [p for (p,) in db.query(ReclaimPending.path).order_by(ReclaimPending.path).limit(limit)]
+    removed = 0
+    for path in paths:
+        # An upload that committed since the claim keeps its file. One that
+        # commits from here on waits for the pending row to go.
+        if not _referenced(db, [path]):
+            removed += bool(storage.delete(path))
+        db.execute(delete(ReclaimPending).where(ReclaimPending.path == path))
+        db.commit()
+    return removed
+
+
+# ------------------------------
+# DISK-ONLY RECLAIM
+# ------------------------------
+def _reclaim_leftovers(now):
+    """Partial uploads and interrupted HLS packaging runs."""
+    removed = 0
+    for name in _listdir(TMP_DIR):
+        path = os.path.join(TMP_DIR, name)
+        if _old_enough(path, now):
+            removed += _unlink(path)
+    for name in _listdir(HLS_DIR):
+        path = os.path.join(HLS_DIR, name)
+        if name.startswith(".tmp-") and _old_enough(path, now):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def _reclaim_hls(db, now):
+    folders = {int(name): name for name in _listdir(HLS_DIR) if name.isdigit()}
+    ids = list(folders)
+    existing = set()
+    for i in range(0, len(ids), _IN_CHUNK):
+        existing.update(s for (s,) in db.query(Song.id).filter(Song.id.in_(ids[i:i + _IN_CHUNK])))
+    removed = 0
+    for song_id in set(ids) - existing:
+        path = os.path.join(HLS_DIR, folders[song_id])
+        if _old_enough(path, now):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def reclaim(batch=RECLAIM_BATCH):
+    """One bounded reconciler run; returns counts of what was removed."""
+    now = time.time()
+    storage = get_storage()
+    db = SessionLocal()
+    try:
+        cursor = db.query(ReclaimState.value).filter_by(name="uploads_cursor").scalar() or ""
+        # Listing happens before the write lock is taken; only the checks
+        # and claims need to hold it.
+        items, next_cursor = scan_uploads(storage, cursor, batch)
+
+        # Saving the cursor is the transaction's first write, which takes
+        # SQLite's write lock for the checks and claims below. No storage
+        # call is made while it is held.
+        stmt = insert(ReclaimState).values(name="uploads_cursor", value=next_cursor)
+        db.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"value": next_cursor}))
+        blobs = _claim_blobs(db, batch)
+        orphans = [key for key in _claim_orphans(db, items, now) if key not in set(blobs)]
+        claimed = sorted(blobs + orphans)
+        if claimed:
+            db.execute(insert(ReclaimPending).values([{"path": p} for p in claimed]).on_conflict_do_nothing())
+        db.commit()
+
+        counts = {
+            "blobs": len(blobs),
+            "orphans": len(orphans),
+            "deleted": _delete_pending(db, storage, 2 * batch),
+        }
+        counts["hls"] = _reclaim_hls(db, now)
+        counts["leftovers"] = _reclaim_leftovers(now)
+        return counts
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from controller.database import create_tables
+
+    create_tables()
+    print(reclaim())
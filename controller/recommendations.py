@@ -0,0 +1,316 @@
+"""Item-to-item recommendations from favorites, playlists and play history.
+
+Every listener interaction (a favorite, a playlist entry, a play-history
+row) is an implicit vote linking a user to a song. Triggers append a +1/-1
+row to ``rec_events`` for each of these writes, and ``update_model()``
+folds pending events into three tables:
+
+    rec_interactions   (user, song) -> how many sources link them
+    song_pairs         sparse co-occurrence matrix C = X^T X, one row per
+                       nonzero cell, stored in both directions
+    song_recs          per-song user count and packed top-K neighbours
+
+When a user gains song ``s``, only the cells pairing ``s`` with that user's
+other songs change, so an update costs O(basket) writes per new
+interaction rather than a rebuild. Neighbour lists are then recomputed
+for the songs whose row of C changed, using cosine similarity
+C[a, b] / sqrt(n_a * n_b). Other lists keep slightly stale scores (a
+neighbour's n_b moved) until their own row next changes or ``--rebuild``.
+
+Each neighbour list is stored as one blob: K little-endian uint32 song ids
+followed by K float32 scores. Serving reads the blobs of the user's seed
+songs in one query and merges them in memory.
+
+The job runner schedules ``update_model`` every ``REC_UPDATE_INTERVAL``
+seconds. ``python -m controller.recommendations`` runs it once by hand, and
+``--rebuild`` replays the event log from the base tables.
+"""
+import heapq
+import math
+import sys
+from array import array
+from collections import Counter, defaultdict
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.sqlite import insert
+
+from controller.config import REC_NEIGHBORS, REC_BATCH_SIZE, REC_SEED_SONGS, REC_RESULTS
+from controller.database import SessionLocal
+from controller.models import (
+    Favorite, Playlist, PlaylistSong, RecentlyPlayed, RecEvent, RecInteraction, Song, SongPair, SongRec,
+)
+
+
+def _event(user, song, delta):
+    return f"INSERT INTO rec_events(user_id, song_id, delta) VALUES ({user}, {song}, {delta});"
+
+
+def _playlist_event(ref, delta):
+    # playlist_songs carries no user_id; look it up through the playlist.
+    return (
+        f"INSERT INTO rec_events(user_id, song_id, delta) "
+        f"SELECT user_id, {ref}.song_id, {delta} FROM playlists WHERE id = {ref}.playlist_id;"
+    )
+
+
+def _trigger(name, event, table, body):
+    return f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table} BEGIN {body} END"
+
+
+EVENT_TRIGGERS = [
+    _trigger("rec_favorites_ai", "INSERT", "favorites", _event("new.user_id", "new.song_id", 1)),
+    _trigger("rec_favorites_ad", "DELETE", "favorites", _event("old.user_id", "old.song_id", -1)),
+    _trigger("rec_playlist_songs_ai", "INSERT", "playlist_songs", _playlist_event("new", 1)),
+    _trigger("rec_playlist_songs_ad", "DELETE", "playlist_songs", _playlist_event("old", -1)),
+    _trigger("rec_plays_ai", "INSERT", "recently_played", _event("new.user_id", "new.song_id", 1)),
+    _trigger("rec_plays_ad", "DELETE", "recently_played", _event("old.user_id", "old.song_id", -1)),
+]
+
+
+def create_event_triggers(conn):
+    for ddl in EVENT_TRIGGERS:
+        conn.execute(ddl)
+
+
+# One event per existing interaction; replaying these builds the model.
+SEED_EVENTS_SQL = """
+    INSERT INTO rec_events(user_id, song_id, delta)
+    SELECT user_id, song_id, 1 FROM favorites
+    UNION ALL
+    SELECT playlists.user_id, playlist_songs.song_id, 1
+    FROM playlist_songs JOIN playlists ON playlists.id = playlist_songs.playlist_id
+    UNION ALL
+    SELECT user_id, song_id, 1 FROM recently_played
+"""
+
+
+# ------------------------------
+# PACKED NEIGHBOUR LISTS
+# ------------------------------
+def pack_neighbors(pairs):
+    ids = array("I", (song_id for song_id, _ in pairs))
+    scores = array("f", (score for _, score in pairs))
+    if sys.byteorder != "little":
+        ids.byteswap()
+        scores.byteswap()
+    return ids.tobytes() + scores.tobytes()
+
+
+def unpack_neighbors(blob):
+    half = len(blob) // 2
+    ids, scores = array("I"), array("f")
+    ids.frombytes(blob[:half])
+    scores.frombytes(blob[half:])
+    if sys.byteorder != "little":
+        ids.byteswap()
+        scores.byteswap()
+    return zip(ids, scores)
+
+
+# ------------------------------
+# INCREMENTAL UPDATE
+# ------------------------------
+_PAIR_UPSERT = insert(SongPair)
+_PAIR_UPSERT = _PAIR_UPSERT.on_conflict_do_update(
+    index_elements=["song_a", "song_b"],
+    set_={"weight": SongPair.weight + _PAIR_UPSERT.excluded.weight},
+)
+_USERS_UPSERT = insert(SongRec)
+_USERS_UPSERT = _USERS_UPSERT.on_conflict_do_update(
+    index_elements=["song_id"],
+    set_={"users": SongRec.users + _USERS_UPSERT.excluded.users},
+)
+_STRENGTH_UPSERT = insert(RecInteraction)
+_STRENGTH_UPSERT = _STRENGTH_UPSERT.on_conflict_do_update(
+    index_elements=["user_id", "song_id"],
+    set_={"strength": RecInteraction.strength + _STRENGTH_UPSERT.excluded.strength},
+)
+
+_ROW_SQL = text("""
+    SELECT p.song_a, p.song_b, p.weight, r.users
+    FROM song_pairs p JOIN song_recs r ON r.song_id = p.song_b
+    WHERE p.song_a IN :songs AND p.weight > 0
+""").bindparams(bindparam("songs", expanding=True))
+
+
+def _pair_deltas(basket, changed, delta, out):
+    """Add ``delta`` to every cell pairing a ``changed`` song with the basket."""
+    for a in changed:
+        for b in basket:
+            # Both ends changed: count the pair once, from its smaller id.
+            if b == a or (b in changed and b < a):
+                continue
+            out[(a, b)] += delta
+            out[(b, a)] += delta
+
+
+def _chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def refresh_neighbors(db, song_ids, k=REC_NEIGHBORS):
+    """Recompute the cosine top-K list for each song in ``song_ids``."""
+    for chunk in _chunks(song_ids):
+        users = dict(db.query(SongRec.song_id, SongRec.users).filter(SongRec.song_id.in_(chunk)))
+        rows = defaultdict(list)
+        for a, b, weight, n_b in db.execute(_ROW_SQL, {"songs": chunk}):
+            n_a = users.get(a, 0)
+            if n_a > 0 and n_b > 0:
+                rows[a].append((b, weight / math.sqrt(n_a * n_b)))
+        for a in chunk:
+            top = heapq.nlargest(k, rows.get(a, ()), key=lambda pair: pair[1])
+            db.query(SongRec).filter_by(song_id=a).update({"neighbors": pack_neighbors(top) if top else None})
+
+
+def update_model(batch_size=REC_BATCH_SIZE):
+    """Fold pending events into the model, one batch per transaction.
+
+    Returns the number of events consumed.
+    """
+    consumed = 0
+    while True:
+        db = SessionLocal()
+        try:
+            events = db.query(RecEvent.id, RecEvent.user_id, RecEvent.song_id, RecEvent.delta).order_by(
+                RecEvent.id
+            ).limit(batch_size).all()
+            if not events:
+                return consumed
+
+            net = Counter()
+            for _, user_id, song_id, delta in events:
+                net[(user_id, song_id)] += delta
+            net = {key: d for key, d in net.items() if d}
+            by_user = defaultdict(list)
+            for user_id, song_id in net:
+                by_user[user_id].append(song_id)
+
+            # Which interactions cross zero, i.e. enter or leave a basket.
+            added, removed = defaultdict(set), defaultdict(set)
+            for user_id, songs in by_user.items():
+                before = dict(
+                    db.query(RecInteraction.song_id, RecInteraction.strength)
+                    .filter(RecInteraction.user_id == user_id, RecInteraction.song_id.in_(songs))
+                )
+                for song_id in songs:
+                    old = before.get(song_id, 0)
+                    new = old + net[(user_id, song_id)]
+                    if old <= 0 < new:
+                        added[user_id].add(song_id)
+                    elif new <= 0 < old:
+                        removed[user_id].add(song_id)
+
+            if net:
+                db.execute(_STRENGTH_UPSERT, [
+                    {"user_id": u, "song_id": s, "strength": d} for (u, s), d in net.items()
+                ])
+                db.query(RecInteraction).filter(RecInteraction.strength <= 0).delete()
+
+            cells = Counter()
+            user_counts = Counter()
+            for user_id in set(added) | set(removed):
+                basket = {s for (s,) in db.query(RecInteraction.song_id).filter_by(user_id=user_id)}
+                gained, lost = added[user_id], removed[user_id]
+                _pair_deltas(basket, gained, 1, cells)
+                _pair_deltas((basket - gained) | lost, lost, -1, cells)
+                for s in gained:
+                    user_counts[s] += 1
+                for s in lost:
+                    user_counts[s] -= 1
+
+            cells = {key: d for key, d in cells.items() if d}
+            if cells:
+                db.execute(_PAIR_UPSERT, [{"song_a": a, "song_b": b, "weight": d} for (a, b), d in cells.items()])
+                db.query(SongPair).filter(SongPair.weight <= 0).delete()
+            if user_counts:
+                db.execute(_USERS_UPSERT, [{"song_id": s, "users": d} for s, d in user_counts.items()])
+
+            refresh_neighbors(db, {a for a, _ in cells} | set(user_counts))
+            db.query(RecEvent).filter(RecEvent.id <= events[-1].id).delete()
+            db.commit()
+            consumed += len(events)
+        finally:
+            db.close()
+
+
+def rebuild_model():
+    """Drop the model and replay every interaction from the base tables."""
+    db = SessionLocal()
+    try:
+        for model in (RecEvent, RecInteraction, SongPair, SongRec):
+            db.query(model).delete()
+        db.commit()
+        db.execute(text(SEED_EVENTS_SQL))
+        db.commit()
+    finally:
+        db.close()
+    return update_model()
+
+
+# ------------------------------
+# SERVING
+# ------------------------------
+def seed_songs(db, user_id, limit=REC_SEED_SONGS):
+    """The user's most telling songs: recent plays first, then favorites and playlists."""
+    seeds = [s for (s,) in db.query(RecentlyPlayed.song_id).filter_by(user_id=user_id)
+             .order_by(RecentlyPlayed.played_at.desc()).limit(limit)]
+    seeds += [s for (s,) in db.query(Favorite.song_id).filter_by(user_id=user_id)
+              .order_by(Favorite.id.desc()).limit(limit)]
+    seeds += [s for (s,) in db.query(PlaylistSong.song_id).join(Playlist, Playlist.id == PlaylistSong.playlist_id)
+              .filter(Playlist.user_id == user_id).order_by(PlaylistSong.id.desc()).limit(limit)]
+    return list(dict.fromkeys(seeds))
+
+
+def recommend(db, user_id, limit=REC_RESULTS):
+    """Top songs for a user: sum of neighbour scores over their seed songs.
+
+    Users without history (or whose songs have no neighbours yet) get the
+    most widely collected songs instead.
+    """
+    seeds = seed_songs(db, user_id)
+    seen = set(seeds)
+    scores = Counter()
+    if seeds:
+        for (blob,) in db.query(SongRec.neighbors).filter(SongRec.song_id.in_(seeds), SongRec.neighbors.isnot(None)):
+            for song_id, score in unpack_neighbors(blob):
+                if song_id not in seen:
+                    scores[song_id] += score
+
+    ranked = [song_id for song_id, _ in scores.most_common(limit * 2)]
+    if len(ranked) < limit:
+        popular = db.query(SongRec.song_id).order_by(SongRec.users.desc()).limit(limit * 2 + len(seen))
+        ranked += [s for (s,) in popular if s not in seen and s not in scores]
+
+    # Neighbour lists may still mention deleted songs; the join drops them.
+    rows = {
+        row.id: row for row in db.query(Song.id, Song.title, Song.artist_name, Song.hls_segments)
+        .filter(Song.id.in_(ranked))
+    }
+    songs = []
+    for song_id in ranked:
+        row = rows.get(song_id)
+        if row is None:
+            continue
+        songs.append({
+            "id": row.id,
+            "title": row.title,
+            "artist": row.artist_name,
+            "file": f"/stream/{row.id}",
+            "hls": f"/hls/{row.id}/index.m3u8" if row.hls_segments else None,
+            "score": round(scores.get(song_id, 0.0), 4),
+        })
+        if len(songs) == limit:
+            break
+    return songs
+
+
+if __name__ == "__main__":
+    from controller.database import create_tables
+
+    create_tables()
+    if "--rebuild" in sys.argv:
+        print(f"Rebuilt recommendations from {rebuild_model()} interactions")
+    else:
+        print(f"Folded {update_model()} events into recommendations")
@@ -0,0 +1,95 @@
+import re
+
+from sqlalchemy import text
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# Only an update that sets an indexed column re-tokenizes the row; play
+# counts, audio metadata and HLS progress leave the index alone.
+FTS_UPDATE_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS songs_fts_au
+    AFTER UPDATE OF title, artist_name, genre, language, lyrics ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, artist_name, genre, language, lyrics)
+        VALUES ('delete', old.id, old.title, old.artist_name, old.genre, old.language, old.lyrics);
+        INSERT INTO songs_fts(rowid, title, artist_name, genre, language, lyrics)
+        VALUES (new.id, new.title, new.artist_name, new.genre, new.language, new.lyrics);
+    END
+"""
+
+# External-content FTS5 index over songs: the text lives only in `songs`,
+# the index stores tokens. Triggers keep it in step with every insert, update
+# and delete, whichever code path (ORM or bulk SQL) makes the change.
+# prefix='2 3' adds prefix indexes so search-as-you-type stays an index
+# lookup rather than a scan over the term list.
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+        title, artist_name, genre, language, lyrics,
+        content='songs', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS songs_fts_ai AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts(rowid, title, artist_name, genre, language, lyrics)
+        VALUES (new.id, new.title, new.artist_name, new.genre, new.language, new.lyrics);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS songs_fts_ad AFTER DELETE ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, artist_name, genre, language, lyrics)
+        VALUES ('delete', old.id, old.title, old.artist_name, old.genre, old.language, old.lyrics);
+    END
+    """,
+    FTS_UPDATE_TRIGGER,
+]
+
+# bm25() column weights, in index column order: a title hit outranks an
+# artist hit, which outranks genre/language, which outranks lyrics.
+BM25_WEIGHTS = "10.0, 5.0, 2.0, 2.0, 1.0"
+
+SEARCH_SQL = text(f"""
+    SELECT songs.id, songs.title, songs.artist_name
+    FROM songs_fts
+    JOIN songs ON songs.id = songs_fts.rowid
+    WHERE songs_fts MATCH :match
+    ORDER BY bm25(songs_fts, {BM25_WEIGHTS})
+    LIMIT :limit
+""")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def create_search_index(conn):
+    """Create the FTS table and triggers, backfilling it on first creation."""
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='songs_fts'"
+    )).first()
+    for ddl in SEARCH_INDEX_DDL:
+        conn.execute(text(ddl))
+    if not exists:
+        conn.execute(text("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')"))
+
+
+def build_match_query(q):
+    """Turn free text into an FTS5 prefix query: every word must match.
+
+    Words are quoted so user input can never be parsed as FTS5 syntax
+    (AND/OR/NEAR, column filters, stray quotes).
+    """
+    tokens = _TOKEN_RE.findall(q)
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def ranked_search(db, q, limit=DEFAULT_LIMIT):
+    match = build_match_query(q)
+    if not match:
+        return []
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    rows = db.execute(SEARCH_SQL, {"match": match, "limit": limit}).all()
+    return [
+        {"id": r.id, "title": r.title, "artist": r.artist_name, "file": f"/stream/{r.id}"}
+        for r in rows
+    ]
@@ -0,0 +1,205 @@
+"""Content-hashed, precompressed catalog snapshot for client-side rendering.
+
+The listener dashboard renders the catalog in the browser from static JSON
+files instead of paging through /api/songs. Songs are split by id into
+chunks of ``CHUNK_SONGS``, each stored as one compact file:
+
+    {"fields": ["id", "title", ...], "songs": [[7, "Blue Moon", ...], ...]}
+
+A file is named after its content hash (``<chunk>-<digest>.json``) and is
+written with ``.json.gz`` and ``.json.br`` copies. The name changes
+whenever the content does, so the files are served as ``immutable`` and
+browsers and proxies never revalidate them. A manifest lists the current
+files. It is served with an ETag and ``no-cache``, so when the catalog has
+not changed, a dashboard visit costs one 304.
+
+Triggers bump ``catalog_chunks.version`` for the chunk of any song that is
+inserted or deleted, or that has a snapshot column updated. This happens in
+the same transaction as the write. ``refresh()`` rebuilds only the chunks
+whose version has moved since their last build. An upload therefore
+re-encodes and recompresses one chunk rather than the whole catalog.
+
+Only the job runner writes the files. It runs ``refresh()`` as the
+periodic ``snapshot`` job, every ``SNAPSHOT_REFRESH_INTERVAL`` seconds, and
+bootstrap runs it once at startup. The routes only read: the manifest lists
+the chunks as last built, so until the next run it keeps serving the
+previous files, which stay on disk. Web workers never race each other
+writing or pruning the same files.
+
+The files live in ``SNAPSHOT_DIR``, outside ``static/``, so they can only
+be reached through the routes that set the encoding headers. A chunk whose
+file has gone missing (for example on a fresh host) is rewritten by the
+next refresh.
+"""
+import hashlib
+import json
+import os
+import re
+
+from sqlalchemy import update
+
+from controller.config import SNAPSHOT_DIR, SNAPSHOT_GZIP_LEVEL, SNAPSHOT_BROTLI_QUALITY
+from controller.models import CatalogChunk, Song
+from controller.precompress import best_encoding, write_with_copies
+
+# Baked into the triggers below; changing it needs a migration.
+CHUNK_SONGS = 1024
+
+FIELDS = ("id", "title", "artist", "genre", "language", "duration", "hls")
+_COLUMNS = (Song.id, Song.title, Song.artist_name, Song.genre, Song.language, Song.duration, Song.hls_segments)
+
+_NAME = re.compile(r"^(\d+)-([0-9a-f]{16})\.json$")
+
+
+# ------------------------------
+# CHUNK VERSION TRIGGERS
+# ------------------------------
+def _bump(ref):
+    return (
+        f"INSERT INTO catalog_chunks(chunk, version, built_version) VALUES ({ref}.id / {CHUNK_SONGS}, 1, 0) "
+        f"ON CONFLICT(chunk) DO UPDATE SET version = version + 1;"
+    )
+
+
+SNAPSHOT_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS snapshot_songs_ai AFTER INSERT ON songs BEGIN {_bump('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS snapshot_songs_ad AFTER DELETE ON songs BEGIN {_bump('old')} END",
+    # Only columns that appear in the snapshot; lyrics or metadata edits don't move it.
+    "CREATE TRIGGER IF NOT EXISTS snapshot_songs_au AFTER UPDATE OF "
+    f"title, artist_name, genre, language, duration, hls_segments ON songs BEGIN {_bump('new')} END",
+]
+
+SEED_CHUNKS_SQL = f"""
+    INSERT OR IGNORE INTO catalog_chunks(chunk, version, built_version)
+    SELECT DISTINCT id / {CHUNK_SONGS}, 1, 0 FROM songs
+"""
+
+
+def create_snapshot_triggers(conn):
+    for ddl in SNAPSHOT_TRIGGERS:
+        conn.execute(ddl)
+
+
+# ------------------------------
+# BUILDING
+# ------------------------------
+def encode_chunk(rows):
+    """Compact JSON bytes for one chunk's rows, newest song first."""
+    songs = [
+        [song_id, title, artist, genre, language, round(duration, 1) if duration else None, bool(hls)]
+        for song_id, title, artist, genre, language, duration, hls in rows
+    ]
+    return json.dumps({"fields": FIELDS, "songs": songs}, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _remove_old_files(chunk, keep):
+    # Clients holding the previous manifest may still ask for the digest
+    # before ``keep``'s, so one generation back survives each rebuild.
+    prefix = f"{chunk}-"
+    try:
+        names = os.listdir(SNAPSHOT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.startswith(prefix) and name.split(".", 1)[0][len(prefix):] not in keep:
+            try:
+                os.unlink(os.path.join(SNAPSHOT_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+def _path(chunk, digest):
+    return os.path.join(SNAPSHOT_DIR, f"{chunk}-{digest}.json")
+
+
+def build_chunk(db, chunk, version, previous_digest=None):
+    """Write the files for ``chunk`` as of ``version`` and record the digest."""
+    rows = (
+        db.query(*_COLUMNS)
+        .filter(Song.id >= chunk * CHUNK_SONGS, Song.id < (chunk + 1) * CHUNK_SONGS)
+        .order_by(Song.id.desc())
+        .all()
+    )
+    digest = None
+    if rows:
+        data = encode_chunk(rows)
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        path = _path(chunk, digest)
+        if not os.path.exists(path):
+            write_with_copies(path, data, SNAPSHOT_GZIP_LEVEL, SNAPSHOT_BROTLI_QUALITY)
+    # Guarded on ``version``: if a song changed meanwhile the chunk stays stale.
+    db.execute(
+        update(CatalogChunk)
+        .where(CatalogChunk.chunk == chunk, CatalogChunk.version == version)
+        .values(built_version=version, digest=digest)
+    )
+    _remove_old_files(chunk, {digest, previous_digest})
+    return digest
+
+
+def refresh(db):
+    """Rebuild every chunk whose songs changed since it was last built, or whose file is missing."""
+    stale = [
+        (chunk, version, digest)
+        for chunk, version, built_version, digest in db.query(
+            CatalogChunk.chunk, CatalogChunk.version, CatalogChunk.built_version, CatalogChunk.digest
+        )
+        if version != built_version or (digest and not os.path.exists(_path(chunk, digest)))
+    ]
+    for chunk, version, digest in stale:
+        build_chunk(db, chunk, version, previous_digest=digest)
+    return len(stale)
+
+
+def refresh_all():
+    """Job handler: bring the snapshot files up to date."""
+    from controller.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        refresh(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+# ------------------------------
+# SERVING
+# ------------------------------
+def manifest(db):
+    """Chunk file names as last built, newest songs first, plus a version tag for the ETag."""
+    chunks = [
+        f"{chunk}-{digest}.json"
+        for chunk, digest in db.query(CatalogChunk.chunk, CatalogChunk.digest)
+        .filter(CatalogChunk.digest.isnot(None))
+        .order_by(CatalogChunk.chunk.desc())
+    ]
+    version = hashlib.sha256(" ".join(chunks).encode()).hexdigest()[:16]
+    return {"version": version, "chunks": chunks}
+
+
+def chunk_file(name, accept_encoding=""):
+    """Path and Content-Encoding (or None) of the best file for ``name``.
+
+    Returns ``(None, None)`` if there is no such file.
+    """
+    if not _NAME.match(name):
+        return None, None
+    path = os.path.join(SNAPSHOT_DIR, name)
+    if not os.path.exists(path):
+        return None, None
+    return best_encoding(path, accept_encoding)
+
+
+if __name__ == "__main__":
+    from controller.database import SessionLocal, create_tables
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        # Mark every chunk stale so each is re-checked and missing files rewritten.
+        db.execute(update(CatalogChunk).values(built_version=0))
+        print(f"Rebuilt {refresh(db)} catalog chunks into {SNAPSHOT_DIR}")
+        db.commit()
+    finally:
+        db.close()
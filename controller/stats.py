@@ -0,0 +1,120 @@
+"""Rollup counters for the admin dashboard.
+
+``stat_counters`` holds one row per counter and is maintained by SQLite
+triggers, so every write path (ORM, bulk SQL, the play-event flusher)
+updates it inside the same transaction as the change itself. Keys:
+
+    users:role:<role_id>    users per role
+    songs:genre:<genre>     songs per genre ('' for no genre)
+    playlists, favorites    row totals
+    plays                   cumulative play events (never decremented, so
+                            pruning old history does not lower it)
+
+``refresh_counters()`` rebuilds everything except ``plays`` from the base
+tables; run it with ``python -m controller.stats`` if counters are ever
+suspected to have drifted.
+"""
+import sqlite3
+
+from controller.models import StatCounter, Role
+
+
+def _bump(key, delta):
+    return (
+        f"INSERT INTO stat_counters(name, value) VALUES ({key}, {delta}) "
+        f"ON CONFLICT(name) DO UPDATE SET value = value + {delta};"
+    )
+
+
+def _trigger(name, event, table, body, when=None):
+    cond = f" WHEN {when}" if when else ""
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}{cond} "
+        f"BEGIN {body} END"
+    )
+
+
+_USER_KEY = "'users:role:' || {}.role_id"
+_SONG_KEY = "'songs:genre:' || COALESCE({}.genre, '')"
+
+COUNTER_TRIGGERS = [
+    _trigger("stats_users_ai", "INSERT", "users", _bump(_USER_KEY.format("new"), 1)),
+    _trigger("stats_users_ad", "DELETE", "users", _bump(_USER_KEY.format("old"), -1)),
+    _trigger("stats_users_au", "UPDATE OF role_id", "users",
+             _bump(_USER_KEY.format("old"), -1) + _bump(_USER_KEY.format("new"), 1),
+             when="old.role_id IS NOT new.role_id"),
+    _trigger("stats_songs_ai", "INSERT", "songs", _bump(_SONG_KEY.format("new"), 1)),
+    _trigger("stats_songs_ad", "DELETE", "songs", _bump(_SONG_KEY.format("old"), -1)),
+    _trigger("stats_songs_au", "UPDATE OF genre", "songs",
+             _bump(_SONG_KEY.format("old"), -1) + _bump(_SONG_KEY.format("new"), 1),
+             when="old.genre IS NOT new.genre"),
+    _trigger("stats_playlists_ai", "INSERT", "playlists", _bump("'playlists'", 1)),
+    _trigger("stats_playlists_ad", "DELETE", "playlists", _bump("'playlists'", -1)),
+    _trigger("stats_favorites_ai", "INSERT", "favorites", _bump("'favorites'", 1)),
+    _trigger("stats_favorites_ad", "DELETE", "favorites", _bump("'favorites'", -1)),
+    # A replay upserts played_at on the existing row, so count both.
+    _trigger("stats_plays_ai", "INSERT", "recently_played", _bump("'plays'", 1)),
+    _trigger("stats_plays_au", "UPDATE OF played_at", "recently_played", _bump("'plays'", 1)),
+]
+
+
+def create_counter_triggers(conn):
+    for ddl in COUNTER_TRIGGERS:
+        conn.execute(ddl)
+
+
+def refresh_counters(conn):
+    """Recompute counters from the base tables (``conn`` is a sqlite3 connection)."""
+    conn.execute("DELETE FROM stat_counters WHERE name != 'plays'")
+    conn.execute("""
+        INSERT INTO stat_counters(name, value)
+        SELECT 'users:role:' || role_id, COUNT(*) FROM users GROUP BY role_id
+    """)
+    conn.execute("""
+        INSERT INTO stat_counters(name, value)
+        SELECT 'songs:genre:' || COALESCE(genre, ''), COUNT(*) FROM songs
+        GROUP BY COALESCE(genre, '')
+    """)
+    conn.execute("INSERT INTO stat_counters(name, value) SELECT 'playlists', COUNT(*) FROM playlists")
+    conn.execute("INSERT INTO stat_counters(name, value) SELECT 'favorites', COUNT(*) FROM favorites")
+    # Cumulative plays cannot be recovered once history is pruned; only seed it.
+    conn.execute("""
+        INSERT OR IGNORE INTO stat_counters(name, value)
+        SELECT 'plays', COUNT(*) FROM recently_played
+    """)
+
+
+def read_counters(db):
+    """Return the dashboard rollups with a single small-table read."""
+    counters = dict(db.query(StatCounter.name, StatCounter.value).all())
+    role_names = dict(db.query(Role.id, Role.name).all())
+
+    users_by_role = {}
+    songs_by_genre = {}
+    for name, value in counters.items():
+        if name.startswith("users:role:") and value:
+            role_id = int(name.rsplit(":", 1)[1])
+            users_by_role[role_names.get(role_id, "unknown")] = value
+        elif name.startswith("songs:genre:") and value:
+            songs_by_genre[name.split(":", 2)[2] or "Unknown"] = value
+
+    return {
+        "total_users": sum(users_by_role.values()),
+        "total_songs": sum(songs_by_genre.values()),
+        "total_playlists": counters.get("playlists", 0),
+        "total_favorites": counters.get("favorites", 0),
+        "total_plays": counters.get("plays", 0),
+        "users_by_role": users_by_role,
+        "songs_by_genre": dict(sorted(songs_by_genre.items(), key=lambda kv: -kv[1])),
+    }
+
+
+if __name__ == "__main__":
+    from controller.database import engine
+
+    conn = sqlite3.connect(engine.url.database, isolation_level=None, timeout=30)
+    conn.execute("BEGIN IMMEDIATE")
+    refresh_counters(conn)
+    conn.execute("COMMIT")
+    conn.close()
+    print("Counters refreshed")
@@ -0,0 +1,437 @@
+"""Where uploaded audio lives: sharded local disk or an S3-compatible bucket.
+
+Songs and blobs store a storage key, the static-relative path
+``uploads/<aa>/<bb>/<sha256><ext>`` (see controller/blobs.py). The key is
+the same for every backend, so switching backends is just copying the
+objects across. ``STORAGE_BACKEND`` picks the driver:
+
+``local``
+    Files under static/, one directory level per hash byte, so no
+    directory grows past a few hundred entries. Playback goes through
+    ``send_audio`` (Range, ETag, sendfile).
+
+``s3``
+    Any S3-compatible store (AWS, MinIO, Ceph, R2) reached over plain
+    HTTP(S) with SigV4 signing and path-style URLs, so no SDK is needed.
+    Uploads stream from the spooled temp file. Playback answers with a
+    redirect to a short-lived presigned URL, so the audio bytes never go
+    through a web worker. The store handles Range requests itself.
+
+Both drivers have the same small interface: ``put_file``, ``upload``,
+``exists``, ``delete``, ``open``, ``local_copy`` (for the jobs that need a
+real path), ``iter_keys`` (for the reconciler) and ``serve``.
+
+Existing files are moved into the current layout with
+
+    python -m controller.storage migrate            # flat uploads/ -> shards
+    python -m controller.storage migrate --to s3    # ...then copy to the bucket
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import hmac
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from urllib.parse import quote, urlsplit
+
+from flask import redirect
+from werkzeug.security import safe_join
+
+from controller.config import (
+    STATIC_DIR, STORAGE_BACKEND, S3_ENDPOINT, S3_BUCKET, S3_REGION,
+    S3_ACCESS_KEY, S3_SECRET_KEY, S3_PRESIGN_SECONDS,
+)
+from controller.streaming import send_audio
+
+_COPY_CHUNK = 256 * 1024
+
+
+# ------------------------------
+# LOCAL DISK
+# ------------------------------
+class LocalStorage:
+    def __init__(self, root=STATIC_DIR):
+        self.root = root
+
+    def path(self, key):
+        return safe_join(self.root, key)
+
+    def exists(self, key):
+        path = self.path(key)
+        return path is not None and os.path.isfile(path)
+
+    def put_file(self, key, src_path):
+        """Move ``src_path`` to ``key``; drop it instead if ``key`` exists."""
+        dest = self.path(key)
+        if os.path.exists(dest):
+            os.remove(src_path)
+            return False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(src_path, dest)
+        return True
+
+    def upload(self, key, src_path):
+        """Copy ``src_path`` to ``key``, leaving the source in place."""
+        dest = self.path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(src_path, tmp)
+            os.replace(tmp, dest)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    @contextlib.contextmanager
+    def local_copy(self, key):
+        yield self.path(key)
+
+    def iter_keys(self, prefix, after=""):
+        """``(key, mtime)`` for every file under ``prefix``, in key order, after ``after``.
+
+        Dot-entries (partial uploads in uploads/.tmp) are skipped.
+        """
+        yield from self._walk(prefix.rstrip("/"), after)
+
+    def _walk(self, dir_key, after):
+        try:
+            entries = list(os.scandir(os.path.join(self.root, dir_key)))
+        except FileNotFoundError:
+            return
+        # Sort as the full keys sort: "a/" after "a.mp3", as in S3 listings.
+        entries.sort(key=lambda e: e.name + "/" if e.is_dir() else e.name)
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            key = f"{dir_key}/{entry.name}"
+            if entry.is_dir():
+                # Skip whole subtrees that sort before the cursor.
+                if key + "/" > after or after.startswith(key + "/"):
+                    yield from self._walk(key, after)
+            elif key > after:
+                try:
+                    yield key, entry.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+
+    def serve(self, key, start=None):
+        path = self.path(key)
+        if path is None:
+            return None
+        return send_audio(path, start=start)
+
+
+# ------------------------------
+# S3-COMPATIBLE
+# ------------------------------
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+_S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+def _uri_encode(value, safe="-_.~"):
+    return quote(value, safe=safe)
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+class S3Error(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"S3 returned {status}: {body[:200]!r}")
+        self.status = status
+
+
+class S3Storage:
+    """Path-style S3 client with SigV4 header and query signing."""
+
+    def __init__(self, endpoint=S3_ENDPOINT, bucket=S3_BUCKET, region=S3_REGION,
+                 access_key=S3_ACCESS_KEY, secret_key=S3_SECRET_KEY,
+                 presign_seconds=S3_PRESIGN_SECONDS):
+        url = urlsplit(endpoint)
+        self.scheme = url.scheme or "https"
+        self.host = url.netloc
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.presign_seconds = presign_seconds
+
+    # --- signing ---
+    def _scope(self, date):
+        return f"{date}/{self.region}/s3/aws4_request"
+
+    def _signature(self, amz_date, canonical_request):
+        date = amz_date[:8]
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, self._scope(date),
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        key = _hmac(("AWS4" + self.secret_key).encode(), date)
+        for part in (self.region, "s3", "aws4_request"):
+            key = _hmac(key, part)
+        return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    def _uri(self, key):
+        return "/" + _uri_encode(self.bucket) + ("/" + _uri_encode(key, safe="-_.~/") if key else "/")
+
+    @staticmethod
+    def _canonical_query(query):
+        return "&".join(
+            f"{_uri_encode(k)}={_uri_encode(str(v))}" for k, v in sorted(query.items())
+        )
+
+    def _canonical_request(self, method, uri, query, headers, payload_hash):
+        names = sorted(headers)
+        return "\n".join([
+            method, uri, self._canonical_query(query),
+            "".join(f"{name}:{str(headers[name]).strip()}\n" for name in names),
+            ";".join(names),
+            payload_hash,
+        ])
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    def presigned_url(self, key, expires=None, method="GET", amz_date=None):
+        """URL anyone can ``method`` for ``expires`` seconds without credentials."""
+        amz_date = amz_date or self._now()
+        uri = self._uri(key)
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{self._scope(amz_date[:8])}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": expires or self.presign_seconds,
+            "X-Amz-SignedHeaders": "host",
+        }
+        canonical = self._canonical_request(method, uri, query, {"host": self.host}, "UNSIGNED-PAYLOAD")
+        query["X-Amz-Signature"] = self._signature(amz_date, canonical)
+        return f"{self.scheme}://{self.host}{uri}?{self._canonical_query(query)}"
+
+    # --- requests ---
+    def _request(self, method, key="", query=None, body=None, headers=None, payload_hash=_EMPTY_SHA256):
+        """Signed request; returns the open response (the caller reads it)."""
+        query = query or {}
+        amz_date = self._now()
+        uri = self._uri(key)
+        signed = {"host": self.host, "x-amz-content-sha256": payload_hash, "x-amz-date": amz_date}
+        for name, value in (headers or {}).items():
+            signed[name.lower()] = value
+        canonical = self._canonical_request(method, uri, query, signed, payload_hash)
+        signed["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{self._scope(amz_date[:8])}, "
+            f"SignedHeaders={';'.join(sorted(k for k in signed if k != 'authorization'))}, "
+            f"Signature={self._signature(amz_date, canonical)}"
+        )
+        conn_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = conn_class(self.host, timeout=60)
+        path = uri + ("?" + self._canonical_query(query) if query else "")
+        conn.request(method, path, body=body, headers=signed)
+        return conn.getresponse()
+
+    def _call(self, method, key="", ok=(200,), **kwargs):
+        resp = self._request(method, key, **kwargs)
+        body = resp.read()
+        resp.close()
+        if resp.status not in ok:
+            raise S3Error(resp.status, body)
+        return resp.status, body
+
+    def exists(self, key):
+        status, _ = self._call("HEAD", key, ok=(200, 404))
+        return status == 200
+
+    def upload(self, key, src_path):
+        """Stream ``src_path`` to ``key``, leaving the source in place."""
+        with open(src_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # The body is not hashed up front so it can be streamed in one
+            # pass; TLS protects it in transit, like any unsigned-payload PUT.
+            self._call("PUT", key, body=f, headers={"content-length": str(size)},
+                       payload_hash="UNSIGNED-PAYLOAD")
+
+    def put_file(self, key, src_path):
+        """Upload ``src_path`` to ``key`` unless it exists; the source is removed."""
+        try:
+            if self.exists(key):
+                return False
+            self.upload(key, src_path)
+            return True
+        finally:
+            os.remove(src_path)
+
+    def delete(self, key):
+        # S3 answers 204 whether or not the object existed.
+        self._call("DELETE", key, ok=(204, 200))
+        return True
+
+    def open(self, key):
+        """Streaming, file-like response body for ``key``."""
+        resp = self._request("GET", key)
+        if resp.status != 200:
+            body = resp.read()
+            resp.close()
+            raise S3Error(resp.status, body)
+        return resp
+
+    @contextlib.contextmanager
+    def local_copy(self, key):
+        ext = os.path.splitext(key)[1]
+        with tempfile.NamedTemporaryFile(suffix=ext) as tmp:
+            with contextlib.closing(self.open(key)) as src:
+                shutil.copyfileobj(src, tmp, _COPY_CHUNK)
+            tmp.flush()
+            yield tmp.name
+
+    def iter_keys(self, prefix, after=""):
+        """``(key, mtime)`` for every object under ``prefix``, in key order, after ``after``."""
+        query = {"list-type": 2, "prefix": prefix}
+        if after:
+            query["start-after"] = after
+        while True:
+            _, body = self._call("GET", query=query)
+            root = ET.fromstring(body)
+            for item in root.iter(f"{_S3_NS}Contents"):
+                modified = item.findtext(f"{_S3_NS}LastModified")
+                mtime = datetime.datetime.strptime(modified[:19], "%Y-%m-%dT%H:%M:%S")
+                yield item.findtext(f"{_S3_NS}Key"), mtime.replace(tzinfo=datetime.timezone.utc).timestamp()
+            token = root.findtext(f"{_S3_NS}NextContinuationToken")
+            if root.findtext(f"{_S3_NS}IsTruncated") != "true" or not token:
+                return
+            query = {"list-type": 2, "prefix": prefix, "continuation-token": token}
+
+    def serve(self, key, start=None):
+        # The store answers Range requests itself. A time seek (``start``)
+        # cannot ride along on a redirect; the player's Range requests
+        # seek instead.
+        resp = redirect(self.presigned_url(key), code=302)
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+
+
+# ------------------------------
+# SELECTION
+# ------------------------------
+BACKENDS = {"local": LocalStorage, "s3": S3Storage}
+_instance = {}
+
+
+def get_storage(backend=None):
+    """The configured driver, one instance per backend name."""
+    backend = backend or STORAGE_BACKEND
+    if backend not in _instance:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; expected one of {sorted(BACKENDS)}")
+        _instance[backend] = BACKENDS[backend]()
+    return _instance[backend]
+
+
+# ------------------------------
+# MIGRATION
+# ------------------------------
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shard_legacy_files(db, target):
+    """Move songs whose file is not a blob (flat uploads/<name>) into the sharded layout.
+
+    Each file is copied to its new key first, then the songs are repointed
+    in one commit, then the old file is removed. An interrupted run leaves
+    at worst an unreferenced copy, which the reconciler removes.
+    """
+    from sqlalchemy.dialects.sqlite import insert
+
+    from controller.blobs import blob_path
+    from controller.models import Blob, Song
+
+    legacy = [
+        path for (path,) in db.query(Song.file_path)
+        .outerjoin(Blob, Blob.path == Song.file_path)
+        .filter(Blob.path.is_(None))
+        .distinct()
+    ]
+    moved = 0
+    for old in legacy:
+        src = safe_join(STATIC_DIR, old)
+        if src is None or not os.path.isfile(src):
+            print(f"Missing file, left as is: {old}")
+            continue
+        sha256 = _file_sha256(src)
+        # Identical content already stored (under any extension) keeps its key.
+        new = db.query(Blob.path).filter_by(sha256=sha256).scalar()
+        if new is None:
+            new = blob_path(sha256, os.path.splitext(old)[1].lower())
+            db.execute(insert(Blob).values(sha256=sha256, path=new, size=os.path.getsize(src), ref_count=0))
+        if not target.exists(new):
+            target.upload(new, src)
+        # The blobs_songs_au trigger moves the references onto the blob.
+        db.query(Song).filter(Song.file_path == old).update({"file_path": new}, synchronize_session=False)
+        db.commit()
+        os.remove(src)
+        moved += 1
+    return moved
+
+
+def copy_blobs(db, source, target):
+    """Copy every blob from ``source`` to ``target`` that is not there yet."""
+    from controller.models import Blob
+
+    copied = 0
+    for (path,) in db.query(Blob.path).filter(Blob.ref_count > 0).order_by(Blob.path):
+        if target.exists(path):
+            continue
+        with source.local_copy(path) as src:
+            if not os.path.isfile(src):
+                print(f"Missing file, skipped: {path}")
+                continue
+            target.upload(path, src)
+        copied += 1
+    return copied
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Move uploaded audio into the current storage layout.")
+    sub = p.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("migrate", help="shard legacy files, optionally copying everything to another backend")
+    m.add_argument("--to", choices=sorted(BACKENDS), default=None,
+                   help="backend to copy into (default: STORAGE_BACKEND)")
+    args = p.parse_args(argv)
+
+    from controller.database import SessionLocal, create_tables
+
+    create_tables()
+    local = get_storage("local")
+    target = get_storage(args.to)
+    db = SessionLocal()
+    try:
+        print(f"Sharded {shard_legacy_files(db, target)} legacy files")
+        if target is not local:
+            print(f"Copied {copy_blobs(db, local, target)} blobs to {args.to or STORAGE_BACKEND}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,125 @@
+import mimetypes
+import os
+from datetime import datetime, timezone
+
+from flask import Response, request
+from werkzeug.datastructures import Range
+from werkzeug.wsgi import wrap_file
+
+# Browsers re-validate with the ETag once this expires, so a stale entry
+# costs a 304 rather than a re-download.
+CACHE_MAX_AGE = 86400
+
+
+class FileSlice:
+    """File-like view of ``length`` bytes of ``f`` starting at its current offset.
+
+    ``fileno()`` is exposed so gunicorn's ``wsgi.file_wrapper`` can hand the
+    slice to ``os.sendfile`` (it sends Content-Length bytes from the current
+    offset); other servers fall back to the bounded ``read()``.
+    """
+
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def file_etag(st):
+    # Strong validator: changes whenever the bytes on disk can have changed.
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def _if_range_matches(etag, last_modified):
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return if_range.date >= last_modified
+    # No If-Range header: the Range always applies.
+    return True
+
+
+def send_audio(path, mimetype=None, start=None):
+    """Serve ``path`` with Range/206, ETag and Last-Modified support.
+
+    ``start`` is the byte offset of a time seek (``?t=``), resolved by the
+    caller with the seek index. It is served as the range ``bytes=start-``
+    when the client asked for the whole file (no Range, or ``bytes=0-`` as
+    media elements send on load); an explicit range from the client wins.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return Response("Not found", status=404)
+
+    size = st.st_size
+    etag = file_etag(st)
+    last_modified = datetime.fromtimestamp(int(st.st_mtime), tz=timezone.utc)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"private, max-age={CACHE_MAX_AGE}",
+    }
+
+    # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2).
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and last_modified <= since
+    if not_modified:
+        resp = Response(status=304, headers=headers)
+        resp.set_etag(etag)
+        resp.last_modified = last_modified
+        return resp
+
+    end = size
+    status = 200
+    byte_range = request.range
+    if start and (byte_range is None or byte_range.ranges == [(0, None)]):
+        byte_range = Range("bytes", [(start, None)])
+    # Multipart byte ranges are not worth supporting for audio; answer those
+    # with the full body, which is always a valid response to a Range request.
+    if (byte_range is not None and len(byte_range.ranges) == 1
+            and _if_range_matches(etag, last_modified)):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            resp = Response(status=416, headers=headers)
+            resp.headers["Content-Range"] = f"bytes */{size}"
+            return resp
+        start, end = bounds
+        status = 206
+    else:
+        start = 0
+
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    f = open(path, "rb")
+    f.seek(start)
+    length = end - start
+    body = wrap_file(request.environ, FileSlice(f, length))
+
+    resp = Response(body, status=status, mimetype=mimetype,
+                    headers=headers, direct_passthrough=True)
+    resp.content_length = length
+    if status == 206:
+        resp.headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    return resp
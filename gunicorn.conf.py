@@ -0,0 +1,81 @@
+"""gunicorn settings, read automatically from the working directory.
+
+    gunicorn -w 2 -b 0.0.0.0:9000 main:app
+
+The master imports the app (``preload_app``), then bootstraps the database
+and builds the static assets once in ``on_starting``. Workers fork with
+every module already loaded and shared copy-on-write, instead of each
+importing and seeding on its own.
+
+Once the server is up, the master also starts the background job runner
+(``python -m controller.jobs``) as a child process and restarts it if it
+exits, so ingest jobs and the periodic maintenance run with the single
+deployed command. Set ``JOB_RUNNER_EMBEDDED=0`` when the runner is deployed
+as its own process instead.
+"""
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+preload_app = True
+
+_runner = {"process": None, "stopping": False}
+
+
+def on_starting(server):
+    from controller.assets import build_assets
+    from controller.bootstrap import bootstrap
+
+    # The app's own log lines (slow queries, flush failures) go to
+    # gunicorn's error log, with its format and level.
+    app_log = logging.getLogger("controller")
+    app_log.handlers = server.log.error_log.handlers
+    app_log.setLevel(server.log.error_log.level)
+    app_log.propagate = False
+
+    bootstrap()
+    build_assets()
+
+
+def when_ready(server):
+    from controller.config import JOB_RUNNER_EMBEDDED
+
+    if JOB_RUNNER_EMBEDDED:
+        threading.Thread(target=_supervise_runner, args=(server,), name="job-runner", daemon=True).start()
+
+
+def _supervise_runner(server):
+    delay = 1
+    while not _runner["stopping"]:
+        started = time.monotonic()
+        process = _runner["process"] = subprocess.Popen([sys.executable, "-m", "controller.jobs"])
+        server.log.info("Job runner started (pid %s)", process.pid)
+        code = process.wait()
+        if _runner["stopping"]:
+            return
+        # Back off while it keeps failing at startup; reset after a good run.
+        delay = 1 if time.monotonic() - started > 60 else min(delay * 2, 60)
+        server.log.warning("Job runner exited with code %s, restarting in %ss", code, delay)
+        time.sleep(delay)
+
+
+def post_fork(server, worker):
+    # Pooled SQLite connections must never be shared across processes. The
+    # master holds none after bootstrap; this drops any that slipped through
+    # without closing them underneath the parent.
+    from controller.database import engine
+
+    engine.dispose(close=False)
+
+
+def on_exit(server):
+    _runner["stopping"] = True
+    process = _runner["process"]
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
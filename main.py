@@ -1,105 +1,84 @@
-
-from flask import Flask, render_template, request, redirect, session, flash, jsonify
+from flask import Blueprint, Flask, render_template, request, redirect, session, flash, jsonify, send_file, send_from_directory
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 import os
-import subprocess
+from sqlalchemy.dialects.sqlite import insert
 
 from controller.models import (
-    User, Song, Favorite, Playlist, PlaylistSong, RecentlyPlayed, Role
+    User, Song, Favorite, Playlist, PlaylistSong, RecentlyPlayed, Role, Job
+)
+from controller.database import engine, get_db, init_app
+from controller.catalog import catalog_page, parse_fields
+from controller.search import ranked_search
+from controller.play_events import play_events
+from controller.blobs import UploadRequest, store_upload, place_upload, discard_upload
+from controller.storage import get_storage
+from controller.config import (
+    UPLOAD_DIR, MAX_UPLOAD_BYTES, HLS_ENABLED, INTERACTION_BATCH_MAX, LIKES_PAGE_MAX, TRUSTED_PROXIES,
 )
-from controller.database import SessionLocal, create_tables
+from controller.jobs import enqueue, job_dict, latest_job_status
+from controller.hls import hls_dir
+from controller.mp3 import byte_offset_at
+from controller.deletion import delete_songs, delete_user
+from controller.playlists import add_songs, apply_edit, user_playlists
+from controller.cache import response_cache, CATALOG, library
+from controller.recommendations import recommend
+from controller.charts import CHARTS, chart_scope, read_chart
+from controller.metrics import init_metrics
+from controller.snapshot import manifest, chunk_file
+from controller.assets import init_assets
+from controller.ratelimit import Superseded, limited, limiter
+from controller.interactions import apply_interactions, liked_song_ids
+
+bp = Blueprint("main", __name__)
+
 
 # -------------------------------------------------
 # APP SETUP
 # -------------------------------------------------
-app = Flask(__name__)
-app.secret_key = "super-secret-key"
+def create_app():
+    """Build the Flask app. No database work happens here.
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    Schema, migrations, default roles and the admin user are set up once per
+    deployment by ``controller.bootstrap`` (``flask --app main bootstrap``, or
+    gunicorn's ``on_starting`` hook in gunicorn.conf.py), not by every worker.
+    """
+    app = Flask(__name__)
+    app.secret_key = "super-secret-key"
 
-create_tables()
+    # Uploads stream into a hashing temp file instead of being buffered first.
+    app.request_class = UploadRequest
+    # Behind a proxy, remote_addr is the client from X-Forwarded-For, so the
+    # per-address rate limits and the /metrics allow list see real clients.
+    if TRUSTED_PROXIES:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
 
-# ---------------------- ADMIN SETUP ----------------------
-db = SessionLocal()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    app.config["UPLOAD_FOLDER"] = UPLOAD_DIR
+    # Reject oversized requests from Content-Length before reading the body;
+    # the slack covers the form fields sent alongside the file.
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 64 * 1024
+    init_app(app)
+    # Query counts/timings per request, latency histograms and /metrics.
+    init_metrics(app, engine)
+    # Fingerprinted CSS/JS at /assets and the asset_url() template helper.
+    init_assets(app)
+    app.register_blueprint(bp)
 
-# Ensure admin role exists
-admin_role = db.query(Role).filter_by(name="admin").first()
-if not admin_role:
-    admin_role = Role(name="admin")
-    db.add(admin_role)
-    db.commit()
-    db.refresh(admin_role)
-
-# Ensure admin user exists
-existing_admin = db.query(User).filter_by(username="admin").first()
-if not existing_admin:
-    admin_user = User(
-        username="admin",
-        email_or_phone="admin@gmail.com",
-        password=generate_password_hash("admin123"),
-        role_id=admin_role.id
-    )
-    db.add(admin_user)
-    db.commit()
-    print("✅ Admin created successfully")
-else:
-    print("ℹ️ Admin already exists")
-db.close()
-
-# # ---------------------- LYRICS GENERATION ----------------------
-# from pydub import AudioSegment
-# import speech_recognition as sr
-
-# def convert_to_wav(input_file):
-#     filename, ext = os.path.splitext(input_file)
-#     if ext.lower() != ".wav":
-#         wav_file = f"{filename}.wav"
-#         audio = AudioSegment.from_file(input_file)
-#         audio.export(wav_file, format="wav")
-#         return wav_file
-#     return input_file
-
-# def transcribe_audio(audio_path):
-#     recognizer = sr.Recognizer()
-#     with sr.AudioFile(audio_path) as source:
-#         audio_data = recognizer.record(source)
-#     try:
-#         return recognizer.recognize_google(audio_data)
-#     except:
-#         return ""
-
-# def generate_lyrics_from_text(raw_text):
-#     if not raw_text.strip():
-#         return "Lyrics could not be generated."
-#     prompt = f"Convert the following spoken text into song lyrics:\n{raw_text}"
-#     command = ["ollama", "run", "mistral:latest", "--prompt", prompt]
-#     result = subprocess.run(command, capture_output=True, text=True)
-#     if result.returncode != 0:
-#         return "Lyrics generation failed."
-#     return result.stdout.strip()
-
-# def update_song_lyrics(song_id, audio_path):
-#     db = SessionLocal()
-#     wav_path = convert_to_wav(audio_path)
-#     raw_text = transcribe_audio(wav_path)
-#     lyrics = generate_lyrics_from_text(raw_text)
-
-#     song = db.query(Song).filter_by(id=song_id).first()
-#     if song:
-#         song.lyrics = lyrics
-#         db.commit()
-#         print(f"Lyrics updated for: {song.title}")
-#     db.close()
+    @app.cli.command("bootstrap")
+    def bootstrap_command():
+        """Create tables, run migrations and seed roles and the admin user."""
+        from controller.bootstrap import bootstrap
+
+        bootstrap()
+
+    return app
 
 
 # -------------------------------------------------
 # HOME
 # -------------------------------------------------
-@app.route("/")
+@bp.route("/")
 def home():
     if "role" in session:
         if session["role"] == "creator":
@@ -107,37 +86,19 @@ def home():
         if session["role"] == "listener":
             return redirect("/listener-dashboard")
     return render_template("home.html")
-# -------------------------------------------------
-# CREATE DEFAULT ROLES
-# -------------------------------------------------
-def create_default_roles():
-    db = SessionLocal()
-    roles = ["admin", "creator", "listener"]
-    for role_name in roles:
-        existing = db.query(Role).filter_by(name=role_name).first()
-        if not existing:
-            db.add(Role(name=role_name))
-    db.commit()
-    db.close()
-
-# Call it after creating tables
-create_default_roles()
-
-
 # -------------------------------------------------
 # REGISTER
 # -------------------------------------------------
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
-        db = SessionLocal()
+        db = get_db()
 
         role_name = request.form["role"]  # creator / listener
         role = db.query(Role).filter_by(name=role_name).first()
 
         if not role:
             flash("Invalid role selected")
-            db.close()
             return redirect("/register")
 
         user = User(
@@ -149,7 +110,6 @@ def register():
 
         db.add(user)
         db.commit()
-        db.close()
 
         return redirect("/login")
 
@@ -157,10 +117,10 @@ def register():
 # ---------------------------------
 # LOGIN
 # -------------------------------------------------
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
-        db = SessionLocal()
+        db = get_db()
 
         # Fetch user by email or phone
         user = db.query(User).filter_by(
@@ -178,8 +138,6 @@ def login():
                 session["username"] = user.username
                 session["role"] = role_name  # "admin", "creator", "listener"
 
-                db.close()
-
                 # Redirect based on role
                 if role_name == "admin":
                     return redirect("/admin-dashboard")
@@ -192,13 +150,12 @@ def login():
                     return redirect("/")
 
         flash("Invalid credentials")
-        db.close()
 
     return render_template("login.html")
 # -------------------------------------------------
 # LOGOUT
 # -------------------------------------------------
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     session.clear()
     return redirect("/")
@@ -206,83 +163,103 @@ def logout():
 # -------------------------------------------------
 # CREATOR DASHBOARD
 # -------------------------------------------------
-@app.route("/creator-dashboard")
+@bp.route("/creator-dashboard")
 def creator_dashboard():
     if session.get("role") != "creator":
         return redirect("/login")
 
-    db = SessionLocal()
+    db = get_db()
     songs = db.query(Song).filter_by(uploader_id=session["user_id"]).all()
-    db.close()
+    job_status = latest_job_status(db, [s.id for s in songs], "lyrics")
 
-    return render_template("creator_dashboard.html", songs=songs)
+    return render_template("creator_dashboard.html", songs=songs, job_status=job_status)
 
-@app.route("/upload")
+# -------------------------------------------------
+# SONG PROCESSING JOBS (AJAX)
+# -------------------------------------------------
+@bp.route("/api/songs/<int:song_id>/jobs")
+def song_jobs(song_id):
+    if session.get("role") != "creator":
+        return jsonify({"error": "login required"}), 401
+
+    db = get_db()
+    song = db.query(Song.id).filter_by(id=song_id, uploader_id=session["user_id"]).first()
+    if not song:
+        return jsonify({"error": "not found"}), 404
+
+    jobs = db.query(Job).filter_by(song_id=song_id).order_by(Job.id).all()
+    return jsonify({"song_id": song_id, "jobs": [job_dict(j) for j in jobs]})
+
+@bp.route("/upload")
 def upload_page():
     if session.get("role") != "creator":
         return redirect("/login")
     return render_template("upload_song.html")
-@app.route("/upload-song", methods=["POST"])
+@bp.route("/upload-song", methods=["POST"])
 def upload_song():
     if session.get("role") != "creator":
         return redirect("/login")
 
     file = request.files.get("song_file")
     if not file or file.filename == "":
+        discard_upload(file)
         flash("Please select a song file")
         return redirect("/upload")
 
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(file_path)
-
-    db = SessionLocal()
-    song = Song(
-        title=request.form["title"],
-        artist_name=request.form["artist_name"],
-        genre=request.form["genre"],
-        file_path=f"uploads/{filename}",
-        uploader_id=session["user_id"]
-    )
-    db.add(song)
-    db.commit()
+    # Stored once per distinct content under uploads/<aa>/<bb>/<sha256>.
+    db = get_db()
+    try:
+        file_path = store_upload(db, file)
+        song = Song(
+            title=request.form["title"],
+            artist_name=request.form["artist_name"],
+            genre=request.form["genre"],
+            file_path=file_path,
+            uploader_id=session["user_id"]
+        )
+        db.add(song)
+        db.flush()
+        # Metadata and lyrics are extracted by the background job runner.
+        enqueue(db, "metadata", {"song_id": song.id}, song_id=song.id)
+        enqueue(db, "lyrics", {"song_id": song.id}, song_id=song.id)
+        if HLS_ENABLED:
+            enqueue(db, "hls", {"song_id": song.id}, song_id=song.id)
+        db.commit()
+    except Exception:
+        discard_upload(file)
+        raise
+    place_upload(file, file_path)
     db.refresh(song)
 
-    db.close()                       # ✅ CLOSE SESSION
     return redirect("/creator-dashboard")  # ✅ RETURN RESPONSE
 
-    # # -----------------------------
-    # # Generate lyrics automatically
-    # # -----------------------------
-    # from generate_lyrics import update_song_lyrics
-    # update_song_lyrics(song.id, file_path)
-
-    # db.close()
-    # return redirect("/creator-dashboard")
+@bp.app_errorhandler(413)
+def upload_too_large(e):
+    flash(f"Song file is too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+    return redirect("/upload")
 
-@app.route("/edit-song/<int:song_id>")
+@bp.route("/edit-song/<int:song_id>")
 def edit_song_page(song_id):
     if session.get("role") != "creator":
         return redirect("/login")
 
-    db = SessionLocal()
+    db = get_db()
     song = db.query(Song).filter_by(
         id=song_id,
         uploader_id=session["user_id"]
     ).first()
-    db.close()
 
     if not song:
         return redirect("/creator-dashboard")
 
     return render_template("edit_song.html", song=song)
 
-@app.route("/update-song/<int:song_id>", methods=["POST"])
+@bp.route("/update-song/<int:song_id>", methods=["POST"])
 def update_song(song_id):
     if session.get("role") != "creator":
         return redirect("/login")
 
-    db = SessionLocal()
+    db = get_db()
     song = db.query(Song).filter_by(
         id=song_id,
         uploader_id=session["user_id"]
@@ -294,317 +271,465 @@ def update_song(song_id):
         song.genre = request.form["genre"]
         db.commit()
 
-    db.close()
     return redirect("/creator-dashboard")
 
-@app.route("/delete-song/<int:song_id>", methods=["POST"])
+@bp.route("/delete-song/<int:song_id>", methods=["POST"])
 def delete_song(song_id):
     if session.get("role") != "creator":
         return redirect("/login")
 
-    db = SessionLocal()
-    song = db.query(Song).get(song_id)
-
-    if song and song.uploader_id == session["user_id"]:
-        try:
-            os.remove(os.path.join("static", song.file_path))
-        except FileNotFoundError:
-            pass
-        db.delete(song)
-        db.commit()
-
-    db.close()
+    # Files are removed later by the reclaim job once nothing references them.
+    delete_songs(get_db(), Song.id == song_id, Song.uploader_id == session["user_id"])
     return redirect("/creator-dashboard")
 
 
 # -------------------------------------------------
 # LISTENER DASHBOARD
 # -------------------------------------------------
-@app.route("/listener-dashboard")
+@bp.route("/listener-dashboard")
 def listener_dashboard():
     if session.get("role") != "listener":
         return redirect("/login")
 
-    db = SessionLocal()
-    songs = db.query(Song).all()
-    playlists = db.query(Playlist).filter_by(user_id=session["user_id"]).all()
-    db.close()
+    playlists = user_playlists(get_db(), session["user_id"])
+
+    # The catalog is rendered client-side from the snapshot files below.
+    return render_template("listener_dashboard.html", playlists=playlists)
+
+# -------------------------------------------------
+# CATALOG SNAPSHOT: manifest + content-hashed chunks
+# -------------------------------------------------
+@bp.route("/catalog/manifest.json")
+def catalog_manifest():
+    if "user_id" not in session:
+        return jsonify({"error": "login required"}), 401
+
+    body = manifest(get_db())
+    resp = jsonify(body)
+    resp.set_etag(body["version"])
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
+
+
+@bp.route("/catalog/<name>")
+def catalog_chunk(name):
+    # Names are content hashes handed out by the (login-only) manifest, so
+    # any cache may keep a chunk forever.
+    path, encoding = chunk_file(name, request.headers.get("Accept-Encoding", ""))
+    if path is None:
+        return jsonify({"error": "not found"}), 404
+
+    resp = send_file(path, mimetype="application/json", etag=False, conditional=False)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
+
+
+@bp.route("/api/songs/<int:song_id>/lyrics")
+def song_lyrics(song_id):
+    if "user_id" not in session:
+        return jsonify({"error": "login required"}), 401
+
+    row = get_db().query(Song.lyrics).filter_by(id=song_id).first()
+    if row is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"lyrics": row.lyrics})
+
+# -------------------------------------------------
+# RECOMMENDATIONS (AJAX)
+# -------------------------------------------------
+@bp.route("/recommendations")
+def recommendations():
+    if session.get("role") != "listener":
+        return jsonify({"songs": []})
+
+    limit = min(request.args.get("limit", 20, type=int), 50)
+    return jsonify({"songs": recommend(get_db(), session["user_id"], limit=limit)})
+
+# -------------------------------------------------
+# CHARTS (AJAX): trending now / top this week
+# -------------------------------------------------
+@bp.route("/charts/<name>")
+def charts(name):
+    if "user_id" not in session:
+        return jsonify({"error": "login required"}), 401
+    if name not in CHARTS:
+        return jsonify({"error": "unknown chart"}), 404
+
+    scope = chart_scope(request.args.get("genre"), request.args.get("language"))
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify(read_chart(get_db(), name, scope, limit=max(1, limit)))
+
+# -------------------------------------------------
+# SONG CATALOG (AJAX, keyset paginated)
+# -------------------------------------------------
+@bp.route("/api/songs")
+def api_songs():
+    if "user_id" not in session:
+        return jsonify({"error": "login required"}), 401
+
+    db = get_db()
+    args = {
+        "cursor": request.args.get("cursor", type=int),
+        "limit": request.args.get("limit", type=int),
+        "fields": parse_fields(request.args.get("fields")),
+        "genre": request.args.get("genre"),
+        "language": request.args.get("language"),
+        "artist": request.args.get("artist"),
+    }
+    songs, next_cursor = response_cache.fetch(
+        db, "catalog:" + repr(sorted(args.items())), [CATALOG],
+        lambda: catalog_page(db, **args),
+    )
+    return jsonify({"songs": songs, "next_cursor": next_cursor})
+# -------------------------------------------------
+# STREAM SONG (Range / conditional GET)
+# -------------------------------------------------
+@bp.route("/stream/<int:song_id>")
+def stream_song(song_id):
+    if "user_id" not in session:
+        return jsonify({"error": "login required"}), 401
+
+    # ?t=<seconds> starts playback at a frame boundary: the seek index maps
+    # the time to a byte offset, served as a 206 from there.
+    t = request.args.get("t", type=float)
+
+    db = get_db()
+    columns = [Song.file_path, Song.seek_index] if t else [Song.file_path]
+    row = db.query(*columns).filter_by(id=song_id).first()
+
+    if not row:
+        return jsonify({"error": "not found"}), 404
+    start = byte_offset_at(row.seek_index, t) if t and row.seek_index else None
+    # Local disk streams from here; S3 redirects to a presigned URL.
+    resp = get_storage().serve(row.file_path, start=start)
+    if resp is None:
+        return jsonify({"error": "not found"}), 404
+    return resp
+
+# -------------------------------------------------
+# HLS PLAYLIST + SEGMENTS
+# -------------------------------------------------
+@bp.route("/hls/<int:song_id>/<name>")
+def hls_file(song_id, name):
+    if "user_id" not in session:
+        return jsonify({"error": "login required"}), 401
+
+    # Segment names carry a hash of the source file, so their bytes never
+    # change. The playlist is rewritten when the song is re-packaged (or its
+    # id reused by a new upload), so it is revalidated instead.
+    if name == "index.m3u8":
+        resp = send_from_directory(hls_dir(song_id), name, mimetype="application/vnd.apple.mpegurl")
+        resp.headers["Cache-Control"] = "private, no-cache"
+    else:
+        resp = send_from_directory(hls_dir(song_id), name, mimetype="audio/mpeg")
+        resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
 
-    return render_template("listener_dashboard.html", songs=songs, playlists=playlists)
 # -------------------------------------------------
 # LOG RECENTLY PLAYED (AJAX)
 # -------------------------------------------------
-@app.route("/log-play/<int:song_id>", methods=["POST"])
+@bp.route("/log-play/<int:song_id>", methods=["POST"])
+@limited("writes")
 def log_play(song_id):
     if session.get("role") != "listener":
         return jsonify({"error": "unauthorized"}), 403
 
-    db = SessionLocal()
-    old = db.query(RecentlyPlayed).filter_by(user_id=session["user_id"], song_id=song_id).first()
-
-    if old:
-        db.delete(old)
-
-    db.add(RecentlyPlayed(user_id=session["user_id"], song_id=song_id))
-    db.commit()
-    db.close()
+    # Buffered and written in bulk by the play-event flusher.
+    play_events.record(session["user_id"], song_id)
 
     return jsonify({"status": "ok"})
 
 # -------------------------------------------------
 # LIKE / FAVORITE SONG (AJAX)
 # -------------------------------------------------
-@app.route("/like-song/<int:song_id>", methods=["POST"])
+@bp.route("/like-song/<int:song_id>", methods=["POST"])
+@limited("writes")
 def like_song(song_id):
     if session.get("role") != "listener":
         return jsonify({"error": "login required"}), 401
 
-    db = SessionLocal()
-    exists = db.query(Favorite).filter_by(user_id=session["user_id"], song_id=song_id).first()
-
-    if not exists:
-        db.add(Favorite(user_id=session["user_id"], song_id=song_id))
-        db.commit()
-
-    db.close()
+    db = get_db()
+    db.execute(
+        insert(Favorite)
+        .values(user_id=session["user_id"], song_id=song_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "song_id"])
+    )
+    db.commit()
     return jsonify({"status": "liked"})
 
-@app.route("/unlike-song/<int:song_id>", methods=["POST"])
+@bp.route("/unlike-song/<int:song_id>", methods=["POST"])
+@limited("writes")
 def unlike_song(song_id):
     if session.get("role") != "listener":
         return jsonify({"error": "login required"}), 401
 
-    db = SessionLocal()
-    fav = db.query(Favorite).filter_by(user_id=session["user_id"], song_id=song_id).first()
-    if fav:
-        db.delete(fav)
-        db.commit()
-    db.close()
+    db = get_db()
+    db.query(Favorite).filter_by(user_id=session["user_id"], song_id=song_id).delete()
+    db.commit()
     return jsonify({"status": "unliked"})
 
+# -------------------------------------------------
+# BATCHED INTERACTIONS (AJAX)
+# -------------------------------------------------
+@bp.route("/api/interactions", methods=["POST"])
+@limited("writes")
+def interactions():
+    if session.get("role") != "listener":
+        return jsonify({"error": "login required"}), 401
+
+    ops = (request.get_json(silent=True) or {}).get("ops")
+    if not isinstance(ops, list):
+        return jsonify({"error": "expected {\"ops\": [...]}"}), 400
+    if len(ops) > INTERACTION_BATCH_MAX:
+        return jsonify({"error": f"at most {INTERACTION_BATCH_MAX} ops per batch"}), 413
+
+    # Likes and unlikes in one transaction; plays go to the play buffer
+    # only once it has committed.
+    db = get_db()
+    results, plays = apply_interactions(db, session["user_id"], ops)
+    db.commit()
+    for song_id, played_at in plays:
+        play_events.record(session["user_id"], song_id, played_at)
+    return jsonify({"results": results})
+
+@bp.route("/api/likes")
+def liked_songs():
+    if session.get("role") != "listener":
+        return jsonify({"error": "login required"}), 401
+
+    # ?ids=1,2,3: which songs of the page on screen the user has liked.
+    try:
+        ids = [int(part) for part in request.args.get("ids", "").split(",") if part]
+    except ValueError:
+        return jsonify({"error": "ids must be integers"}), 400
+    if len(ids) > LIKES_PAGE_MAX:
+        return jsonify({"error": f"at most {LIKES_PAGE_MAX} ids"}), 400
+    return jsonify({"liked": liked_song_ids(get_db(), session["user_id"], ids)})
+
 # -------------------------------------------------
 # FAVOURITE PAGE
 # -------------------------------------------------
-@app.route("/favourite")
+@bp.route("/favourite")
 def favourite():
     if session.get("role") != "listener":
         return redirect("/login")
 
-    db = SessionLocal()
-    songs = (
-        db.query(Song)
-        .join(Favorite, Favorite.song_id == Song.id)
-        .filter(Favorite.user_id == session["user_id"])
-        .all()
+    db = get_db()
+    user_id = session["user_id"]
+    songs = response_cache.fetch(
+        db, f"favorites:{user_id}", [CATALOG, library(user_id)],
+        lambda: [
+            dict(row._mapping)
+            for row in db.query(Song.id, Song.title, Song.artist_name, Song.hls_segments)
+            .join(Favorite, Favorite.song_id == Song.id)
+            .filter(Favorite.user_id == user_id)
+        ],
     )
-    db.close()
     return render_template("favourite.html", songs=songs)
 
 # -------------------------------------------------
 # CREATE PLAYLIST (FORM + AJAX)
 # -------------------------------------------------
-@app.route("/create-playlist", methods=["GET", "POST"])
+@bp.route("/create-playlist", methods=["GET", "POST"])
 def create_playlist():
     if session.get("role") != "listener":
         return redirect("/login")
 
-    db = SessionLocal()
-
-    if request.is_json:
-        data = request.get_json()
-        playlist = Playlist(name=data["playlist_name"], user_id=session["user_id"])
-        db.add(playlist)
-        db.commit()
-        db.refresh(playlist)
-
-        for sid in data["song_ids"]:
-            db.add(PlaylistSong(playlist_id=playlist.id, song_id=int(sid)))
+    db = get_db()
 
-        db.commit()
-        db.close()
-        return jsonify({"message": "Playlist created successfully"})
+    if request.is_json or request.method == "POST":
+        if request.is_json:
+            data = request.get_json()
+            name, song_ids = data["playlist_name"], data["song_ids"]
+        else:
+            name, song_ids = request.form["playlist_name"], request.form.getlist("song_ids")
 
-    if request.method == "POST":
-        playlist = Playlist(name=request.form["playlist_name"], user_id=session["user_id"])
+        # One transaction: flush assigns the playlist id, and the commit
+        # makes the playlist and its songs visible together or not at all.
+        playlist = Playlist(name=name, user_id=session["user_id"])
         db.add(playlist)
+        db.flush()
+        add_songs(db, playlist.id, song_ids)
         db.commit()
-        db.refresh(playlist)
 
-        for sid in request.form.getlist("song_ids"):
-            db.add(PlaylistSong(playlist_id=playlist.id, song_id=int(sid)))
-
-        db.commit()
-        db.close()
+        if request.is_json:
+            return jsonify({"message": "Playlist created successfully"})
         return redirect("/listener-dashboard")
 
-    songs = db.query(Song).all()
-    db.close()
-    return render_template("create_playlist.html", songs=songs)
+    return render_template("create_playlist.html")
 
 # -------------------------------------------------
 # PLAYLIST SONGS (AJAX)
 # -------------------------------------------------
-@app.route("/playlist-songs/<int:playlist_id>")
+@bp.route("/playlist-songs/<int:playlist_id>")
 def playlist_songs(playlist_id):
     if session.get("role") != "listener":
         return jsonify({"songs": []})
 
-    db = SessionLocal()
-    rows = db.query(Song).join(PlaylistSong, PlaylistSong.song_id == Song.id).filter(
-        PlaylistSong.playlist_id == playlist_id
-    ).all()
+    db = get_db()
+    owner_id = db.query(Playlist.user_id).filter_by(id=playlist_id).scalar()
+    if owner_id is None:
+        return jsonify({"songs": []})
 
-    songs = [{"id": s.id, "title": s.title, "file": "/static/" + s.file_path} for s in rows]
-    db.close()
+    songs = response_cache.fetch(
+        db, f"playlist:{playlist_id}", [CATALOG, library(owner_id)],
+        lambda: [
+            {"id": s.id, "title": s.title, "file": f"/stream/{s.id}"}
+            for s in db.query(Song.id, Song.title)
+            .join(PlaylistSong, PlaylistSong.song_id == Song.id)
+            .filter(PlaylistSong.playlist_id == playlist_id)
+            .order_by(PlaylistSong.position)
+        ],
+    )
     return jsonify({"songs": songs})
 
 # -------------------------------------------------
 # VIEW PLAYLISTS
 # -------------------------------------------------
-@app.route("/playlist")
+@bp.route("/playlist")
 def view_playlists():
     if session.get("role") != "listener":
         return redirect("/login")
 
-    db = SessionLocal()
-    playlists = db.query(Playlist).filter_by(user_id=session["user_id"]).all()
-    db.close()
+    playlists = user_playlists(get_db(), session["user_id"])
     return render_template("playlist.html", playlists=playlists)
 
 # -------------------------------------------------
 # DELETE PLAYLIST
 # -------------------------------------------------
-@app.route("/delete-playlist/<int:playlist_id>", methods=["POST"])
+@bp.route("/delete-playlist/<int:playlist_id>", methods=["POST"])
 def delete_playlist(playlist_id):
     if session.get("role") != "listener":
         return jsonify({"error":"unauthorized"}), 403
 
-    db = SessionLocal()
+    db = get_db()
     playlist = db.query(Playlist).filter_by(id=playlist_id, user_id=session["user_id"]).first()
     if playlist:
         db.query(PlaylistSong).filter_by(playlist_id=playlist.id).delete()
         db.delete(playlist)
         db.commit()
-    db.close()
     return redirect("/playlist")
 
 # -------------------------------------------------
 # EDIT PLAYLIST
 # -------------------------------------------------
-@app.route("/edit-playlist/<int:playlist_id>", methods=["GET","POST"])
+@bp.route("/edit-playlist/<int:playlist_id>", methods=["GET","POST"])
 def edit_playlist(playlist_id):
     if session.get("role") != "listener":
         return redirect("/login")
 
-    db = SessionLocal()
+    db = get_db()
     playlist = db.query(Playlist).filter_by(id=playlist_id, user_id=session["user_id"]).first()
     if not playlist:
-        db.close()
         return redirect("/playlist")
 
-    songs = db.query(Song).all()
-
     if request.method == "POST":
         playlist.name = request.form["playlist_name"]
-        db.query(PlaylistSong).filter_by(playlist_id=playlist.id).delete()
-        for sid in request.form.getlist("song_ids"):
-            db.add(PlaylistSong(playlist_id=playlist.id, song_id=int(sid)))
+        # The submitted checkbox order is the playlist order.
+        apply_edit(db, playlist.id, request.form.getlist("song_ids"))
         db.commit()
-        db.close()
         return redirect("/playlist")
 
-    existing_song_ids = [ps.song_id for ps in db.query(PlaylistSong).filter_by(playlist_id=playlist.id).all()]
-    db.close()
-    return render_template("edit_playlist.html", playlist=playlist, songs=songs, existing_song_ids=existing_song_ids)
+    # Only the playlist's own songs are rendered up front; the rest of the
+    # catalog is lazy-loaded so unticked songs never cost a full table load.
+    existing_songs = (
+        db.query(Song.id, Song.title)
+        .join(PlaylistSong, PlaylistSong.song_id == Song.id)
+        .filter(PlaylistSong.playlist_id == playlist.id)
+        .order_by(PlaylistSong.position)
+        .all()
+    )
+    return render_template("edit_playlist.html", playlist=playlist, existing_songs=existing_songs)
 
 # -------------------------------------------------
 # SEARCH SONGS (AJAX)
 # -------------------------------------------------
-@app.route("/search-songs")
+@bp.route("/search-songs")
+@limited("search")
 def search_songs():
     if session.get("role") != "listener":
         return jsonify({"songs": []})
 
     query = request.args.get("q", "").strip()
-    db = SessionLocal()
-
-    if query:
-        results = db.query(Song).filter(
-            (Song.title.ilike(f"%{query}%")) | (Song.artist_name.ilike(f"%{query}%"))
-        ).all()
-    else:
-        results = []
+    if not query:
+        return jsonify({"songs": []})
 
-    songs = [{"id": s.id, "title": s.title, "file": "/static/" + s.file_path} for s in results]
-    db.close()
+    # FTS5 index over title/artist/genre/language/lyrics, BM25 ranked.
+    # ``seq`` numbers the keystrokes of one search box, ``page`` names that
+    # box (random per page load); a newer seq from it cancels this search.
+    page = request.args.get("page", "")[:32]
+    seq = request.args.get("seq", type=int) if page else None
+    db = get_db()
+    try:
+        with limiter.coalesce(db, f"search:{session['user_id']}:{page}", seq):
+            songs = ranked_search(db, query, limit=request.args.get("limit", type=int))
+    except Superseded:
+        return "", 204
     return jsonify({"songs": songs})
 
 # -------------------------------------------------
 # ADMIN DASHBOARD
 # -------------------------------------------------
-from sqlalchemy.orm import joinedload
-@app.route("/admin-dashboard")
+@bp.route("/admin-dashboard")
 def admin_dashboard():
     if session.get("role") != "admin":
         return redirect("/login")
 
-    db = SessionLocal()
-
-    # Eager-load role to avoid DetachedInstanceError
-    users = db.query(User).options(joinedload(User.role)).all()
-    songs = db.query(Song).all()
-    total_users = len(users)
-    total_songs = len(songs)
-    total_playlists = db.query(Playlist).count()
+    # Admin-only modules are loaded on first use rather than in every worker.
+    from controller.admin import song_page, user_page
+    from controller.stats import read_counters
 
-    db.close()
+    db = get_db()
 
-    return render_template(
-        "admin_dashboard.html",
-        total_users=total_users,
-        total_songs=total_songs,
-        total_playlists=total_playlists,
-        users=users,
-        songs=songs
+    # Totals come from trigger-maintained counters; the lists are paged.
+    stats = read_counters(db)
+    users = user_page(
+        db,
+        page=request.args.get("users_page", 1, type=int),
+        sort=request.args.get("users_sort", "id"),
+        direction=request.args.get("users_dir", "asc"),
     )
+    songs = song_page(
+        db,
+        page=request.args.get("songs_page", 1, type=int),
+        sort=request.args.get("songs_sort", "id"),
+        direction=request.args.get("songs_dir", "desc"),
+    )
+
+    return render_template("admin_dashboard.html", users=users, songs=songs, **stats)
 
 # -------------------------------------------------
 # DELETE USER (ADMIN)
 # -------------------------------------------------
-@app.route("/admin/delete-user/<int:user_id>")
+@bp.route("/admin/delete-user/<int:user_id>")
 def admin_delete_user(user_id):
     if session.get("role") != "admin":
         return redirect("/login")
 
-    db = SessionLocal()
-    user = db.query(User).get(user_id)
-    if user and user.role != "admin":
-        db.delete(user)
-        db.commit()
-    db.close()
+    # Set-based: a creator's songs never get loaded, however many there are.
+    delete_user(get_db(), user_id)
     return redirect("/admin-dashboard")
 
 # -------------------------------------------------
 # DELETE SONG (ADMIN)
 # -------------------------------------------------
-@app.route("/admin/delete-song/<int:song_id>")
+@bp.route("/admin/delete-song/<int:song_id>")
 def admin_delete_song(song_id):
     if session.get("role") != "admin":
         return redirect("/login")
 
-    db = SessionLocal()
-    song = db.query(Song).get(song_id)
-    if song:
-        try:
-            os.remove(os.path.join("static", song.file_path))
-        except:
-            pass
-        db.delete(song)
-        db.commit()
-    db.close()
+    delete_songs(get_db(), Song.id == song_id)
     return redirect("/admin-dashboard")
 # -------------------------------------------------
 # RUN APP
 # -------------------------------------------------
-if __name__ == "__main__":   
+app = create_app()
+
+if __name__ == "__main__":
+    from controller.bootstrap import bootstrap
+
+    bootstrap()
     app.run(debug=True)
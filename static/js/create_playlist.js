@@ -0,0 +1,99 @@
+/* SELECT ALL */
+document.getElementById("selectAll").addEventListener("change", function(){
+    document.querySelectorAll(".song-checkbox").forEach(cb => {
+        cb.checked = this.checked;
+    });
+});
+
+/* SONG LIST: loaded page by page from /api/songs */
+const songList = document.getElementById("songList");
+const shownIds = new Set();
+let catalogCursor = null;
+let catalogDone = false;
+let catalogLoading = false;
+
+function addSongRow(song){
+    if(shownIds.has(song.id)) return;
+    shownIds.add(song.id);
+    const row = document.createElement("div");
+    row.className = "song-row";
+    row.dataset.name = song.title + " " + (song.artist || "");
+    row.innerHTML = '<div class="song-img"></div><div class="song-info"><div class="song-title"></div><div class="song-artist"></div></div><input type="checkbox" class="add-btn song-checkbox">';
+    row.querySelector(".song-title").textContent = song.title;
+    row.querySelector(".song-artist").textContent = song.artist || "";
+    const cb = row.querySelector(".song-checkbox");
+    cb.value = song.id;
+    cb.checked = document.getElementById("selectAll").checked;
+    songList.appendChild(row);
+}
+
+function loadCatalogPage(){
+    if(catalogDone || catalogLoading) return;
+    catalogLoading = true;
+    let url = "/api/songs?fields=title,artist";
+    if(catalogCursor) url += "&cursor=" + catalogCursor;
+    fetch(url)
+        .then(res => res.json())
+        .then(data => {
+            data.songs.forEach(addSongRow);
+            catalogCursor = data.next_cursor;
+            catalogDone = !data.next_cursor;
+            catalogLoading = false;
+            catalogObserver.unobserve(catalogSentinel);
+            if(!catalogDone) catalogObserver.observe(catalogSentinel);
+        })
+        .catch(() => { catalogLoading = false; });
+}
+
+const catalogSentinel = document.getElementById("catalogSentinel");
+const catalogObserver = new IntersectionObserver(entries => {
+    if(entries[0].isIntersecting) loadCatalogPage();
+});
+catalogObserver.observe(catalogSentinel);
+
+/* SEARCH: filter loaded rows, and pull in matches not loaded yet */
+function filterRows(value){
+    document.querySelectorAll(".song-row").forEach(row => {
+        row.style.display =
+            row.dataset.name.toLowerCase().includes(value)
+            ? "flex" : "none";
+    });
+}
+
+const runSearch = liveSearch(songs => {
+    songs.forEach(addSongRow);
+    filterRows(document.getElementById("searchInput").value.toLowerCase());
+});
+
+document.getElementById("searchInput").addEventListener("input", function(){
+    const value = this.value.toLowerCase();
+    filterRows(value);
+    runSearch(value);
+});
+
+/* AJAX CREATE PLAYLIST */
+function createPlaylist(){
+    const name = document.getElementById("playlistName").value.trim();
+    if(!name){
+        alert("Enter playlist name");
+        return;
+    }
+
+    const songs = [];
+    document.querySelectorAll(".song-checkbox:checked")
+        .forEach(cb => songs.push(cb.value));
+
+    fetch("/create-playlist", {
+        method:"POST",
+        headers:{ "Content-Type":"application/json" },
+        body:JSON.stringify({
+            playlist_name: name,
+            song_ids: songs
+        })
+    })
+    .then(res => res.json())
+    .then(data => {
+        alert(data.message);
+        window.location.href="/playlist";
+    });
+}
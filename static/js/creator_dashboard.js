@@ -0,0 +1,17 @@
+/* Poll songs whose processing is still pending */
+function pollJobs(){
+    const pending = document.querySelectorAll(".job-status.queued, .job-status.running");
+    if(!pending.length) return;
+    pending.forEach(el => {
+        fetch(`/api/songs/${el.dataset.songId}/jobs`)
+            .then(res => res.json())
+            .then(data => {
+                const last = data.jobs.filter(j => j.kind === "lyrics").pop();
+                if(!last) return;
+                el.className = "job-status " + last.status;
+                el.textContent = "· Lyrics: " + last.status;
+            });
+    });
+    setTimeout(pollJobs, 5000);
+}
+setTimeout(pollJobs, 5000);
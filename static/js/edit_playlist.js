@@ -0,0 +1,53 @@
+/* Songs are saved in the order their checkboxes appear: the playlist order
+   above first, then any newly ticked catalog songs appended at the end. */
+function moveSong(btn, step){
+    const item = btn.closest(".song-item");
+    const sibling = step < 0 ? item.previousElementSibling : item.nextElementSibling;
+    if(!sibling) return;
+    if(step < 0) sibling.before(item); else sibling.after(item);
+}
+
+/* The playlist's songs are rendered above; the rest of the catalog is
+   loaded page by page from /api/songs as the list scrolls into view. */
+const songList = document.getElementById("songList");
+const shownIds = new Set(
+    [...document.querySelectorAll("#orderList input[name=song_ids]")].map(cb => Number(cb.value))
+);
+let catalogCursor = null;
+let catalogDone = false;
+let catalogLoading = false;
+
+function loadCatalogPage(){
+    if(catalogDone || catalogLoading) return;
+    catalogLoading = true;
+    let url = "/api/songs?fields=title";
+    if(catalogCursor) url += "&cursor=" + catalogCursor;
+    fetch(url)
+        .then(res => res.json())
+        .then(data => {
+            data.songs.forEach(song => {
+                if(shownIds.has(song.id)) return;
+                shownIds.add(song.id);
+                const label = document.createElement("label");
+                label.className = "song-item";
+                const cb = document.createElement("input");
+                cb.type = "checkbox";
+                cb.name = "song_ids";
+                cb.value = song.id;
+                label.append(cb, " " + song.title);
+                songList.appendChild(label);
+            });
+            catalogCursor = data.next_cursor;
+            catalogDone = !data.next_cursor;
+            catalogLoading = false;
+            catalogObserver.unobserve(catalogSentinel);
+            if(!catalogDone) catalogObserver.observe(catalogSentinel);
+        })
+        .catch(() => { catalogLoading = false; });
+}
+
+const catalogSentinel = document.getElementById("catalogSentinel");
+const catalogObserver = new IntersectionObserver(entries => {
+    if(entries[0].isIntersecting) loadCatalogPage();
+});
+catalogObserver.observe(catalogSentinel);
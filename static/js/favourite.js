@@ -0,0 +1,13 @@
+/* Prefer the HLS playlist where the browser plays HLS natively */
+const canPlayHls = document.createElement("audio").canPlayType("application/vnd.apple.mpegurl") !== "";
+
+function play(src, hls){
+    const p = document.getElementById("player");
+    p.src = (canPlayHls && hls) ? hls : src;
+    p.play();
+}
+
+function unlike(songId, el){
+    interactions.unlike(songId);
+    el.closest(".song").remove();
+}
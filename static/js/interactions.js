@@ -0,0 +1,92 @@
+/* Likes, unlikes and play starts, queued and sent to /api/interactions in
+   batches. Likes go out within a couple of seconds; plays, which nobody
+   waits on, ride along with them or go out every few minutes. A full
+   batch is sent at once, and whatever is queued when the page is hidden
+   goes with sendBeacon. A like and an unlike of the same song that are
+   both still queued cancel out. Every op carries an idempotency key, so a
+   batch that failed can be resent without being applied twice. Like
+   state for the songs around the one playing comes from /api/likes, one
+   request per page of songs. */
+const interactions = (() => {
+    const LIKE_DELAY = 2000, PLAY_DELAY = 5 * 60 * 1000, MAX_OPS = 50, LIKES_PAGE = 50;
+    let queue = [], timer = null, due = Infinity, sending = false;
+    const likes = new Map();  // song id -> liked
+
+    function newKey(){
+        return crypto.randomUUID ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+
+    function schedule(ms){
+        clearTimeout(timer);
+        due = Date.now() + ms;
+        timer = setTimeout(flush, ms);
+    }
+
+    /* Only ever brings the next send forward. */
+    function scheduleWithin(ms){
+        if(Date.now() + ms < due) schedule(ms);
+    }
+
+    function add(op, songId){
+        if(op !== "play"){
+            const opposite = op === "like" ? "unlike" : "like";
+            const i = queue.findIndex(o => o.op === opposite && o.song_id === songId);
+            if(i >= 0){ queue.splice(i, 1); return; }
+        }
+        queue.push({op, song_id: songId, key: newKey(), at: Date.now()});
+        if(queue.length >= MAX_OPS) flush();
+        else scheduleWithin(op === "play" ? PLAY_DELAY : LIKE_DELAY);
+    }
+
+    function flush(){
+        clearTimeout(timer);
+        due = Infinity;
+        if(sending || !queue.length) return;
+        const batch = queue.splice(0, MAX_OPS);
+        sending = true;
+        fetch("/api/interactions", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({ops: batch})
+        })
+            .then(res => {
+                if(res.status === 429 || res.status >= 500){
+                    queue = batch.concat(queue);
+                    schedule((Number(res.headers.get("Retry-After")) || 5) * 1000);
+                } else if(queue.length){
+                    schedule(0);
+                }
+            })
+            .catch(() => { queue = batch.concat(queue); schedule(5000); })
+            .finally(() => { sending = false; });
+    }
+
+    document.addEventListener("visibilitychange", () => {
+        if(document.visibilityState !== "hidden" || !queue.length || sending) return;
+        const batch = queue.splice(0, MAX_OPS);
+        const body = new Blob([JSON.stringify({ops: batch})], {type: "application/json"});
+        if(!navigator.sendBeacon("/api/interactions", body)) queue = batch.concat(queue);
+    });
+
+    function loadLikes(songIds){
+        const missing = songIds.filter(id => !likes.has(id)).slice(0, LIKES_PAGE);
+        if(!missing.length) return Promise.resolve();
+        return fetch(`/api/likes?ids=${missing.join(",")}`)
+            .then(res => res.json())
+            .then(data => {
+                const liked = new Set(data.liked || []);
+                // A click made while this was in flight wins.
+                missing.forEach(id => { if(!likes.has(id)) likes.set(id, liked.has(id)); });
+            });
+    }
+
+    return {
+        like(songId){ likes.set(songId, true); add("like", songId); },
+        unlike(songId){ likes.set(songId, false); add("unlike", songId); },
+        play(songId){ add("play", songId); },
+        isLiked(songId){ return likes.get(songId) === true; },
+        loadLikes,
+        flush
+    };
+})();
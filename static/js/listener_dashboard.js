@@ -0,0 +1,231 @@
+let queue = [];
+let currentIndex = 0;
+let isPlaying = false;
+
+/* Catalog: hydrated from the content-hashed snapshot chunks listed in the
+   manifest. Unchanged chunks come from the browser cache without a request;
+   an unchanged manifest is a 304. */
+let catalog = [];
+const CARD_SIZE = 120, CARD_GAP = 25;
+const catalogView = document.getElementById("catalogView");
+const catalogSpacer = document.getElementById("catalogSpacer");
+
+function songFromRow(fields, row){
+    const song = {};
+    fields.forEach((f, i) => { song[f] = row[i]; });
+    song.file = `/stream/${song.id}`;
+    song.hls = song.hls ? `/hls/${song.id}/index.m3u8` : null;
+    return song;
+}
+
+function loadCatalog(){
+    fetch("/catalog/manifest.json")
+        .then(res => res.json())
+        .then(manifest => Promise.all(
+            manifest.chunks.map(name => fetch(`/catalog/${name}`).then(res => res.json()))
+        ))
+        .then(chunks => {
+            // Chunks arrive newest first, each already sorted newest first.
+            catalog = chunks.flatMap(chunk => chunk.songs.map(row => songFromRow(chunk.fields, row)));
+            renderCatalog();
+        });
+}
+
+/* Virtualized grid: only cards in (or next to) the viewport are created */
+let renderedRange = "";
+function renderCatalog(force){
+    const step = CARD_SIZE + CARD_GAP;
+    const columns = Math.max(1, Math.floor((catalogView.clientWidth + CARD_GAP) / step));
+    const rows = Math.ceil(catalog.length / columns);
+    catalogSpacer.style.height = Math.max(0, rows * step - CARD_GAP) + "px";
+
+    const firstRow = Math.max(0, Math.floor(catalogView.scrollTop / step) - 1);
+    const lastRow = Math.min(rows, Math.ceil((catalogView.scrollTop + catalogView.clientHeight) / step) + 1);
+    const range = `${columns}:${firstRow}:${lastRow}:${catalog.length}`;
+    if(range === renderedRange && !force) return;
+    renderedRange = range;
+
+    const cards = document.createDocumentFragment();
+    for(let i = firstRow * columns; i < Math.min(catalog.length, lastRow * columns); i++){
+        const song = catalog[i];
+        const card = document.createElement("div");
+        card.className = "song-card";
+        card.style.left = (i % columns) * step + "px";
+        card.style.top = Math.floor(i / columns) * step + "px";
+        const title = document.createElement("div");
+        title.textContent = song.title;
+        const artist = document.createElement("div");
+        artist.className = "lyrics-preview";
+        artist.textContent = song.artist;
+        card.append(title, artist);
+        card.onclick = () => playFromCatalog(i);
+        cards.appendChild(card);
+    }
+    catalogView.replaceChildren(catalogSpacer, cards);
+}
+
+catalogView.addEventListener("scroll", () => requestAnimationFrame(() => renderCatalog()), {passive: true});
+window.addEventListener("resize", () => renderCatalog());
+loadCatalog();
+
+/* Song rows filled from a JSON endpoint: recommendations (songs collected
+   by listeners with similar taste) and the precomputed trending chart */
+function loadSongRow(url, rowId){
+    fetch(url)
+        .then(res => res.json())
+        .then(data => {
+            const songs = data.songs;
+            const row = document.getElementById(rowId);
+            songs.forEach((song, i) => {
+                const card = document.createElement("div");
+                card.className = "song-card";
+                const title = document.createElement("div");
+                title.textContent = song.title;
+                const artist = document.createElement("div");
+                artist.className = "lyrics-preview";
+                artist.textContent = song.artist;
+                card.append(title, artist);
+                card.onclick = () => { queue = songs; currentIndex = i; loadAndPlay(); };
+                row.appendChild(card);
+            });
+        });
+}
+loadSongRow("/recommendations", "forYouSongs");
+loadSongRow("/charts/trending", "trendingSongs");
+
+/* Update mini player details */
+function updatePlayerInfo(song){
+    document.getElementById('playerTitle').textContent = song.title;
+    document.getElementById('playerArtist').textContent = song.artist;
+    const lyrics = document.getElementById('playerLyrics');
+    lyrics.textContent = song.lyrics || "Lyrics not available";
+    // Snapshot songs carry no lyrics; fetch them when the song is played.
+    if(song.lyrics === undefined){
+        fetch(`/api/songs/${song.id}/lyrics`)
+            .then(res => res.json())
+            .then(data => {
+                song.lyrics = data.lyrics || "";
+                if(queue[currentIndex] === song) lyrics.textContent = song.lyrics || "Lyrics not available";
+            });
+    }
+    updateMiniLike();
+}
+
+/* Update like button */
+function updateMiniLike(){
+    const song = queue[currentIndex];
+    if(song){
+        document.getElementById('miniLikeBtn').textContent = interactions.isLiked(song.id) ? '❤️' : '🤍';
+    }
+}
+
+/* Like / unlike current song (sent in the next interaction batch) */
+function likeCurrentSong(){
+    const song = queue[currentIndex];
+    if(!song) return;
+    if(interactions.isLiked(song.id)) interactions.unlike(song.id);
+    else interactions.like(song.id);
+    updateMiniLike();
+}
+
+/* Prefer the HLS playlist where the browser plays HLS natively */
+const canPlayHls = document.createElement("audio").canPlayType("application/vnd.apple.mpegurl") !== "";
+function sourceFor(song){
+    return (canPlayHls && song.hls) ? song.hls : song.file;
+}
+
+/* Load and play song */
+function loadAndPlay(){
+    if(queue.length === 0) return;
+    const song = queue[currentIndex];
+    const player = document.getElementById("audioPlayer");
+    player.src = sourceFor(song);
+    updatePlayerInfo(song);
+    interactions.play(song.id);
+    // Like state for this song and the next ones in the queue, in one request.
+    interactions.loadLikes(queue.slice(currentIndex, currentIndex + 50).map(s => s.id)).then(updateMiniLike);
+    player.play().catch(err => console.log("Play blocked:", err));
+    isPlaying = true;
+    document.getElementById("playPauseBtn").textContent = '⏸';
+    player.onended = () => nextSong();
+}
+
+/* Next / Previous */
+function nextSong(){
+    if(queue.length === 0) return;
+    currentIndex = (currentIndex + 1) % queue.length;
+    loadAndPlay();
+}
+
+function prevSong(){
+    if(queue.length === 0) return;
+    currentIndex = (currentIndex - 1 + queue.length) % queue.length;
+    loadAndPlay();
+}
+
+/* Play / Pause */
+function togglePlayPause(){
+    const player = document.getElementById("audioPlayer");
+    if(!queue.length) return;
+    if(isPlaying){
+        player.pause();
+        isPlaying = false;
+        document.getElementById("playPauseBtn").textContent = '▶';
+    } else {
+        player.play().catch(err => console.log("Play blocked:", err));
+        isPlaying = true;
+        document.getElementById("playPauseBtn").textContent = '⏸';
+    }
+}
+
+/* Play selected song */
+function playFromCatalog(index){
+    queue = catalog;
+    currentIndex = index;
+    loadAndPlay();
+}
+
+/* Play playlist */
+function playPlaylist(playlistId){
+    fetch(`/playlist-songs/${playlistId}`)
+        .then(res => res.json())
+        .then(data => {
+            queue = data.songs.map(s => ({
+                file: s.file,
+                id: s.id,
+                title: s.title,
+                artist: s.artist,
+                lyrics: s.lyrics || "Lyrics not available",
+                likes: s.likes || 0
+            }));
+            currentIndex = 0;
+            loadAndPlay();
+        });
+}
+
+/* Search songs */
+const runSearch = liveSearch(songs => {
+    const resultsDiv = document.getElementById("searchResults");
+    resultsDiv.innerHTML = "";
+    if(songs.length === 0){
+        resultsDiv.innerHTML = "<p>No results found.</p>";
+        return;
+    }
+    songs.forEach(song => {
+        const div = document.createElement("div");
+        div.className = "song-card";
+        div.textContent = song.title + " - " + song.artist;
+        div.onclick = () => {
+            queue = [{file:song.file, id:song.id, title:song.title, artist:song.artist, lyrics: song.lyrics || "Lyrics not available", likes: song.likes || 0}];
+            currentIndex = 0;
+            loadAndPlay();
+        };
+        resultsDiv.appendChild(div);
+    });
+});
+
+function searchSongs(query){
+    // Clear stale results at once; new ones arrive after the debounce.
+    if(!query) document.getElementById("searchResults").innerHTML = "";
+    runSearch(query);
+}
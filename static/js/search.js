@@ -0,0 +1,39 @@
+/* Search-as-you-type against /search-songs.
+   Keystrokes are debounced. Each request carries an increasing seq, and
+   starting a new one aborts the one in flight, so only the newest answer
+   is ever shown. seq counts from 0 again on every page load, so requests
+   also carry a random page id, which the server keys the numbering on.
+   The server skips or interrupts searches a newer seq has superseded
+   (204), and answers 429 with Retry-After when throttled; the latest
+   query is then retried once the wait is over. */
+function liveSearch(onResults, delay = 200){
+    let timer = null, controller = null, seq = 0;
+    const page = Math.random().toString(36).slice(2, 12);
+
+    function run(query){
+        if(controller) controller.abort();
+        controller = new AbortController();
+        const mine = ++seq;
+        fetch(`/search-songs?q=${encodeURIComponent(query)}&page=${page}&seq=${mine}`, {signal: controller.signal})
+            .then(res => {
+                if(res.status === 429){
+                    const wait = Number(res.headers.get("Retry-After")) || 1;
+                    timer = setTimeout(() => { if(mine === seq) run(query); }, wait * 1000);
+                    return null;
+                }
+                return res.status === 204 ? null : res.json();
+            })
+            .then(data => { if(data && mine === seq) onResults(data.songs, query); })
+            .catch(err => { if(err.name !== "AbortError") console.log("Search failed:", err); });
+    }
+
+    return function(query){
+        clearTimeout(timer);
+        if(!query){
+            if(controller) controller.abort();
+            seq++;
+            return;
+        }
+        timer = setTimeout(() => run(query), delay);
+    };
+}
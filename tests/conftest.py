@@ -0,0 +1,55 @@
+"""Shared test setup.
+
+controller.config reads its settings when it is first imported, so every
+file the app writes (database, response cache, rate limits, metrics,
+catalog snapshot) is pointed at a scratch directory here, before any test
+module imports the controller.
+"""
+import os
+import tempfile
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix="isai-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(SCRATCH, 'music.db')}",
+    "CACHE_DB_PATH": os.path.join(SCRATCH, "cache.db"),
+    "RATE_LIMIT_DB_PATH": os.path.join(SCRATCH, "ratelimit.db"),
+    "METRICS_DB_PATH": os.path.join(SCRATCH, "metrics.db"),
+    "SNAPSHOT_DIR": os.path.join(SCRATCH, "catalog"),
+    # As deployed: one proxy in front, appending to X-Forwarded-For.
+    "TRUSTED_PROXIES": "1",
+})
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Create the schema once; returns the path of the SQLite file."""
+    from controller.database import create_tables, engine
+
+    create_tables()
+    return engine.url.database
+
+
+@pytest.fixture
+def db(database):
+    from controller.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
+
+
+@pytest.fixture
+def app(database):
+    from main import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from controller import admin
+from controller.bootstrap import create_default_roles
+from controller.models import Favorite, Role, Song, StatCounter, User
+from controller.stats import read_counters, refresh_counters
+
+
+@pytest.fixture
+def library(db):
+    create_default_roles(db)
+    roles = dict(db.query(Role.name, Role.id))
+    users = [User(username=f"user{n}", email_or_phone=f"user{n}@example.com", password="x",
+                  role_id=roles["admin" if n == 0 else "listener"]) for n in range(3)]
+    songs = [Song(title=f"Song {n:02}", artist_name="Artist", genre="jazz" if n < 20 else None,
+                  file_path=f"songs/{n}.mp3") for n in range(30)]
+    db.add_all(users + songs)
+    db.flush()
+    db.add(Favorite(user_id=users[1].id, song_id=songs[0].id))
+    db.commit()
+    yield users, songs
+    db.rollback()
+    for model in (Favorite, Song, User):
+        db.query(model).delete()
+    db.commit()
+
+
+def test_counters_follow_every_write(db, library):
+    users, songs = library
+    totals = read_counters(db)
+    assert totals["total_users"] == 3 and totals["users_by_role"] == {"admin": 1, "listener": 2}
+    assert totals["songs_by_genre"] == {"jazz": 20, "Unknown": 10}
+    assert totals["total_favorites"] == 1
+
+    songs[0].genre = "folk"
+    db.delete(songs[1])
+    db.query(Favorite).delete()
+    db.commit()
+    totals = read_counters(db)
+    assert totals["songs_by_genre"] == {"jazz": 18, "Unknown": 10, "folk": 1}
+    assert totals["total_songs"] == 29 and totals["total_favorites"] == 0
+
+
+def test_refresh_repairs_drifted_counters(database, db, library):
+    db.query(StatCounter).filter_by(name="favorites").update({StatCounter.value: 99})
+    db.commit()
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        refresh_counters(conn)
+    finally:
+        conn.close()
+    db.expire_all()
+    assert read_counters(db)["total_favorites"] == 1
+
+
+def test_song_pages_sort_with_a_stable_tiebreak(db, library):
+    _, songs = library
+    first = admin.song_page(db, page=1, sort="genre", direction="asc")
+    second = admin.song_page(db, page=2, sort="genre", direction="asc")
+    assert first["has_next"] and not second["has_next"]
+    ids = [row.id for row in first["rows"] + second["rows"]]
+    # NULL genres first, then jazz; ties ordered by id.
+    assert ids == [s.id for s in songs[20:]] + [s.id for s in songs[:20]]
+
+
+def test_unknown_sorts_and_pages_fall_back(db, library):
+    users, _ = library
+    page = admin.user_page(db, page=0, sort="password", direction="sideways")
+    assert (page["page"], page["sort"], page["direction"]) == (1, "id", "asc")
+    assert [row.username for row in page["rows"]] == [u.username for u in users]
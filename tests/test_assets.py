@@ -0,0 +1,72 @@
+import gzip
+import os
+
+import pytest
+
+from controller import assets
+from controller.precompress import best_encoding, write_with_copies
+
+
+@pytest.fixture
+def chunk(tmp_path):
+    path = str(tmp_path / "chunk.json")
+    write_with_copies(path, b'{"songs": []}' * 50)
+    # A stand-in brotli copy, whether or not the module is installed.
+    with open(path + ".br", "wb") as f:
+        f.write(b"br")
+    return path
+
+
+def test_copies_are_complete_and_reproducible(tmp_path):
+    data = b"a" * 1000
+    write_with_copies(str(tmp_path / "a" / "x.css"), data)
+    write_with_copies(str(tmp_path / "b" / "x.css"), data)
+    first, second = (open(tmp_path / d / "x.css.gz", "rb").read() for d in "ab")
+    assert gzip.decompress(first) == data
+    assert first == second
+
+
+@pytest.mark.parametrize("accept, encoding", [
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+    ("identity", None),
+])
+def test_best_encoding_follows_the_clients_q_values(chunk, accept, encoding):
+    path, chosen = best_encoding(chunk, accept)
+    assert chosen == encoding
+    assert path == chunk + {"br": ".br", "gzip": ".gz", None: ""}[encoding]
+
+
+def test_missing_copies_are_skipped(chunk):
+    os.unlink(chunk + ".br")
+    assert best_encoding(chunk, "br") == (chunk, None)
+
+
+def test_minifiers_leave_strings_alone():
+    css = "/* header */\na  b , c {\n  color :  red;\n  margin: 0 ;\n}\n"
+    assert assets.minify_css(css) == "a b,c{color :red;margin:0}\n"
+    js = 'const url = "http://example.com"; // trailing\n/* block */\n\n  let s = `a /* b */ c`;\n'
+    assert assets.minify_js(js) == 'const url = "http://example.com";\nlet s = `a /* b */ c`;\n'
+
+
+def test_built_assets_are_fingerprinted_and_served_immutable(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "ASSET_DIST_DIR", str(tmp_path))
+    manifest = assets.build_assets(str(tmp_path))
+    built = manifest["css/login.css"]
+    assert assets._NAME.match(built) and built.startswith("login.")
+
+    with client.application.test_request_context():
+        assert assets.asset_url("css/login.css") == f"/assets/{built}"
+        assert assets.asset_url("css/missing.css") == "/static/css/missing.css"
+
+    resp = client.get(f"/assets/{built}", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    with open(tmp_path / built, "rb") as f:
+        assert gzip.decompress(resp.data) == f.read()
+    assert client.get("/assets/login.00000000.css").status_code == 404
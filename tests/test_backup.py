@@ -0,0 +1,193 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from controller import backup
+from controller.bootstrap import create_default_roles
+from controller.database import SessionLocal
+from controller.models import Favorite, Playlist, PlaylistSong, RecentlyPlayed, Role, Song, User
+
+LIBRARY_TABLES = ("recently_played", "playlist_songs", "playlists", "favorites", "songs", "blobs", "users")
+PLAYED_AT = datetime(2026, 1, 1, 12, 0)
+
+
+def _wipe(db):
+    for table in LIBRARY_TABLES:
+        db.execute(text(f"DELETE FROM {table}"))
+    db.commit()
+
+
+@pytest.fixture
+def library(db):
+    """A small library: an admin with an upload, a listener with likes, a playlist and history."""
+    _wipe(db)
+    create_default_roles(db)
+    roles = dict(db.query(Role.name, Role.id))
+    admin = User(username="admin", email_or_phone="admin@example.com", password="x", role_id=roles["admin"])
+    fan = User(username="fan", email_or_phone="fan@example.com", password="y", role_id=roles["listener"])
+    db.add_all([admin, fan])
+    db.flush()
+    songs = [
+        Song(title=f"Song {n}", artist_name="Artist", file_path=f"songs/{n}.mp3", uploader_id=admin.id)
+        for n in range(3)
+    ]
+    db.add_all(songs)
+    db.flush()
+    playlist = Playlist(name="Mix", user_id=fan.id)
+    db.add(playlist)
+    db.flush()
+    db.add_all([
+        Favorite(user_id=fan.id, song_id=songs[0].id),
+        Favorite(user_id=fan.id, song_id=songs[2].id),
+        PlaylistSong(playlist_id=playlist.id, song_id=songs[2].id, position=1.0),
+        PlaylistSong(playlist_id=playlist.id, song_id=songs[1].id, position=2.0),
+        RecentlyPlayed(user_id=fan.id, song_id=songs[1].id, played_at=PLAYED_AT),
+    ])
+    db.commit()
+    yield
+    _wipe(db)
+
+
+def _contents(db):
+    """The library by logins and titles, independent of ids."""
+    def rows(sql):
+        return sorted(tuple(row) for row in db.execute(text(sql)))
+
+    return {
+        "users": rows("SELECT email_or_phone, username, password, roles.name FROM users JOIN roles ON roles.id = role_id"),
+        "songs": rows("SELECT title, email_or_phone FROM songs LEFT JOIN users ON users.id = uploader_id"),
+        "favorites": rows("""
+            SELECT email_or_phone, title FROM favorites
+            JOIN users ON users.id = user_id JOIN songs ON songs.id = song_id
+        """),
+        "playlists": rows("""
+            SELECT email_or_phone, name, title, position FROM playlist_songs
+            JOIN playlists ON playlists.id = playlist_id
+            JOIN users ON users.id = playlists.user_id JOIN songs ON songs.id = song_id
+        """),
+        "recently_played": rows("""
+            SELECT email_or_phone, title, played_at FROM recently_played
+            JOIN users ON users.id = user_id JOIN songs ON songs.id = song_id
+        """),
+    }
+
+
+def _indexes(db):
+    return {name for (name,) in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+
+
+@pytest.mark.parametrize("name", ["library.ndjson", "library.ndjson.gz", "library.ndjson.xz"])
+def test_restore_into_an_empty_library(db, library, tmp_path, name):
+    dump = str(tmp_path / name)
+    before, indexes = _contents(db), _indexes(db)
+    counts = backup.export(dump)
+    assert counts["songs"] == 3 and counts["favorites"] == 2
+
+    _wipe(db)
+    assert backup.import_(dump) == {**counts, "blobs": 0}
+    db.expire_all()
+
+    assert _contents(db) == before
+    # The indexes dropped for the load are all back.
+    assert _indexes(db) == indexes
+
+
+def test_merge_remaps_ids_and_reuses_existing_logins(db, library, tmp_path):
+    dump = str(tmp_path / "library.ndjson")
+    backup.export(dump)
+    before, indexes = _contents(db), _indexes(db)
+    max_song = db.query(Song.id).order_by(Song.id.desc()).first()[0]
+
+    counts = backup.import_(dump)
+    db.expire_all()
+
+    # Both logins exist already: no new accounts, the rows land on them.
+    assert counts["users"] == 0
+    assert db.query(User).count() == 2
+    assert sorted(id for (id,) in db.query(Song.id))[3:] == [max_song + n for n in range(1, 4)]
+    after = _contents(db)
+    assert after["songs"] == sorted(before["songs"] * 2)
+    # The same titles again as new songs: every favorite and playlist entry
+    # is duplicated onto the copies, none of them dangling.
+    assert after["favorites"] == sorted(before["favorites"] * 2)
+    assert after["playlists"] == sorted(before["playlists"] * 2)
+    assert db.query(Playlist).count() == 2
+    # A merge leaves the indexes in place.
+    assert _indexes(db) == indexes
+
+
+def test_merge_survives_rows_added_between_chunks(db, library, tmp_path, monkeypatch):
+    dump = str(tmp_path / "library.ndjson")
+    backup.export(dump)
+    before = _contents(db)
+    monkeypatch.setattr(backup, "IMPORT_CHUNK", 2)
+
+    # Right after the first chunk of songs is committed, the app stores an
+    # upload through its own connection, taking the next free id.
+    read_lines = backup._read_lines
+
+    def interleaved(f):
+        table, songs = None, 0
+        for item in read_lines(f):
+            yield item
+            if isinstance(item, dict):
+                table = item.get("table")
+            elif table == "songs":
+                songs += 1
+                if songs == backup.IMPORT_CHUNK:
+                    other = SessionLocal()
+                    other.add(Song(title="Uploaded meanwhile", artist_name="B", file_path="songs/live.mp3"))
+                    other.commit()
+                    other.close()
+
+    monkeypatch.setattr(backup, "_read_lines", interleaved)
+    counts = backup.import_(dump)
+    db.expire_all()
+
+    assert counts["songs"] == 3 and counts["playlist_songs"] == 2
+    after = _contents(db)
+    assert after["songs"] == sorted(before["songs"] * 2 + [("Uploaded meanwhile", None)])
+    assert after["favorites"] == sorted(before["favorites"] * 2)
+    assert after["playlists"] == sorted(before["playlists"] * 2)
+
+
+def test_rows_pointing_outside_the_dump_are_skipped(db, tmp_path):
+    _wipe(db)
+    dump = tmp_path / "dangling.ndjson"
+    lines = [
+        {"format": backup.EXPORT_FORMAT, "version": backup.EXPORT_VERSION, "tables": list(backup.LOADERS)},
+        {"table": "users", "columns": ["id", "username", "email_or_phone", "password", "role"]},
+        [1, "fan", "fan@example.com", "y", "listener"],
+        {"table": "songs", "columns": ["id", "title", "artist_name", "genre", "language", "file_path", "lyrics",
+                                       "duration", "bitrate", "sample_rate", "seek_index", "uploader_id"]},
+        [1, "Song", "Artist", None, None, "songs/1.mp3", None, None, None, None, None, 9],
+        {"table": "favorites", "columns": ["user_id", "song_id"]},
+        [1, 1], [1, 2], [2, 1],
+        {"table": "playlists", "columns": ["id", "name", "user_id"]},
+        [1, "Mine", 1], [2, "Orphan", 2],
+        {"table": "playlist_songs", "columns": ["playlist_id", "song_id", "position"]},
+        [1, 1, 1.0], [1, 2, 2.0], [2, 1, 1.0],
+        {"table": "recently_played", "columns": ["user_id", "song_id", "played_at"]},
+        [1, 1, "2026-01-01 12:00:00"], [1, 3, "2026-01-01 12:00:00"],
+    ]
+    dump.write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+    try:
+        counts = backup.import_(str(dump))
+        db.expire_all()
+        assert counts == {"users": 1, "songs": 1, "favorites": 1, "playlists": 1,
+                          "playlist_songs": 1, "recently_played": 1}
+        # An uploader missing from the dump leaves the song without one.
+        assert db.query(Song.uploader_id).scalar() is None
+        assert [name for (name,) in db.query(Playlist.name)] == ["Mine"]
+    finally:
+        _wipe(db)
+
+
+def test_rejects_files_that_are_not_exports(db, tmp_path):
+    dump = tmp_path / "other.json"
+    dump.write_text('{"format": "something-else"}\n')
+    with pytest.raises(ValueError, match="is not a version 1 isai-library export"):
+        backup.import_(str(dump))
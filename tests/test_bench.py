@@ -0,0 +1,61 @@
+import json
+import random
+import sqlite3
+import subprocess
+import sys
+
+from bench.generate import Popularity
+from bench.run import ROUTES, percentile, regressions
+
+
+def _bench(*args):
+    # Separate processes: both read DATABASE_URL from --db when the
+    # controller is first imported.
+    subprocess.run([sys.executable, "-m", *args], check=True, capture_output=True)
+
+
+def test_generated_data_drives_every_route(tmp_path):
+    db, out = str(tmp_path / "bench.db"), str(tmp_path / "results.json")
+    _bench("bench.generate", "--db", db, "--scale", "0.0002")
+    conn = sqlite3.connect(db)
+    try:
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("users", "songs", "recently_played")}
+        # The triggers ran: counters agree with the rows written.
+        favorites = conn.execute("SELECT value FROM stat_counters WHERE name = 'favorites'").fetchone()[0]
+        assert favorites == conn.execute("SELECT COUNT(*) FROM favorites").fetchone()[0]
+    finally:
+        conn.close()
+    # 10 listeners and a creator; each listener has played all 20 songs.
+    assert counts == {"users": 11, "songs": 20, "recently_played": 200}
+
+    _bench("bench.run", "--db", db, "--requests", "4", "--warmup", "1", "-c", "2", "--output", out)
+    with open(out) as f:
+        routes = json.load(f)["routes"]
+    assert set(routes) == set(ROUTES)
+    assert all(r["requests"] == 4 and r["errors"] == 0 for r in routes.values())
+
+
+def test_popularity_samples_are_distinct_and_skewed():
+    popularity = Popularity(range(1000), random.Random(1))
+    picks = [popularity.sample(5) for _ in range(400)]
+    assert all(len(p) == 5 for p in picks)
+    top = popularity.ids[0]
+    assert sum(top in p for p in picks) > sum(popularity.ids[-1] in p for p in picks) + 100
+    assert popularity.sample(2000) == set(range(1000))
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 100)) == (50, 95, 100)
+    assert percentile([], 95) == 0.0
+
+
+def test_regressions_past_the_threshold():
+    base = {"a": {"p95_ms": 10.0, "rps": 100.0, "queries": 2}, "b": {"p95_ms": 10.0, "rps": 100.0, "queries": 2}}
+    now = {"a": {"p95_ms": 10.9, "rps": 91.0, "queries": 2}, "b": {"p95_ms": 11.5, "rps": 80.0, "queries": 3},
+           "new": {"p95_ms": 99.0, "rps": 1.0, "queries": 9}}
+    assert regressions(now, base, 0.10) == [
+        "b: p95 10.0 -> 11.5 ms",
+        "b: throughput 100.0 -> 80.0 req/s",
+        "b: queries/request 2 -> 3",
+    ]
@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from controller import blobs
+from controller.models import Blob, Song
+from controller.storage import get_storage
+
+AUDIO = b"ID3" + bytes(range(256)) * 8
+
+
+@pytest.fixture
+def storage_root(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "TMP_DIR", str(tmp_path / "tmp"))
+    monkeypatch.setattr(get_storage("local"), "root", str(tmp_path / "static"))
+    yield tmp_path
+    db.rollback()
+    db.query(Song).delete()
+    db.query(Blob).delete()
+    db.commit()
+
+
+def _upload(data, filename="Track.MP3"):
+    stream = blobs.HashingFile()
+    stream.write(data)
+    return FileStorage(stream=stream, filename=filename)
+
+
+def _ref_count(db, path):
+    db.expire_all()
+    return db.query(Blob.ref_count).filter_by(path=path).scalar()
+
+
+def test_spooled_uploads_are_hashed_as_they_are_written(storage_root):
+    upload = _upload(AUDIO)
+    assert upload.stream.sha256.hexdigest() == hashlib.sha256(AUDIO).hexdigest()
+    assert upload.stream.size == len(AUDIO)
+    upload.stream.discard()
+    assert os.listdir(blobs.TMP_DIR) == []
+
+
+def test_oversized_uploads_stop_at_the_limit(storage_root):
+    stream = blobs.HashingFile(limit=10)
+    stream.write(b"x" * 10)
+    with pytest.raises(RequestEntityTooLarge):
+        stream.write(b"x")
+    assert os.listdir(blobs.TMP_DIR) == []
+
+
+def test_identical_uploads_share_one_blob(db, storage_root):
+    paths = []
+    for _ in range(2):
+        upload = _upload(AUDIO)
+        path = blobs.store_upload(db, upload)
+        db.add(Song(title="Song", artist_name="Artist", file_path=path))
+        db.commit()
+        blobs.place_upload(upload, path)
+        paths.append(path)
+
+    digest = hashlib.sha256(AUDIO).hexdigest()
+    assert paths == [f"uploads/{digest[:2]}/{digest[2:4]}/{digest}.mp3"] * 2
+    assert db.query(Blob).count() == 1
+    assert _ref_count(db, paths[0]) == 2
+    with open(get_storage("local").path(paths[0]), "rb") as f:
+        assert f.read() == AUDIO
+    # The second spooled copy was dropped, not kept next to the blob.
+    assert os.listdir(blobs.TMP_DIR) == []
+
+
+def test_ref_counts_follow_song_deletes_and_moves(db, storage_root):
+    paths = [blobs.store_upload(db, _upload(data)) for data in (AUDIO, AUDIO[::-1])]
+    songs = [Song(title="Song", artist_name="Artist", file_path=paths[0]) for _ in range(2)]
+    db.add_all(songs)
+    db.commit()
+    assert [_ref_count(db, p) for p in paths] == [2, 0]
+
+    songs[0].file_path = paths[1]
+    db.delete(songs[1])
+    db.commit()
+    assert [_ref_count(db, p) for p in paths] == [0, 1]
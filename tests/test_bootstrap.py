@@ -0,0 +1,43 @@
+import pytest
+from werkzeug.security import check_password_hash
+
+from controller import bootstrap
+from controller.models import Role, User
+
+
+@pytest.fixture
+def no_admin(db):
+    db.query(User).filter_by(username=bootstrap.ADMIN_USERNAME).delete()
+    db.commit()
+    yield
+    db.query(User).filter_by(username=bootstrap.ADMIN_USERNAME).delete()
+    db.commit()
+
+
+def _admins(db):
+    db.expire_all()
+    return db.query(User.password, Role.name).join(Role, Role.id == User.role_id) \
+        .filter(User.username == bootstrap.ADMIN_USERNAME).all()
+
+
+def test_bootstrap_seeds_roles_and_one_admin(db, no_admin, capsys):
+    bootstrap.bootstrap()
+    bootstrap.bootstrap()
+
+    assert {name for (name,) in db.query(Role.name)} >= set(bootstrap.DEFAULT_ROLES)
+    [(password, role)] = _admins(db)
+    assert role == "admin" and check_password_hash(password, bootstrap.ADMIN_PASSWORD)
+    assert capsys.readouterr().out.splitlines() == ["✅ Admin created successfully", "ℹ️ Admin already exists"]
+
+
+def test_bootstrap_runs_from_the_flask_cli(app, db, no_admin):
+    result = app.test_cli_runner().invoke(args=["bootstrap"])
+    assert result.exit_code == 0, result.output
+    assert len(_admins(db)) == 1
+
+
+def test_creating_the_app_does_not_bootstrap(db, no_admin):
+    from main import create_app
+
+    create_app()
+    assert _admins(db) == []
@@ -0,0 +1,83 @@
+import pytest
+
+from controller.bootstrap import create_default_roles
+from controller.cache import CATALOG, ResponseCache, library, read_versions
+from controller.models import CacheVersion, Favorite, Role, Song, User
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / "cache.db"))
+
+
+@pytest.fixture
+def listener(db):
+    create_default_roles(db)
+    user = User(username="listener", email_or_phone="listener@example.com", password="x",
+                role_id=db.query(Role.id).filter_by(name="listener").scalar())
+    song = Song(title="Song", artist_name="Artist", file_path="songs/0.mp3")
+    db.add_all([user, song])
+    db.commit()
+    yield user.id, song.id
+    db.rollback()
+    db.query(Favorite).delete()
+    db.query(Song).delete()
+    db.query(User).delete()
+    db.query(CacheVersion).delete()
+    db.commit()
+
+
+def _counting(value):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return value
+
+    return compute, calls
+
+
+def test_hits_until_a_write_moves_the_version(db, cache, listener):
+    _, song_id = listener
+    compute, calls = _counting(["Song"])
+    assert cache.fetch(db, "titles", [CATALOG], compute) == ["Song"]
+    assert cache.fetch(db, "titles", [CATALOG], compute) == ["Song"]
+    assert len(calls) == 1
+
+    db.query(Song).filter_by(id=song_id).update({Song.title: "Renamed"})
+    db.commit()
+    cache.fetch(db, "titles", [CATALOG], compute)
+    assert len(calls) == 2
+
+
+def test_library_versions_are_per_user(db, listener):
+    user_id, song_id = listener
+    before = read_versions(db, [library(user_id), library(user_id + 1), CATALOG])
+    db.add(Favorite(user_id=user_id, song_id=song_id))
+    db.commit()
+    after = read_versions(db, [library(user_id), library(user_id + 1), CATALOG])
+
+    assert after[0] == before[0] + 1
+    assert after[1:] == before[1:]
+
+
+def test_workers_share_entries_through_the_file(db, cache, listener):
+    compute, calls = _counting({"a": 1})
+    cache.fetch(db, "k", [CATALOG], compute)
+    # Another worker: its own in-process tier, the same shared file.
+    other = ResponseCache(path=cache.path)
+    assert other.fetch(db, "k", [CATALOG], compute) == {"a": 1}
+    assert len(calls) == 1
+
+
+def test_values_come_back_json_round_tripped(db, cache, listener):
+    assert cache.fetch(db, "k", [CATALOG], lambda: (1, 2)) == [1, 2]
+    assert cache.fetch(db, "k", [CATALOG], lambda: None) == [1, 2]
+
+
+def test_disabled_cache_always_computes(db, tmp_path, listener):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), enabled=False)
+    compute, calls = _counting(1)
+    cache.fetch(db, "k", [CATALOG], compute)
+    cache.fetch(db, "k", [CATALOG], compute)
+    assert len(calls) == 2
@@ -0,0 +1,58 @@
+import pytest
+
+from controller.catalog import catalog_page, parse_fields
+from controller.models import Song
+
+
+@pytest.fixture
+def songs(db):
+    rows = [
+        Song(title=f"Song {n}", artist_name="Artist", genre="jazz" if n % 2 else "folk",
+             file_path=f"songs/{n}.mp3", hls_segments=3 if n == 0 else None)
+        for n in range(5)
+    ]
+    db.add_all(rows)
+    db.commit()
+    yield [row.id for row in rows]
+    db.rollback()
+    db.query(Song).delete()
+    db.commit()
+
+
+def _walk(db, **kwargs):
+    pages, cursor = [], None
+    while True:
+        page, cursor = catalog_page(db, cursor=cursor, **kwargs)
+        pages.append([song["id"] for song in page])
+        if cursor is None:
+            return pages
+
+
+def test_pages_walk_the_catalog_newest_first(db, songs):
+    assert _walk(db, limit=2) == [songs[4:2:-1], songs[2:0:-1], songs[:1]]
+
+
+def test_a_full_last_page_has_no_next_cursor(db, songs):
+    page, cursor = catalog_page(db, limit=5)
+    assert len(page) == 5 and cursor is None
+
+
+def test_new_songs_do_not_shift_later_pages(db, songs):
+    first, cursor = catalog_page(db, limit=2)
+    db.add(Song(title="New", artist_name="Artist", file_path="songs/new.mp3"))
+    db.commit()
+    second, _ = catalog_page(db, cursor=cursor, limit=2)
+    # Keyset: the next page picks up after the last id seen, no repeats.
+    assert [song["id"] for song in second] == songs[2:0:-1]
+
+
+def test_filters_apply_within_the_keyset(db, songs):
+    assert _walk(db, limit=1, genre="jazz") == [[songs[3]], [songs[1]]]
+
+
+def test_only_requested_fields_are_returned(db, songs):
+    page, _ = catalog_page(db, limit=5, fields=parse_fields("title,hls,password"))
+    assert page[-1] == {"id": songs[0], "file": f"/stream/{songs[0]}", "title": "Song 0",
+                        "hls": f"/hls/{songs[0]}/index.m3u8"}
+    assert page[0]["hls"] is None
+    assert parse_fields("password") == parse_fields(None)
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from controller import charts
+from controller.models import Chart, PlayDay, PlayHour, Song
+
+NOW = datetime(2026, 3, 1, 12, 30)
+HOUR_NOW = charts.epoch_hour(NOW)
+
+
+@pytest.fixture(autouse=True)
+def empty_counters(db):
+    yield
+    for model in (PlayHour, PlayDay, Chart, Song):
+        db.query(model).delete()
+    db.commit()
+
+
+def _songs(db, **genres):
+    """Songs by title, each in the given genre and in English."""
+    songs = {title: Song(title=title, artist_name="A", file_path=f"songs/{title}.mp3", genre=genre, language="en")
+             for title, genre in genres.items()}
+    db.add_all(songs.values())
+    db.commit()
+    return {title: song.id for title, song in songs.items()}
+
+
+def _chart(db, name, scope="all"):
+    return [song["id"] for song in charts.read_chart(db, name, scope)["songs"]]
+
+
+def _day_rows(db):
+    return {song_id for (song_id,) in db.query(PlayDay.song_id)}
+
+
+def test_day_cut_keeps_each_genres_own_top_songs(db, monkeypatch):
+    monkeypatch.setattr(charts, "CHART_DAY_TOP", 2)
+    ids = _songs(db, hit1="pop", hit2="pop", hit3="pop", filler="pop", niche="jazz")
+    day = HOUR_NOW // 24 - 3
+    plays = {"hit1": 50, "hit2": 40, "hit3": 30, "filler": 1, "niche": 2}
+    db.add_all([PlayDay(day=day, song_id=ids[title], plays=n) for title, n in plays.items()])
+    db.commit()
+
+    charts.rollup(NOW)
+    db.expire_all()
+
+    # Globally the jazz song ranks fourth of five, but it tops its genre.
+    assert _day_rows(db) == {ids["hit1"], ids["hit2"], ids["niche"]}
+    assert _chart(db, "week", "genre:jazz") == [ids["niche"]]
+    assert _chart(db, "week", "all") == [ids["hit1"], ids["hit2"], ids["niche"]]
+
+
+def test_old_hours_roll_into_days_and_old_days_expire(db):
+    ids = _songs(db, a="pop", b="pop")
+    old_hour = HOUR_NOW - charts.CHART_HOURS_KEPT - 5
+    expired_day = HOUR_NOW // 24 - charts.CHART_DAYS_KEPT - 1
+    db.add_all([
+        PlayHour(hour=old_hour, song_id=ids["a"], plays=3),
+        PlayHour(hour=old_hour + 1, song_id=ids["a"], plays=4),
+        PlayHour(hour=HOUR_NOW, song_id=ids["b"], plays=1),
+        PlayDay(day=expired_day, song_id=ids["b"], plays=100),
+    ])
+    db.commit()
+
+    charts.rollup(NOW)
+    db.expire_all()
+
+    assert {(h.hour, h.song_id) for h in db.query(PlayHour)} == {(HOUR_NOW, ids["b"])}
+    days = {(d.day, d.song_id): d.plays for d in db.query(PlayDay)}
+    assert sum(days.values()) == 7 and all(song_id == ids["a"] for _, song_id in days)
+    # The week sums days and the hours not rolled up yet; the expired day is gone.
+    assert [s["score"] for s in charts.read_chart(db, "week")["songs"]] == [7, 1]
+
+
+def test_trending_weights_recent_plays_by_half_life(db):
+    ids = _songs(db, older="pop", fresh="rock")
+    half_life = int(charts.CHART_HALF_LIFE_HOURS)
+    db.add_all([
+        PlayHour(hour=HOUR_NOW - half_life, song_id=ids["older"], plays=10),
+        PlayHour(hour=HOUR_NOW, song_id=ids["fresh"], plays=6),
+    ])
+    db.commit()
+
+    charts.rollup(NOW)
+    db.expire_all()
+
+    ranking = [(s["id"], s["score"]) for s in charts.read_chart(db, "trending")["songs"]]
+    assert ranking == [(ids["fresh"], 6), (ids["older"], 5)]
+    assert _chart(db, "trending", "genre:pop") == [ids["older"]]
+    assert _chart(db, "trending", "genre:none") == []
@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import text
+
+from controller.config import SQLITE_BUSY_TIMEOUT_MS
+from controller.database import engine, get_db
+from controller.models import Song
+
+
+@pytest.fixture
+def cleanup(db):
+    yield
+    db.query(Song).delete()
+    db.commit()
+
+
+def _titles(db):
+    db.expire_all()
+    return [title for (title,) in db.query(Song.title)]
+
+
+def test_connections_get_the_wal_profile(database):
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_BUSY_TIMEOUT_MS
+
+
+def test_request_session_is_shared_and_committed_on_teardown(app, db, cleanup):
+    with app.app_context():
+        session = get_db()
+        assert get_db() is session
+        session.add(Song(title="Kept", artist_name="Artist", file_path="songs/0.mp3"))
+    assert _titles(db) == ["Kept"]
+
+
+def test_request_session_is_rolled_back_on_error(app, db, cleanup):
+    with pytest.raises(RuntimeError):
+        with app.app_context():
+            get_db().add(Song(title="Lost", artist_name="Artist", file_path="songs/0.mp3"))
+            raise RuntimeError
+    assert _titles(db) == []
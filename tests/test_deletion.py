@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+from controller import reclaim
+from controller.bootstrap import create_default_roles
+from controller.deletion import delete_songs, delete_user
+from controller.models import (
+    Blob, Favorite, Playlist, PlaylistSong, RecentlyPlayed, ReclaimPending, ReclaimState, Role, Song, User,
+)
+from controller.storage import get_storage
+
+KEEP = "uploads/aa/bb/keep.mp3"
+RELEASED = "uploads/cc/dd/released.mp3"
+ORPHAN = "uploads/ee/ff/orphan.mp3"
+
+
+def _wipe(db):
+    for model in (Favorite, PlaylistSong, Playlist, RecentlyPlayed, Song, Blob, ReclaimPending, ReclaimState):
+        db.query(model).delete()
+    db.query(User).filter(User.username != "admin").delete()
+    db.commit()
+
+
+@pytest.fixture
+def library(db):
+    _wipe(db)
+    create_default_roles(db)
+    roles = dict(db.query(Role.name, Role.id))
+    creator = User(username="creator", email_or_phone="creator@example.com", password="x", role_id=roles["creator"])
+    fan = User(username="fan", email_or_phone="fan@example.com", password="x", role_id=roles["listener"])
+    db.add_all([creator, fan])
+    db.flush()
+    db.add_all([Blob(sha256=path[-12:], path=path, size=1, ref_count=0) for path in (KEEP, RELEASED)])
+    mine = Song(title="Mine", artist_name="Creator", file_path=RELEASED, uploader_id=creator.id)
+    other = Song(title="Other", artist_name="Someone", file_path=KEEP)
+    db.add_all([mine, other])
+    db.flush()
+    playlist = Playlist(name="Mix", user_id=fan.id)
+    db.add(playlist)
+    db.flush()
+    db.add_all([
+        Favorite(user_id=fan.id, song_id=mine.id),
+        Favorite(user_id=creator.id, song_id=other.id),
+        PlaylistSong(playlist_id=playlist.id, song_id=mine.id, position=1.0),
+        PlaylistSong(playlist_id=playlist.id, song_id=other.id, position=2.0),
+        RecentlyPlayed(user_id=fan.id, song_id=mine.id),
+    ])
+    db.commit()
+    yield creator.id, fan.id, mine.id, other.id
+    db.rollback()
+    _wipe(db)
+
+
+def _count(db, model, **filters):
+    return db.query(model).filter_by(**filters).count()
+
+
+def test_deleting_a_user_takes_their_songs_and_every_row_pointing_at_them(db, library):
+    creator, fan, mine, other = library
+    assert delete_user(db, creator)
+    db.commit()
+    db.expire_all()
+
+    assert [s for (s,) in db.query(Song.id)] == [other]
+    assert _count(db, User, id=creator) == 0
+    # The fan keeps the playlist, minus the deleted song.
+    assert [s for (s,) in db.query(PlaylistSong.song_id)] == [other]
+    assert _count(db, Favorite) == 0 and _count(db, RecentlyPlayed) == 0
+    # Released, not removed: the reclaimer deletes the file later.
+    assert dict(db.query(Blob.path, Blob.ref_count)) == {KEEP: 1, RELEASED: 0}
+
+
+def test_admins_and_unknown_users_are_not_deleted(db, library):
+    admin = User(username="boss", email_or_phone="boss@example.com", password="x",
+                 role_id=db.query(Role.id).filter_by(name="admin").scalar())
+    db.add(admin)
+    db.commit()
+    assert not delete_user(db, admin.id)
+    assert not delete_user(db, 10 ** 9)
+    assert _count(db, User, id=admin.id) == 1
+
+
+def test_delete_songs_by_criteria(db, library):
+    _, _, mine, other = library
+    assert delete_songs(db, Song.title == "Other") == 1
+    db.commit()
+    assert [s for (s,) in db.query(Song.id)] == [mine]
+    assert _count(db, PlaylistSong, song_id=other) == 0
+
+
+@pytest.fixture
+def disk(tmp_path, monkeypatch):
+    storage = get_storage("local")
+    monkeypatch.setattr(storage, "root", str(tmp_path / "static"))
+    monkeypatch.setattr(reclaim, "HLS_DIR", str(tmp_path / "hls"))
+    monkeypatch.setattr(reclaim, "TMP_DIR", str(tmp_path / "tmp"))
+    monkeypatch.setattr(reclaim, "RECLAIM_MIN_AGE", 0)
+    for key in (KEEP, RELEASED, ORPHAN):
+        os.makedirs(os.path.dirname(storage.path(key)), exist_ok=True)
+        with open(storage.path(key), "wb") as f:
+            f.write(b"audio")
+    return storage
+
+
+def test_reclaim_removes_released_and_orphaned_files_only(db, library, disk, tmp_path):
+    creator, _, _, other = library
+    delete_user(db, creator)
+    db.commit()
+    os.makedirs(tmp_path / "hls" / str(other))
+    os.makedirs(tmp_path / "hls" / "999999")
+    os.makedirs(tmp_path / "tmp")
+    (tmp_path / "tmp" / "upload.part").write_bytes(b"partial")
+
+    counts = reclaim.reclaim()
+
+    assert counts == {"blobs": 1, "orphans": 1, "deleted": 2, "hls": 1, "leftovers": 1}
+    assert [disk.exists(key) for key in (KEEP, RELEASED, ORPHAN)] == [True, False, False]
+    assert os.listdir(tmp_path / "hls") == [str(other)]
+    db.expire_all()
+    assert [p for (p,) in db.query(Blob.path)] == [KEEP]
+    assert _count(db, ReclaimPending) == 0
+
+
+def test_young_files_are_left_alone(db, library, disk, monkeypatch):
+    monkeypatch.setattr(reclaim, "RECLAIM_MIN_AGE", 3600)
+    assert reclaim.reclaim()["orphans"] == 0
+    assert disk.exists(ORPHAN)
@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+from controller import hls
+
+# 417-byte MPEG-1 Layer III frames, 1152 samples at 44.1 kHz (see test_mp3.py).
+FRAME = b"\xff\xfb\x90\x00" + bytes(413)
+FRAMES = 192  # just over 5 seconds
+
+
+def _source(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(FRAME * FRAMES)
+    return str(path)
+
+
+def test_segments_are_frame_aligned_byte_ranges(tmp_path):
+    source = _source(tmp_path)
+    out = str(tmp_path / "hls" / "1")
+    assert hls.package(source, out, segment_seconds=2) == 3
+
+    version = hashlib.sha256(FRAME * FRAMES).hexdigest()[:hls.VERSION_LENGTH]
+    audio = b""
+    for n, start in enumerate((0, 2, 4)):
+        with open(os.path.join(out, f"{version}-{n}.mp3"), "rb") as f:
+            data = f.read()
+        tag = hls.timestamp_tag(start)
+        assert data.startswith(tag)
+        body = data[len(tag):]
+        assert body[:4] == FRAME[:4] and len(body) % len(FRAME) == 0
+        audio += body
+    # Together the segments are the source, byte for byte.
+    assert audio == FRAME * FRAMES
+
+
+def test_playlist_lists_every_segment(tmp_path):
+    out = str(tmp_path / "hls" / "1")
+    hls.package(_source(tmp_path), out, segment_seconds=2)
+    with open(os.path.join(out, "index.m3u8")) as f:
+        lines = f.read().splitlines()
+
+    assert lines[:5] == ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2",
+                         "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    assert [line for line in lines if line.startswith("#EXTINF")] == \
+        ["#EXTINF:2.000,", "#EXTINF:2.000,", "#EXTINF:1.016,"]
+    assert lines[-1] == "#EXT-X-ENDLIST"
+
+
+def test_repackaging_replaces_the_old_segments(tmp_path):
+    out = str(tmp_path / "hls" / "1")
+    hls.package(_source(tmp_path), out, segment_seconds=2)
+    (tmp_path / "song.mp3").write_bytes(FRAME * 40)
+    assert hls.package(str(tmp_path / "song.mp3"), out, segment_seconds=2) == 1
+
+    assert len(os.listdir(out)) == 2
+    # No build directory is left next to the song's.
+    assert os.listdir(tmp_path / "hls") == ["1"]
+
+
+def test_non_mp3_sources_are_not_packaged(tmp_path):
+    (tmp_path / "song.mp3").write_bytes(b"not audio" * 100)
+    assert hls.package(str(tmp_path / "song.mp3"), str(tmp_path / "hls" / "1")) == 0
+    assert not os.path.exists(tmp_path / "hls" / "1")
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from controller.bootstrap import create_default_roles
+from controller.config import INTERACTION_KEY_TTL
+from controller.interactions import apply_interactions, liked_song_ids
+from controller.models import Favorite, InteractionKey, Role, Song, User
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def listener(db):
+    create_default_roles(db)
+    user = User(username="listener", email_or_phone="listener@example.com", password="x",
+                role_id=db.query(Role.id).filter_by(name="listener").scalar())
+    songs = [Song(title=f"Song {n}", artist_name="Artist", file_path=f"songs/{n}.mp3") for n in range(3)]
+    db.add_all([user, *songs])
+    db.commit()
+    yield user.id, [song.id for song in songs]
+    db.rollback()
+    db.query(InteractionKey).delete()
+    db.query(Favorite).delete()
+    db.query(Song).delete()
+    db.query(User).delete()
+    db.commit()
+
+
+def _liked(db, user_id):
+    return {sid for (sid,) in db.query(Favorite.song_id).filter_by(user_id=user_id)}
+
+
+def test_like_and_unlike_collapse_to_the_final_state(db, listener):
+    user_id, (a, b, c) = listener
+    db.add(Favorite(user_id=user_id, song_id=c))
+    db.commit()
+
+    results, plays = apply_interactions(db, user_id, [
+        {"op": "like", "song_id": a},
+        {"op": "unlike", "song_id": a},
+        {"op": "like", "song_id": a},
+        {"op": "like", "song_id": b},
+        {"op": "unlike", "song_id": b},
+        {"op": "unlike", "song_id": c},
+    ], now=NOW)
+    db.commit()
+
+    assert [r["status"] for r in results] == ["ok"] * 6
+    assert plays == []
+    assert _liked(db, user_id) == {a}
+
+
+def test_liking_twice_keeps_one_favorite(db, listener):
+    user_id, (a, _, _) = listener
+    for _ in range(2):
+        apply_interactions(db, user_id, [{"op": "like", "song_id": a}], now=NOW)
+        db.commit()
+    assert db.query(Favorite).filter_by(user_id=user_id, song_id=a).count() == 1
+
+
+def test_repeated_key_within_a_batch_is_a_duplicate(db, listener):
+    user_id, (a, _, _) = listener
+    results, _ = apply_interactions(db, user_id, [
+        {"op": "like", "song_id": a, "key": "k1"},
+        {"op": "unlike", "song_id": a, "key": "k1"},
+    ], now=NOW)
+    db.commit()
+
+    assert results == [{"key": "k1", "status": "ok"}, {"key": "k1", "status": "duplicate"}]
+    assert _liked(db, user_id) == {a}
+
+
+def test_resent_batch_is_not_applied_twice(db, listener):
+    user_id, (a, b, _) = listener
+    batch = [
+        {"op": "like", "song_id": a, "key": "k1"},
+        {"op": "play", "song_id": b, "key": "k2"},
+    ]
+    _, plays = apply_interactions(db, user_id, batch, now=NOW)
+    db.commit()
+    assert plays == [(b, NOW)]
+
+    # The user unliked in between; the retried like must not undo that.
+    apply_interactions(db, user_id, [{"op": "unlike", "song_id": a, "key": "k3"}], now=NOW)
+    db.commit()
+    results, plays = apply_interactions(db, user_id, batch, now=NOW)
+    db.commit()
+
+    assert [r["status"] for r in results] == ["duplicate", "duplicate"]
+    assert plays == []
+    assert _liked(db, user_id) == set()
+
+
+def test_keys_are_forgotten_after_their_ttl(db, listener):
+    user_id, (a, _, _) = listener
+    apply_interactions(db, user_id, [{"op": "play", "song_id": a, "key": "k1"}], now=NOW)
+    db.commit()
+
+    later = NOW + timedelta(seconds=INTERACTION_KEY_TTL + 1)
+    results, plays = apply_interactions(db, user_id, [{"op": "play", "song_id": a, "key": "k1"}], now=later)
+    db.commit()
+    assert results == [{"key": "k1", "status": "ok"}]
+    assert plays == [(a, later)]
+
+
+def test_invalid_ops_fail_alone(db, listener):
+    user_id, (a, _, _) = listener
+    missing = max(listener[1]) + 100
+    results, _ = apply_interactions(db, user_id, [
+        {"op": "share", "song_id": a},
+        {"op": "like", "song_id": "7"},
+        {"op": "like", "song_id": a, "key": "x" * 65},
+        {"op": "like", "song_id": missing, "key": "k1"},
+        {"op": "like", "song_id": a, "key": "k2"},
+    ], now=NOW)
+    db.commit()
+
+    assert [r["status"] for r in results] == ["error"] * 4 + ["ok"]
+    assert results[3] == {"key": "k1", "status": "error", "error": "song not found"}
+    assert _liked(db, user_id) == {a}
+    # The key of a rejected op is not used up.
+    keys = {k for (k,) in db.query(InteractionKey.key).filter_by(user_id=user_id)}
+    assert keys == {"k2"}
+
+
+def _ms(at):
+    return at.replace(tzinfo=timezone.utc).timestamp() * 1000
+
+
+def test_play_time_falls_back_to_now(db, listener):
+    user_id, (a, _, _) = listener
+    recent = NOW - timedelta(minutes=5)
+    _, plays = apply_interactions(db, user_id, [
+        {"op": "play", "song_id": a, "at": _ms(recent)},
+        {"op": "play", "song_id": a, "at": _ms(NOW - timedelta(days=2))},
+        {"op": "play", "song_id": a, "at": _ms(NOW + timedelta(hours=1))},
+        {"op": "play", "song_id": a, "at": "yesterday"},
+    ], now=NOW)
+    assert [played for _, played in plays] == [recent, NOW, NOW, NOW]
+
+
+def test_liked_song_ids(db, listener):
+    user_id, (a, b, c) = listener
+    db.add_all([Favorite(user_id=user_id, song_id=a), Favorite(user_id=user_id, song_id=c)])
+    db.commit()
+    assert liked_song_ids(db, user_id, [c, b, a]) == sorted([a, c])
+    assert liked_song_ids(db, user_id, []) == []
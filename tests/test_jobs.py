@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from controller import jobs
+from controller.config import JOB_BACKOFF_SECONDS, JOB_STALE_AFTER
+from controller.database import SessionLocal
+from controller.models import Job
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(db):
+    db.query(Job).delete()
+    db.commit()
+
+
+def _job(db, kind="lyrics", **fields):
+    job = jobs.enqueue(db, kind, {"song_id": 1})
+    for name, value in fields.items():
+        setattr(job, name, value)
+    db.commit()
+    return job.id
+
+
+def test_claim_takes_oldest_due_job(db):
+    first = _job(db)
+    _job(db)
+    _job(db, run_after=datetime.utcnow() + timedelta(hours=1))
+
+    job = jobs.claim_job(db)
+    assert job.id == first
+    assert (job.status, job.attempts) == ("running", 1)
+
+
+def test_claim_skips_jobs_not_yet_due(db):
+    _job(db, run_after=datetime.utcnow() + timedelta(hours=1))
+    assert jobs.claim_job(db) is None
+
+
+def test_job_is_claimed_once(db):
+    only = _job(db)
+    other = SessionLocal()
+    try:
+        assert jobs.claim_job(db).id == only
+        assert jobs.claim_job(other) is None
+    finally:
+        other.close()
+
+
+def test_failure_retries_with_exponential_backoff(db):
+    job_id = _job(db)
+    for attempt in (1, 2):
+        assert jobs.claim_job(db).id == job_id
+        before = datetime.utcnow()
+        jobs.finish_job(db, job_id, error="boom")
+
+        job = db.get(Job, job_id)
+        assert (job.status, job.attempts, job.last_error) == ("queued", attempt, "boom")
+        delay = timedelta(seconds=JOB_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        assert before + delay <= job.run_after <= datetime.utcnow() + delay
+        # Due again right away for the next round.
+        job.run_after = datetime.utcnow()
+        db.commit()
+
+
+def test_failure_after_last_attempt_is_final(db):
+    job_id = _job(db, max_attempts=1)
+    jobs.claim_job(db)
+    jobs.finish_job(db, job_id, error="boom")
+
+    job = db.get(Job, job_id)
+    assert (job.status, job.last_error) == ("failed", "boom")
+    assert jobs.claim_job(db) is None
+
+
+def test_success_clears_the_last_error(db):
+    job_id = _job(db, last_error="earlier failure")
+    jobs.claim_job(db)
+    jobs.finish_job(db, job_id)
+
+    job = db.get(Job, job_id)
+    assert (job.status, job.last_error) == ("done", None)
+
+
+def test_stale_running_jobs_are_requeued(db):
+    long_ago = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER + 60)
+    stale = _job(db, status="running", attempts=1, updated_at=long_ago)
+    fresh = _job(db, status="running", attempts=1, updated_at=datetime.utcnow())
+
+    jobs.requeue_stale(db)
+    db.expire_all()
+    assert db.get(Job, stale).status == "queued"
+    assert db.get(Job, fresh).status == "running"
+
+
+def test_released_jobs_keep_their_attempts(db):
+    job_id = _job(db)
+    jobs.claim_job(db)
+    jobs.release_jobs(db, [job_id])
+
+    db.expire_all()
+    job = db.get(Job, job_id)
+    assert (job.status, job.attempts) == ("queued", 0)
+
+
+def test_execute_returns_the_traceback_of_a_failing_handler(monkeypatch):
+    def fail(payload):
+        raise ValueError(f"bad song {payload['song_id']}")
+
+    monkeypatch.setitem(jobs.HANDLERS, "lyrics", fail)
+    error, retry = jobs.execute("lyrics", '{"song_id": 7}')
+    assert "ValueError: bad song 7" in error
+    assert retry
+
+    monkeypatch.setitem(jobs.HANDLERS, "lyrics", lambda payload: None)
+    assert jobs.execute("lyrics", '{"song_id": 7}') == (None, False)
+
+
+@pytest.mark.parametrize("exc", [ModuleNotFoundError("No module named 'pydub'"), jobs.PermanentError("no ffmpeg")])
+def test_missing_dependency_fails_without_retrying(db, monkeypatch, exc):
+    def fail(payload):
+        raise exc
+
+    monkeypatch.setitem(jobs.HANDLERS, "lyrics", fail)
+    job_id = _job(db)
+    jobs.claim_job(db)
+    error, retry = jobs.execute("lyrics", '{"song_id": 1}')
+    assert not retry
+    jobs.finish_job(db, job_id, error, retry)
+
+    job = db.get(Job, job_id)
+    assert (job.status, job.attempts) == ("failed", 1)
+    assert str(exc) in job.last_error
+
+
+def test_lyrics_default_to_the_stub_backend():
+    from controller.lyrics import lyrics_for_file
+
+    assert lyrics_for_file("/uploads/song.mp3").startswith("Stub lyrics")
+
+
+def test_periodic_jobs_are_not_stacked(db):
+    next_run = {}
+    jobs.schedule_periodic(db, next_run)
+    pending = {kind for (kind,) in db.query(Job.kind).filter_by(status="queued")}
+    assert pending == set(jobs.SCHEDULE)
+
+    # Due again, but one of each is still queued.
+    jobs.schedule_periodic(db, {})
+    assert db.query(Job).count() == len(jobs.SCHEDULE)
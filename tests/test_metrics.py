@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from controller.metrics import Registry, max_queries, render_prometheus
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return Registry(path=str(tmp_path / "metrics.db"), flush_interval=3600)
+
+
+def _exited_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _add_worker_rows(registry, worker, pid, name, labels, value):
+    conn = registry._connect()
+    try:
+        conn.execute("INSERT INTO worker_samples VALUES (?, ?, ?, ?, ?)", (worker, pid, name, labels, value))
+    finally:
+        conn.close()
+
+
+def test_counters_and_histograms_accumulate(registry):
+    registry.inc("http_requests_total", [("route", "a")])
+    registry.inc("http_requests_total", [("route", "a")], 2)
+    registry.observe("db_query_duration_seconds", 0.02, (0.01, 0.05))
+    registry.observe("db_query_duration_seconds", 0.2, (0.01, 0.05))
+
+    samples = registry.collect()
+    assert samples[("http_requests_total", '{route="a"}')] == 3
+    assert samples[("db_query_duration_seconds_bucket", '{le="0.01"}')] == 0
+    assert samples[("db_query_duration_seconds_bucket", '{le="0.05"}')] == 1
+    assert samples[("db_query_duration_seconds_bucket", '{le="+Inf"}')] == 2
+    assert samples[("db_query_duration_seconds_count", "")] == 2
+    assert samples[("db_query_duration_seconds_sum", "")] == pytest.approx(0.22)
+
+
+def test_collect_sums_every_worker(registry):
+    registry.inc("http_requests_total", [("route", "a")], 5)
+    _add_worker_rows(registry, f"{os.getpid()}-other", os.getpid(), "http_requests_total", '{route="a"}', 4)
+
+    assert registry.collect()[("http_requests_total", '{route="a"}')] == 9
+
+
+def test_exited_workers_are_retired_without_losing_counts(registry):
+    dead = _exited_pid()
+    registry.inc("http_requests_total", [("route", "a")], 5)
+    _add_worker_rows(registry, f"{dead}-1", dead, "http_requests_total", '{route="a"}', 4)
+
+    assert registry.collect()[("http_requests_total", '{route="a"}')] == 9
+    # Folded once: the total stays put on later scrapes.
+    assert registry.collect()[("http_requests_total", '{route="a"}')] == 9
+    conn = sqlite3.connect(registry.path)
+    workers = {w for (w,) in conn.execute("SELECT DISTINCT worker FROM worker_samples")}
+    conn.close()
+    assert workers == {"retired", registry._worker}
+
+
+def test_reused_pid_does_not_overwrite_an_earlier_worker(registry):
+    # An earlier process with our pid flushed 7 before exiting.
+    _add_worker_rows(registry, f"{os.getpid()}-0", os.getpid(), "http_requests_total", '{route="a"}', 7)
+    registry.inc("http_requests_total", [("route", "a")], 1)
+
+    assert registry.collect()[("http_requests_total", '{route="a"}')] == 8
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_child_does_not_inherit_a_held_lock(registry):
+    os.register_at_fork(after_in_child=registry._reset)
+    registry.inc("http_requests_total", [("route", "a")], 5)
+    held, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with registry._lock:
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    held.wait()
+    pid = os.fork()
+    if pid == 0:
+        # Blocks forever if the parent's held lock came along.
+        registry.inc("http_requests_total", [("route", "a")], 2)
+        registry.flush()
+        os._exit(0)
+    release.set()
+    thread.join()
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The child counted only its own request, not the 5 it was forked with.
+    assert registry.collect()[("http_requests_total", '{route="a"}')] == 7
+
+
+def test_prometheus_output_orders_buckets_within_a_series():
+    body = render_prometheus({
+        ("db_query_duration_seconds_bucket", '{le="+Inf"}'): 2.0,
+        ("db_query_duration_seconds_bucket", '{le="0.05"}'): 1.0,
+        ("db_query_duration_seconds_sum", ""): 0.22,
+        ("db_query_duration_seconds_count", ""): 2.0,
+    })
+    assert body.splitlines() == [
+        "# HELP db_query_duration_seconds SQL statement latency.",
+        "# TYPE db_query_duration_seconds histogram",
+        'db_query_duration_seconds_bucket{le="0.05"} 1',
+        'db_query_duration_seconds_bucket{le="+Inf"} 2',
+        "db_query_duration_seconds_count 2",
+        "db_query_duration_seconds_sum 0.22",
+    ]
+
+
+def test_max_queries_fails_past_the_limit(database):
+    from controller.database import engine
+    from controller.metrics import instrument_engine
+
+    instrument_engine(engine)
+    with max_queries(2):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+    with pytest.raises(AssertionError, match="3 queries, expected at most 2"):
+        with max_queries(2):
+            with engine.connect() as conn:
+                for n in range(3):
+                    conn.execute(text(f"SELECT {n}"))
+
+
+def test_failed_statements_do_not_leak_start_times(database):
+    from sqlalchemy.exc import OperationalError
+
+    from controller.database import engine
+    from controller.metrics import instrument_engine
+
+    instrument_engine(engine)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+        assert conn.info["query_started"] == []
+
+
+def test_slow_queries_are_logged(database, monkeypatch, caplog):
+    from controller import metrics
+    from controller.database import engine
+
+    metrics.instrument_engine(engine)
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    with caplog.at_level("WARNING", logger="controller.metrics"), engine.connect() as conn:
+        conn.execute(text("SELECT   42"))
+    assert any(r.levelname == "WARNING" and r.getMessage().endswith("route=-): SELECT 42") for r in caplog.records)
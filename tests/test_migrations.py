@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from controller.migrations import MIGRATIONS, run_migrations
+from controller.models import Base
+from controller.search import create_search_index
+
+# The schema as deployed before any migration existed, with the duplicate
+# rows the old read-then-insert paths could leave behind.
+LEGACY_DB = """
+    CREATE TABLE roles (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL UNIQUE);
+    CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR NOT NULL,
+        email_or_phone VARCHAR NOT NULL UNIQUE, password VARCHAR NOT NULL,
+        role_id INTEGER NOT NULL REFERENCES roles(id));
+    CREATE TABLE songs (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, artist_name VARCHAR NOT NULL,
+        genre VARCHAR, language VARCHAR, file_path VARCHAR NOT NULL, lyrics TEXT,
+        uploader_id INTEGER REFERENCES users(id));
+    CREATE TABLE favorites (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id),
+        song_id INTEGER REFERENCES songs(id));
+    CREATE TABLE playlists (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL,
+        user_id INTEGER REFERENCES users(id));
+    CREATE TABLE playlist_songs (id INTEGER PRIMARY KEY, playlist_id INTEGER REFERENCES playlists(id),
+        song_id INTEGER REFERENCES songs(id));
+    CREATE TABLE recently_played (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id),
+        song_id INTEGER REFERENCES songs(id), played_at DATETIME);
+
+    INSERT INTO roles VALUES (1, 'admin'), (2, 'listener');
+    INSERT INTO users VALUES (1, 'fan', 'fan@example.com', 'x', 2);
+    INSERT INTO songs VALUES (1, 'Morning Raga', 'Artist', 'classical', NULL, 'uploads/a.mp3', NULL, NULL),
+                             (2, 'Night Song', 'Artist', NULL, NULL, 'uploads/b.mp3', NULL, NULL);
+    INSERT INTO favorites VALUES (1, 1, 1), (2, 1, 1), (3, 1, 2);
+    INSERT INTO playlists VALUES (1, 'Mix', 1);
+    INSERT INTO playlist_songs VALUES (1, 1, 2), (2, 1, 1), (3, 1, 2);
+    INSERT INTO recently_played VALUES (1, 1, 1, '2026-01-01 10:00:00'), (2, 1, 1, '2026-01-02 10:00:00');
+"""
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    """An old database upgraded the way ``create_tables()`` does it."""
+    path = str(tmp_path / "music.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_DB)
+    conn.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        create_search_index(conn)
+    engine.dispose()
+    run_migrations(path)
+
+    conn = sqlite3.connect(path)
+    yield path, conn
+    conn.close()
+
+
+def _rows(conn, sql):
+    return conn.execute(sql).fetchall()
+
+
+def test_all_migrations_are_applied(legacy):
+    path, conn = legacy
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+    # A second run (another worker booting) finds nothing to do.
+    run_migrations(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+
+
+def test_duplicates_are_removed_and_cannot_come_back(legacy):
+    _, conn = legacy
+    assert _rows(conn, "SELECT id FROM favorites ORDER BY id") == [(1,), (3,)]
+    assert _rows(conn, "SELECT id, song_id FROM playlist_songs ORDER BY id") == [(1, 2), (2, 1)]
+    # The latest play of a song is the one kept.
+    assert _rows(conn, "SELECT played_at FROM recently_played") == [("2026-01-02 10:00:00",)]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO favorites(user_id, song_id) VALUES (1, 1)")
+
+
+def test_existing_rows_gain_the_new_columns(legacy):
+    _, conn = legacy
+    assert _rows(conn, "SELECT duration, seek_index, hls_segments FROM songs WHERE id = 1") == [(None, None, None)]
+    # Playlists keep their insertion order.
+    assert _rows(conn, "SELECT song_id, position FROM playlist_songs ORDER BY position") == [(2, 1024.0), (1, 2048.0)]
+
+
+def test_derived_tables_are_seeded_from_existing_rows(legacy):
+    _, conn = legacy
+    counters = dict(_rows(conn, "SELECT name, value FROM stat_counters"))
+    assert counters["favorites"] == 2 and counters["songs:genre:classical"] == 1 and counters["songs:genre:"] == 1
+    # The catalog snapshot starts stale so the next refresh builds it.
+    assert _rows(conn, "SELECT chunk, version, built_version FROM catalog_chunks") == [(0, 1, 0)]
+    assert _rows(conn, "SELECT rowid FROM songs_fts WHERE songs_fts MATCH 'raga'") == [(1,)]
+
+
+def test_triggers_maintain_the_upgraded_database(legacy):
+    _, conn = legacy
+    conn.execute("DELETE FROM favorites WHERE id = 3")
+    conn.execute("UPDATE songs SET title = 'Evening Raga' WHERE id = 1")
+    conn.commit()
+    assert _rows(conn, "SELECT value FROM stat_counters WHERE name = 'favorites'") == [(1,)]
+    assert _rows(conn, "SELECT rowid FROM songs_fts WHERE songs_fts MATCH 'evening'") == [(1,)]
+    assert _rows(conn, "SELECT version FROM catalog_chunks") == [(2,)]
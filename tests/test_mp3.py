@@ -0,0 +1,59 @@
+import math
+import struct
+
+import pytest
+
+from controller.mp3 import byte_offset_at, probe
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, no CRC or padding: 417-byte frames
+# of 1152 samples.
+FRAME = b"\xff\xfb\x90\x00" + bytes(413)
+FRAME_SAMPLES = 1152
+
+
+def id3v23(**frames):
+    body = b"".join(
+        name.encode() + struct.pack(">I", len(text) + 1) + b"\x00\x00" + b"\x00" + text.encode("latin-1")
+        for name, text in frames.items()
+    )
+    size = len(body)
+    syncsafe = bytes(((size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F))
+    return b"ID3\x03\x00\x00" + syncsafe + body
+
+
+def write_mp3(path, frames, tag=b""):
+    path.write_bytes(tag + FRAME * frames + b"TAG" + bytes(125))
+    return str(path)
+
+
+def test_probe_reads_tags_duration_and_bitrate(tmp_path):
+    tag = id3v23(TIT2="Morning Raga", TPE1="Artist")
+    info = probe(write_mp3(tmp_path / "a.mp3", 192, tag))
+
+    assert info["tags"] == {"title": "Morning Raga", "artist": "Artist"}
+    assert info["sample_rate"] == 44100
+    assert info["duration"] == round(192 * FRAME_SAMPLES / 44100, 3)
+    assert info["bitrate"] == pytest.approx(128000, rel=0.01)
+    # The ID3v1 tag after the last frame is not audio.
+    assert (info["audio_start"], info["audio_end"]) == (len(tag), len(tag) + 192 * len(FRAME))
+
+
+def test_seek_index_points_at_the_frame_starting_each_second(tmp_path):
+    tag = id3v23(TIT2="x")
+    info = probe(write_mp3(tmp_path / "a.mp3", 192, tag))
+    index = info["seek_index"]
+
+    expected = [len(tag) + math.ceil(k * 44100 / FRAME_SAMPLES) * len(FRAME) for k in range(5)]
+    assert list(struct.unpack(f"<{len(index) // 4}I", index)) == expected
+    assert byte_offset_at(index, 2.9) == expected[2]
+    # Out-of-range times clamp to the first and last second.
+    assert byte_offset_at(index, -1) == expected[0]
+    assert byte_offset_at(index, 60) == expected[-1]
+    assert byte_offset_at(b"", 3) == 0
+
+
+def test_non_mp3_files_are_not_probed(tmp_path):
+    (tmp_path / "empty.mp3").write_bytes(b"")
+    (tmp_path / "text.mp3").write_bytes(b"not audio at all" * 100)
+    assert probe(str(tmp_path / "empty.mp3")) is None
+    assert probe(str(tmp_path / "text.mp3")) is None
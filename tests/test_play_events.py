@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from controller import play_events
+from controller.metrics import registry
+from controller.models import PlayHour, RecentlyPlayed
+
+NOW = datetime(2026, 1, 1, 12, 0)
+DROPPED = ("play_events_dropped_total", "")
+
+
+@pytest.fixture(autouse=True)
+def empty_history(db):
+    yield
+    for model in (RecentlyPlayed, PlayHour):
+        db.query(model).delete()
+    db.commit()
+
+
+def _buffer(**kwargs):
+    # The flusher thread never wakes on its own during a test.
+    return play_events.PlayEventBuffer(**{"flush_size": 1000, "flush_interval": 3600, **kwargs})
+
+
+def _history(db, user_id):
+    db.expire_all()
+    return db.query(RecentlyPlayed.song_id, RecentlyPlayed.played_at).filter_by(user_id=user_id) \
+        .order_by(RecentlyPlayed.played_at.desc()).all()
+
+
+def test_repeats_collapse_to_the_latest_play(db):
+    buffer = _buffer()
+    for minutes in (0, 5, 2):
+        buffer.record(1, 7, NOW + timedelta(minutes=minutes))
+    assert buffer.flush() == 3
+    assert buffer.flush() == 0
+
+    assert _history(db, 1) == [(7, NOW + timedelta(minutes=5))]
+    # The charts still count all three.
+    assert db.query(PlayHour.plays).filter_by(song_id=7).scalar() == 3
+
+
+def test_a_replay_moves_the_existing_row(db):
+    buffer = _buffer()
+    buffer.record(1, 7, NOW)
+    buffer.flush()
+    buffer.record(1, 7, NOW + timedelta(hours=1))
+    buffer.flush()
+    assert _history(db, 1) == [(7, NOW + timedelta(hours=1))]
+
+
+def test_history_is_trimmed_per_user(db):
+    buffer = _buffer(history_limit=2)
+    for song_id in range(1, 5):
+        buffer.record(1, song_id, NOW + timedelta(minutes=song_id))
+    buffer.record(2, 1, NOW)
+    buffer.flush()
+    assert [song_id for song_id, _ in _history(db, 1)] == [4, 3]
+    assert [song_id for song_id, _ in _history(db, 2)] == [1]
+
+
+def test_failed_flush_keeps_the_newest_events_up_to_the_cap(db, monkeypatch):
+    buffer = _buffer(max_events=3)
+    dropped = registry.collect().get(DROPPED, 0)
+
+    def fail(conn, events):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(play_events, "record_plays", fail)
+    buffer.record(1, 1, NOW)
+    buffer.record(1, 2, NOW)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    buffer.record(1, 3, NOW)
+    buffer.record(1, 4, NOW)
+
+    assert [song_id for _, song_id, _ in buffer._events] == [2, 3, 4]
+    assert registry.collect()[DROPPED] == dropped + 1
+    monkeypatch.undo()
+    assert buffer.flush() == 3
@@ -0,0 +1,87 @@
+import random
+from bisect import bisect_left
+
+import pytest
+
+from controller.models import Playlist, PlaylistSong
+from controller.playlists import POSITION_GAP, add_songs, apply_edit, plan_positions
+
+
+def _spaced(song_ids):
+    return {sid: POSITION_GAP * (i + 1) for i, sid in enumerate(song_ids)}
+
+
+def _lis_length(seq):
+    tails = []
+    for v in seq:
+        k = bisect_left(tails, v)
+        tails[k:k + 1] = [v]
+    return len(tails)
+
+
+def test_moving_one_song_places_only_that_song():
+    placed = plan_positions(_spaced([1, 2, 3, 4]), [1, 4, 2, 3])
+    assert placed == {4: (POSITION_GAP + 2 * POSITION_GAP) / 2}
+
+
+def test_new_songs_fill_around_the_stored_ones():
+    placed = plan_positions(_spaced([1, 2]), [5, 1, 6, 7, 2, 8])
+    assert set(placed) == {5, 6, 7, 8}
+    assert placed[5] < POSITION_GAP < placed[6] < placed[7] < 2 * POSITION_GAP < placed[8]
+
+
+def test_random_edits_move_only_songs_outside_the_longest_ordered_run():
+    rng = random.Random(7)
+    for _ in range(200):
+        current = _spaced(rng.sample(range(40), rng.randint(0, 20)))
+        desired = rng.sample(range(40), rng.randint(0, 25))
+        placed = plan_positions(current, desired)
+
+        positions = {**current, **placed}
+        assert sorted(desired, key=positions.get) == desired
+        kept = [sid for sid in sorted(current, key=current.get) if sid in desired]
+        index = {sid: i for i, sid in enumerate(desired)}
+        assert len([sid for sid in placed if sid in current]) == len(kept) - _lis_length([index[s] for s in kept])
+
+
+def test_exhausted_gaps_ask_for_a_renumber():
+    assert plan_positions({1: 1.0, 2: 1.0 + 1e-12}, [1, 3, 2]) is None
+
+
+@pytest.fixture
+def playlist(db):
+    row = Playlist(name="Mix", user_id=1)
+    db.add(row)
+    db.flush()
+    add_songs(db, row.id, [10, 20, 30, 40, 20])
+    db.commit()
+    yield row.id
+    db.rollback()
+    db.query(PlaylistSong).delete()
+    db.query(Playlist).delete()
+    db.commit()
+
+
+def _order(db, playlist_id):
+    return [sid for (sid,) in db.query(PlaylistSong.song_id).filter_by(playlist_id=playlist_id)
+            .order_by(PlaylistSong.position)]
+
+
+def test_apply_edit_touches_only_changed_rows(db, playlist):
+    assert _order(db, playlist) == [10, 20, 30, 40]
+    counts = apply_edit(db, playlist, [40, 10, 30, 50])
+    db.commit()
+    assert counts == {"added": 1, "removed": 1, "moved": 1}
+    assert _order(db, playlist) == [40, 10, 30, 50]
+
+
+def test_apply_edit_renumbers_when_out_of_room(db, playlist):
+    db.query(PlaylistSong).filter_by(playlist_id=playlist, song_id=20).update(
+        {PlaylistSong.position: POSITION_GAP + 1e-12})
+    counts = apply_edit(db, playlist, [10, 40, 20, 30])
+    db.commit()
+    assert counts["moved"] == 4
+    positions = [pos for (pos,) in db.query(PlaylistSong.position).filter_by(playlist_id=playlist)
+                 .order_by(PlaylistSong.position)]
+    assert positions == [POSITION_GAP * n for n in range(1, 5)]
+    assert _order(db, playlist) == [10, 40, 20, 30]
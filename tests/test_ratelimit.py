@@ -0,0 +1,125 @@
+import pytest
+
+from controller import ratelimit
+
+
+@pytest.fixture
+def two_per_address(monkeypatch):
+    # Two writes per address, refilling far too slowly to matter here.
+    user_bucket, _ = ratelimit.LIMITS["writes"]
+    monkeypatch.setitem(ratelimit.LIMITS, "writes", (user_bucket, (2, 1e-6)))
+
+
+def _post(client, address):
+    return client.post("/log-play/1", headers={"X-Forwarded-For": address})
+
+
+def test_forwarded_clients_get_their_own_buckets(client, two_per_address):
+    assert [_post(client, "203.0.113.1").status_code for _ in range(3)] == [403, 403, 429]
+    # Same proxy, another client: not throttled by the first one.
+    assert _post(client, "203.0.113.2").status_code == 403
+
+
+def test_only_the_trusted_hop_counts(client, two_per_address):
+    # A client cannot dodge its bucket by prepending made-up addresses; the
+    # proxy appends the real one last.
+    statuses = [_post(client, f"10.0.0.{n}, 203.0.113.3").status_code for n in range(3)]
+    assert statuses == [403, 403, 429]
+
+
+def test_metrics_allow_list_uses_the_forwarded_client(client):
+    assert client.get("/metrics", headers={"X-Forwarded-For": "203.0.113.4"}).status_code == 403
+    assert client.get("/metrics", headers={"X-Forwarded-For": "127.0.0.1"}).status_code == 200
+
+
+def test_metrics_refuses_forwarded_requests_when_no_proxy_is_trusted(client, monkeypatch):
+    from controller import metrics
+
+    monkeypatch.setattr(metrics, "TRUSTED_PROXIES", 0)
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/metrics", headers={"X-Forwarded-For": "203.0.113.4"}).status_code == 403
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return ratelimit.RateLimiter(path=str(tmp_path / "ratelimit.db"), enabled=True, slot_timeout=30)
+
+
+def test_buckets_allow_a_burst_then_refill(limiter, clock):
+    assert [limiter.take("k", 3, 0.5) for _ in range(3)] == [0, 0, 0]
+    assert limiter.take("k", 3, 0.5) == pytest.approx(2.0)
+    clock.now += 1
+    # Half a token came back: still not a whole one.
+    assert limiter.take("k", 3, 0.5) == pytest.approx(1.0)
+    clock.now += 1
+    assert limiter.take("k", 3, 0.5) == 0
+    # A long idle spell refills up to the burst, never past it.
+    clock.now += 3600
+    assert [limiter.take("k", 3, 0.5) for _ in range(4)][3] > 0
+
+
+def test_users_and_addresses_have_separate_buckets(limiter, clock, monkeypatch):
+    monkeypatch.setitem(ratelimit.LIMITS, "search", ((1, 1.0), (3, 1.0)))
+    assert limiter.check("search", 1, "198.51.100.1") == 0
+    assert limiter.check("search", 1, "198.51.100.1") > 0
+    # Another user behind the same address has their own bucket, until the
+    # address's runs out.
+    assert limiter.check("search", 2, "198.51.100.1") == 0
+    assert limiter.check("search", 3, "198.51.100.1") > 0
+    assert limiter.check("search", 3, "198.51.100.2") == 0
+
+
+def test_concurrency_slots_cap_running_requests(limiter, clock):
+    first = limiter.acquire("search:user:1", 1)
+    assert first and limiter.acquire("search:user:1", 1) is None
+    assert limiter.acquire("search:user:2", 1)
+    limiter.release(first)
+    second = limiter.acquire("search:user:1", 1)
+    assert second
+    # A slot whose worker died stops counting after the timeout.
+    clock.now += 31
+    assert limiter.acquire("search:user:1", 1)
+
+
+def test_disabled_limiter_lets_everything_through(tmp_path):
+    off = ratelimit.RateLimiter(path=str(tmp_path / "ratelimit.db"), enabled=False)
+    assert [off.take("k", 1, 1e-6) for _ in range(3)] == [0, 0, 0]
+    assert off.acquire("search:user:1", 1) == 0
+
+
+def test_an_older_search_never_runs(limiter, db):
+    with limiter.coalesce(db, "search:1:p", 2):
+        pass
+    with pytest.raises(ratelimit.Superseded):
+        with limiter.coalesce(db, "search:1:p", 1):
+            pytest.fail("a superseded search ran")
+    # Another page's numbering is its own.
+    with limiter.coalesce(db, "search:1:q", 1):
+        pass
+
+
+def test_a_newer_search_interrupts_the_running_one(limiter, db):
+    from sqlalchemy import text
+
+    slow = text("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1e9) SELECT COUNT(*) FROM c")
+    with pytest.raises(ratelimit.Superseded):
+        with limiter.coalesce(db, "search:1:p", 1):
+            db.execute(text("SELECT 1"))
+            # The next keystroke, as another worker would record it.
+            limiter.register("search:1:p", 2)
+            db.execute(slow)
@@ -0,0 +1,91 @@
+import math
+from collections import Counter
+from itertools import permutations
+
+import pytest
+
+from controller import recommendations as recs
+from controller.models import (
+    Favorite, Playlist, PlaylistSong, RecentlyPlayed, RecEvent, RecInteraction, Song, SongPair, SongRec,
+)
+
+MODEL = (RecEvent, RecInteraction, SongPair, SongRec)
+
+
+def _clear(db, models):
+    for model in models:
+        db.query(model).delete()
+    db.commit()
+
+
+@pytest.fixture
+def songs(db):
+    _clear(db, MODEL)
+    rows = [Song(title=f"Song {n}", artist_name="Artist", file_path=f"songs/{n}.mp3") for n in range(6)]
+    db.add_all(rows)
+    db.commit()
+    yield [row.id for row in rows]
+    db.rollback()
+    _clear(db, (Favorite, PlaylistSong, Playlist, RecentlyPlayed, Song) + MODEL)
+
+
+def _baskets(db):
+    """Each user's songs, straight from the base tables."""
+    pairs = set(db.query(Favorite.user_id, Favorite.song_id))
+    pairs |= set(db.query(Playlist.user_id, PlaylistSong.song_id).join(Playlist, Playlist.id == PlaylistSong.playlist_id))
+    pairs |= set(db.query(RecentlyPlayed.user_id, RecentlyPlayed.song_id))
+    baskets = {}
+    for user_id, song_id in pairs:
+        baskets.setdefault(user_id, set()).add(song_id)
+    return baskets
+
+
+def _assert_model_matches(db):
+    db.expire_all()
+    baskets = _baskets(db)
+    expected = Counter(pair for basket in baskets.values() for pair in permutations(basket, 2))
+    assert {(a, b): w for a, b, w in db.query(SongPair.song_a, SongPair.song_b, SongPair.weight)} == dict(expected)
+    users = Counter(song for basket in baskets.values() for song in basket)
+    assert {s: n for s, n in db.query(SongRec.song_id, SongRec.users) if n} == dict(users)
+    for song_id, blob in db.query(SongRec.song_id, SongRec.neighbors).filter(SongRec.neighbors.isnot(None)):
+        for other, score in recs.unpack_neighbors(blob):
+            cosine = expected[(song_id, other)] / math.sqrt(users[song_id] * users[other])
+            assert score == pytest.approx(cosine, rel=1e-6)
+
+
+def test_incremental_updates_match_the_co_occurrence_counts(db, songs):
+    a, b, c, d, *_ = songs
+    db.add_all([Favorite(user_id=1, song_id=a), Favorite(user_id=1, song_id=b),
+                Favorite(user_id=2, song_id=a), Favorite(user_id=2, song_id=c)])
+    db.commit()
+    recs.update_model()
+    _assert_model_matches(db)
+
+    # A playlist entry and a play of an already-liked song, then an unlike.
+    playlist = Playlist(name="Mix", user_id=1)
+    db.add(playlist)
+    db.flush()
+    db.add_all([PlaylistSong(playlist_id=playlist.id, song_id=d, position=1.0),
+                RecentlyPlayed(user_id=2, song_id=a)])
+    db.query(Favorite).filter_by(user_id=1, song_id=b).delete()
+    db.commit()
+    recs.update_model(batch_size=2)
+    _assert_model_matches(db)
+    assert db.query(RecEvent).count() == 0
+
+    recs.rebuild_model()
+    _assert_model_matches(db)
+
+
+def test_recommendations_come_from_neighbours_of_the_users_songs(db, songs):
+    a, b, c, d, e, _ = songs
+    for user_id, liked in {1: (a, b), 2: (a, b, c), 3: (a, c), 4: (d, e), 5: (d,)}.items():
+        db.add_all([Favorite(user_id=user_id, song_id=s) for s in liked])
+    db.add(Favorite(user_id=9, song_id=a))
+    db.commit()
+    recs.update_model()
+
+    ranked = [song["id"] for song in recs.recommend(db, 9, limit=2)]
+    assert ranked == [b, c]
+    # A listener with no history gets the most collected songs.
+    assert [song["id"] for song in recs.recommend(db, 99, limit=1)] == [a]
@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+from controller.migrations import run_migrations
+from controller.models import Song
+from controller.search import build_match_query, ranked_search
+
+
+@pytest.fixture
+def song(db):
+    row = Song(title="Morning Raga", artist_name="Artist", file_path="songs/0.mp3")
+    db.add(row)
+    db.commit()
+    yield row
+    db.rollback()
+    db.query(Song).delete()
+    db.commit()
+
+
+def _titles(db, q):
+    return [hit["title"] for hit in ranked_search(db, q)]
+
+
+def _update_trigger(database):
+    conn = sqlite3.connect(database)
+    try:
+        return conn.execute("SELECT sql FROM sqlite_master WHERE name = 'songs_fts_au'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_edits_to_indexed_columns_are_searchable(db, song):
+    song.duration = 200.0
+    db.commit()
+    assert _titles(db, "morning") == ["Morning Raga"]
+
+    song.title = "Evening Raga"
+    db.commit()
+    assert _titles(db, "evening") == ["Evening Raga"]
+    assert _titles(db, "morning") == []
+
+
+def test_migration_narrows_the_old_update_trigger(database):
+    conn = sqlite3.connect(database)
+    try:
+        conn.executescript("""
+            DROP TRIGGER songs_fts_au;
+            CREATE TRIGGER songs_fts_au AFTER UPDATE ON songs BEGIN SELECT 1; END;
+            PRAGMA user_version = 9;
+        """)
+    finally:
+        conn.close()
+
+    run_migrations(database)
+    assert "AFTER UPDATE OF title, artist_name, genre, language, lyrics ON songs" in _update_trigger(database)
+
+
+@pytest.mark.parametrize("q, match", [
+    ("morn", '"morn"*'),
+    ("Morning  raga", '"Morning"* "raga"*'),
+    ('title:x OR "y', '"title"* "x"* "OR"* "y"*'),
+    ("NEAR(a b)", '"NEAR"* "a"* "b"*'),
+    ("  - * ", ""),
+])
+def test_input_is_quoted_into_prefix_terms(q, match):
+    assert build_match_query(q) == match
+
+
+def test_fts_syntax_in_queries_is_searched_as_words(db, song):
+    assert _titles(db, "raga OR") == []
+    assert _titles(db, 'artist_name:"raga') == []
+    assert _titles(db, "mor ra") == ["Morning Raga"]
+    assert ranked_search(db, "***") == []
+
+
+def test_title_hits_rank_above_lyrics_hits(db, song):
+    db.add(Song(title="Other", artist_name="Someone", lyrics="a morning song", file_path="songs/1.mp3"))
+    db.commit()
+    assert _titles(db, "morning") == ["Morning Raga", "Other"]
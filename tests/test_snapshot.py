@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from controller import snapshot
+from controller.config import SNAPSHOT_DIR
+from controller.models import CatalogChunk, Song
+
+
+@pytest.fixture
+def catalog(db):
+    songs = [Song(title=f"Song {n}", artist_name="Artist", file_path=f"songs/{n}.mp3") for n in range(2)]
+    db.add_all(songs)
+    db.commit()
+    snapshot.refresh_all()
+    yield songs
+    db.rollback()
+    db.query(Song).delete()
+    db.commit()
+    snapshot.refresh_all()
+
+
+def _files():
+    return set(os.listdir(SNAPSHOT_DIR)) if os.path.isdir(SNAPSHOT_DIR) else set()
+
+
+def _titles(name):
+    path, _ = snapshot.chunk_file(name)
+    with open(path, "rb") as f:
+        return sorted(song[1] for song in json.load(f)["songs"])
+
+
+def test_manifest_serves_the_last_build_until_the_job_runs(db, catalog):
+    before = snapshot.manifest(db)
+    files = _files()
+    db.add(Song(title="New", artist_name="Artist", file_path="songs/new.mp3"))
+    db.commit()
+
+    # Reading the manifest writes nothing and still points at files on disk.
+    assert snapshot.manifest(db) == before
+    assert _files() == files
+    assert _titles(before["chunks"][0]) == ["Song 0", "Song 1"]
+
+    snapshot.refresh_all()
+    db.expire_all()
+    after = snapshot.manifest(db)
+    assert after["version"] != before["version"]
+    assert _titles(after["chunks"][0]) == ["New", "Song 0", "Song 1"]
+
+
+def test_missing_files_are_not_rebuilt_on_request(db, catalog):
+    name = snapshot.manifest(db)["chunks"][0]
+    for file in _files():
+        if file.startswith(name):
+            os.unlink(os.path.join(SNAPSHOT_DIR, file))
+
+    assert snapshot.chunk_file(name) == (None, None)
+    assert not any(file.startswith(name) for file in _files())
+
+    # The next refresh notices and writes the file again.
+    snapshot.refresh_all()
+    assert _titles(name) == ["Song 0", "Song 1"]
+
+
+def test_manifest_route_does_not_build(client, db, catalog):
+    db.query(CatalogChunk).update({CatalogChunk.built_version: 0})
+    db.commit()
+    files = _files()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+    assert client.get("/catalog/manifest.json").status_code == 200
+    assert _files() == files
@@ -0,0 +1,118 @@
+import struct
+
+import pytest
+
+from controller.models import Song
+from controller.storage import get_storage
+
+AUDIO = bytes(range(256)) * 20  # 5120 bytes
+# One frame-aligned offset per second of audio.
+SEEK_INDEX = struct.pack("<4I", 0, 1000, 2000, 3000)
+
+
+@pytest.fixture
+def song(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_storage("local"), "root", str(tmp_path))
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "uploads" / "song.mp3").write_bytes(AUDIO)
+    row = Song(title="Song", artist_name="Artist", file_path="uploads/song.mp3", seek_index=SEEK_INDEX)
+    db.add(row)
+    db.commit()
+    yield row.id
+    db.delete(row)
+    db.commit()
+
+
+@pytest.fixture
+def listener(client):
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["role"] = "listener"
+    return client
+
+
+def test_time_seek_starts_at_the_frame_for_that_second(listener, song):
+    resp = listener.get(f"/stream/{song}?t=1.5")
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes 1000-{len(AUDIO) - 1}/{len(AUDIO)}"
+    assert resp.content_length == len(AUDIO) - 1000
+    assert resp.data == AUDIO[1000:]
+
+
+def test_time_seek_applies_to_the_media_elements_first_request(listener, song):
+    resp = listener.get(f"/stream/{song}?t=2", headers={"Range": "bytes=0-"})
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes 2000-{len(AUDIO) - 1}/{len(AUDIO)}"
+    assert resp.data == AUDIO[2000:]
+
+
+def test_explicit_range_wins_over_the_time_seek(listener, song):
+    resp = listener.get(f"/stream/{song}?t=2", headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes 100-199/{len(AUDIO)}"
+    assert resp.data == AUDIO[100:200]
+
+
+def test_time_past_the_end_seeks_to_the_last_second(listener, song):
+    resp = listener.get(f"/stream/{song}?t=99")
+    assert resp.headers["Content-Range"] == f"bytes 3000-{len(AUDIO) - 1}/{len(AUDIO)}"
+
+
+def test_time_seek_on_a_changed_file_sends_it_whole(listener, song):
+    resp = listener.get(f"/stream/{song}?t=1", headers={"If-Range": '"stale"'})
+    assert resp.status_code == 200
+    assert resp.data == AUDIO
+
+
+def test_without_a_time_the_whole_file_is_sent(listener, song):
+    resp = listener.get(f"/stream/{song}")
+    assert resp.status_code == 200
+    assert "Content-Range" not in resp.headers
+    assert resp.data == AUDIO
+
+
+def test_matching_etag_is_not_modified(listener, song):
+    etag = listener.get(f"/stream/{song}").headers["ETag"]
+    resp = listener.get(f"/stream/{song}", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert resp.data == b""
+
+
+def test_if_none_match_wins_over_if_modified_since(listener, song):
+    last_modified = listener.get(f"/stream/{song}").headers["Last-Modified"]
+    resp = listener.get(f"/stream/{song}", headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+    assert resp.status_code == 200
+
+    resp = listener.get(f"/stream/{song}", headers={"If-Modified-Since": last_modified})
+    assert resp.status_code == 304
+
+
+def test_single_ranges_are_partial_content(listener, song):
+    resp = listener.get(f"/stream/{song}", headers={"Range": "bytes=-100"})
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes {len(AUDIO) - 100}-{len(AUDIO) - 1}/{len(AUDIO)}"
+    assert resp.data == AUDIO[-100:]
+
+
+def test_unsatisfiable_range(listener, song):
+    resp = listener.get(f"/stream/{song}", headers={"Range": f"bytes={len(AUDIO)}-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == f"bytes */{len(AUDIO)}"
+
+
+def test_multiple_ranges_get_the_whole_file(listener, song):
+    resp = listener.get(f"/stream/{song}", headers={"Range": "bytes=0-9,20-29"})
+    assert resp.status_code == 200
+    assert resp.data == AUDIO
+
+
+def test_if_range_applies_the_range_only_to_the_same_file(listener, song):
+    etag = listener.get(f"/stream/{song}").headers["ETag"]
+    resp = listener.get(f"/stream/{song}", headers={"Range": "bytes=10-19", "If-Range": etag})
+    assert resp.status_code == 206
+    assert resp.data == AUDIO[10:20]
+
+    resp = listener.get(f"/stream/{song}", headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert resp.status_code == 200
+    assert resp.data == AUDIO